@@ -1,14 +1,24 @@
 from django.contrib import admin
-from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils.html import format_html
 from django.shortcuts import render, redirect
 from django.urls import path, reverse
 from django.contrib import messages
 from django.utils.safestring import mark_safe
 from django.contrib.admin import AdminSite
-import csv
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import timedelta
 import json
-from .models import ClickLog, Subscriber, Offer, BrandConfig, AppConfig
+from .exports import (
+    export_file_path, file_export_status, start_file_export, stream_csv, subscriber_clicks, subscriber_rows
+)
+from .models import ClickLog, ClickRollupDaily, ClickRollupHourly, Subscriber, Offer, BrandConfig, AppConfig
+from .rollups import day_bucket, hour_bucket
+from .sketches import OFFER, count_unique_users, count_unique_users_by_key
 from .statistics import get_dashboard_summary, get_top_offers
 
 
@@ -37,39 +47,29 @@ class ClickLogInline(admin.TabularInline):
 
 
 def export_subscribers_to_csv(modeladmin, request, queryset):
-    """Экспорт подписчиков в CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="subscribers_export.csv"'
-    response.write('\ufeff')  # UTF-8 BOM для Excel
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'VK User ID',
-        'Group ID',
-        'Brand',
-        'Subscribed',
-        'Allowed From Group',
-        'Can Receive Messages',
-        'Created At',
-        'Subscribed At',
-        'Unsubscribed At',
-        'Total Clicks',
-    ])
-    
-    for subscriber in queryset:
-        writer.writerow([
-            subscriber.vk_user_id,
-            subscriber.group_id,
-            subscriber.brand,
-            'Yes' if subscriber.subscribed else 'No',
-            'Yes' if subscriber.allowed_from_group else 'No',
-            'Yes' if subscriber.can_receive_messages else 'No',
-            subscriber.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            subscriber.subscribed_at.strftime('%Y-%m-%d %H:%M:%S') if subscriber.subscribed_at else '',
-            subscriber.unsubscribed_at.strftime('%Y-%m-%d %H:%M:%S') if subscriber.unsubscribed_at else '',
-            subscriber.clicks.count(),
-        ])
+    """
+    Экспорт подписчиков в CSV
+    
+    Выгрузка идёт потоком из одного запроса с подсчётом кликов (см. exports.py).
+    Выборки больше EXPORT_BACKGROUND_THRESHOLD пишутся в файл в фоне,
+    а в сообщении появляется ссылка на скачивание.
+    """
+    if queryset.count() > settings.EXPORT_BACKGROUND_THRESHOLD:
+        # Запрос выполняется в фоновом потоке со своим соединением с БД
+        token = start_file_export('subscribers', lambda: subscriber_rows(queryset))
+        url = reverse('admin:app_subscriber_export_download', args=[token])
+        modeladmin.message_user(
+            request,
+            format_html('Выгрузка готовится в фоне: <a href="{}">скачать файл</a> (ссылка заработает, когда файл будет готов)', url),
+            messages.INFO
+        )
+        return None
     
+    response = StreamingHttpResponse(
+        stream_csv(*subscriber_rows(queryset), bom=True),  # UTF-8 BOM для Excel
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = 'attachment; filename="subscribers_export.csv"'
     return response
 
 
@@ -245,6 +245,18 @@ class BrandConfigAdmin(admin.ModelAdmin):
     color_preview.short_description = 'Цвета'
 
 
+def _offer_rollup_clicks(model, **filters):
+    """Подзапрос: сумма кликов оффера по агрегатам model"""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            offer=OuterRef('pk'),
+            **filters
+        ).order_by().values('offer').annotate(
+            total=Sum('clicks')
+        ).values('total')[:1]
+    ), 0)
+
+
 @admin.register(Offer)
 class OfferAdmin(admin.ModelAdmin):
     list_display = [
@@ -266,10 +278,6 @@ class OfferAdmin(admin.ModelAdmin):
     search_fields = ['partner_name']
     ordering = ['-priority', '-created_at']
     
-    # Разрешаем сортировку по кликам (но не очень эффективно для больших таблиц)
-    # admin_order_field для методов не поддерживается напрямую, 
-    # но Django покажет данные правильно
-    
     fieldsets = (
         ('Основная информация', {
             'fields': ('partner_name', 'logo_url')
@@ -279,6 +287,7 @@ class OfferAdmin(admin.ModelAdmin):
                 ('clicks_total', 'clicks_today'),
                 ('clicks_week', 'clicks_month'),
                 ('unique_users', 'statistics_link'),
+                'popularity_score',
             ),
             'classes': ('collapse',),
             'description': 'Статистика по кликам и пользователям'
@@ -310,7 +319,7 @@ class OfferAdmin(admin.ModelAdmin):
     
     readonly_fields = [
         'clicks_total', 'clicks_today', 'clicks_week', 'clicks_month',
-        'unique_users', 'statistics_link'
+        'unique_users', 'statistics_link', 'popularity_score'
     ]
     
     def sum_range(self, obj):
@@ -323,59 +332,45 @@ class OfferAdmin(admin.ModelAdmin):
     
     def clicks_total(self, obj):
         """Всего кликов за всё время"""
-        count = obj.clicks.count()
+        count = obj._clicks_total
         if count > 0:
             return format_html('<strong style="color: #155A31;">{}</strong>', count)
         return format_html('<span style="color: #999;">0</span>')
     clicks_total.short_description = 'Всего'
+    clicks_total.admin_order_field = '_clicks_total'
     
     def clicks_today(self, obj):
         """Кликов сегодня"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        count = obj.clicks.filter(created_at__gte=today_start).count()
-        
+        count = obj._clicks_today
         if count > 0:
             return format_html('<strong style="color: #AF6E3D;">{}</strong>', count)
         return format_html('<span style="color: #ccc;">0</span>')
     clicks_today.short_description = 'Сегодня'
+    clicks_today.admin_order_field = '_clicks_today'
     
     def clicks_week(self, obj):
         """Кликов за 7 дней"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        week_ago = timezone.now() - timedelta(days=7)
-        count = obj.clicks.filter(created_at__gte=week_ago).count()
-        
+        count = obj._clicks_week
         if count > 0:
             return format_html('<span style="color: #2c3e50;">{}</span>', count)
         return format_html('<span style="color: #ccc;">0</span>')
     clicks_week.short_description = '7 дней'
+    clicks_week.admin_order_field = '_clicks_week'
     
     def clicks_month(self, obj):
         """Кликов за 30 дней"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        month_ago = timezone.now() - timedelta(days=30)
-        count = obj.clicks.filter(created_at__gte=month_ago).count()
-        
+        count = obj._clicks_month
         if count > 0:
             return format_html('<span style="color: #3498db;">{}</span>', count)
         return format_html('<span style="color: #ccc;">0</span>')
     clicks_month.short_description = '30 дней'
+    clicks_month.admin_order_field = '_clicks_month'
     
     def unique_users(self, obj):
-        """Уникальных пользователей"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        month_ago = timezone.now() - timedelta(days=30)
-        count = obj.clicks.filter(created_at__gte=month_ago).values('vk_user_id').distinct().count()
-        
+        """Уникальных пользователей (оценка по скетчам, см. _OfferChangeList)"""
+        count = getattr(obj, '_unique_users', None)
+        if count is None:
+            count = count_unique_users(_unique_users_day_from(), OFFER, str(obj.pk))
         if count > 0:
             return format_html(
                 '<span style="color: #8e44ad;" title="За последние 30 дней">👤 {}</span>', 
@@ -390,9 +385,45 @@ class OfferAdmin(admin.ModelAdmin):
         return format_html('<a href="{}" target="_blank" style="text-decoration: none;">📊 Подробнее</a>', url)
     statistics_link.short_description = 'Статистика'
     
+    def get_changelist(self, request, **kwargs):
+        return _OfferChangeList
+    
     def get_queryset(self, request):
+        """
+        Счётчики кликов — подзапросами к агрегатам (см. rollups.py), а не
+        запросом на каждую ячейку: страница стоит одного запроса независимо
+        от числа кликов. Уникальные пользователи — из скетчей, одним
+        запросом на страницу (см. _OfferChangeList).
+        """
         qs = super().get_queryset(request)
-        return qs.prefetch_related('clicks')
+        now = timezone.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        month_ago = now - timedelta(days=30)
+        return qs.annotate(
+            _clicks_total=_offer_rollup_clicks(ClickRollupDaily),
+            _clicks_today=_offer_rollup_clicks(ClickRollupHourly, bucket__gte=today_start),
+            _clicks_week=_offer_rollup_clicks(ClickRollupHourly, bucket__gte=hour_bucket(now - timedelta(days=7))),
+            _clicks_month=_offer_rollup_clicks(ClickRollupHourly, bucket__gte=hour_bucket(month_ago)),
+        )
+
+
+def _unique_users_day_from():
+    """Первый день 30-дневного периода уникальных пользователей в админке"""
+    return day_bucket(timezone.now() - timedelta(days=30))
+
+
+class _OfferChangeList(ChangeList):
+    """Список офферов: уникальные пользователи страницы — одним запросом к скетчам"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        # Срез страницы кэширует объекты, поэтому значения доживут до отрисовки
+        offers = list(self.result_list)
+        estimates = count_unique_users_by_key(
+            _unique_users_day_from(), OFFER, [str(offer.pk) for offer in offers]
+        )
+        for offer in offers:
+            offer._unique_users = estimates.get(str(offer.pk), 0)
 
 
 @admin.register(Subscriber)
@@ -446,8 +477,39 @@ class SubscriberAdmin(admin.ModelAdmin):
     messages_badge.short_description = 'Сообщения'
     
     def clicks_count(self, obj):
-        return obj.clicks.count()
+        return obj._clicks_count
     clicks_count.short_description = 'Кликов'
+    
+    def get_queryset(self, request):
+        """
+        Клики подписчика — коррелированным подзапросом по индексу subscriber_id:
+        он выполняется только для строк страницы, а не JOIN и GROUP BY по всем
+        click_logs. Сортировки по колонке нет — она посчитала бы клики всех подписчиков.
+        """
+        qs = super().get_queryset(request)
+        return qs.annotate(_clicks_count=subscriber_clicks())
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('export/<str:token>/', self.admin_site.admin_view(self.export_download),
+                 name='app_subscriber_export_download'),
+        ]
+        return custom_urls + urls
+
+    def export_download(self, request, token):
+        """Скачивание файла фоновой выгрузки подписчиков"""
+        export_status = file_export_status(token)
+        if export_status == 'ready':
+            return FileResponse(open(export_file_path(token), 'rb'), as_attachment=True,
+                                filename='subscribers_export.csv', content_type='text/csv')
+        if export_status == 'pending':
+            messages.info(request, 'Выгрузка ещё готовится, попробуйте позже')
+        elif export_status == 'failed':
+            messages.error(request, 'Выгрузка завершилась с ошибкой, подробности в логах')
+        else:
+            messages.error(request, 'Файл выгрузки не найден или уже удалён')
+        return redirect('admin:app_subscriber_changelist')
 
 
 @admin.register(ClickLog)
@@ -5,3 +5,5 @@ class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
 
+    def ready(self):
+        from . import signals  # noqa: F401 - регистрация обработчиков сигналов
@@ -0,0 +1,264 @@
+"""
+Архив старых строк журналов (ClickLog, VKAdsEvent) в сжатых CSV-файлах.
+
+Строки старше ARCHIVE_AFTER_DAYS потоково выгружаются в файлы по локальным
+дням (<ARCHIVE_DIR>/<таблица>/<ГГГГ>/<ММ>/<таблица>-<ГГГГ-ММ-ДД>.csv.gz),
+после чего число строк в файле сверяется с БД, и только затем архивные
+строки удаляются пачками (команда archive_logs).
+
+Статистика по умолчанию читает агрегаты, которые не архивируются, а точный
+подсчёт (exact=True) дочитывает архивные дни через iter_archived_rows.
+
+Строка может быть одновременно в архиве и в БД (archive_logs --no-delete или
+прерванное удаление). Повторная выгрузка дня пишет только строки, которых ещё
+нет в его файлах, а iter_archived_rows пропускает строки, которые ещё в БД.
+"""
+import csv
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Min
+
+from .rollups import day_bucket, day_start
+
+logger = logging.getLogger(__name__)
+
+# Размер пачек чтения из БД и удаления
+CHUNK_SIZE = 5000
+
+
+def _fields(model):
+    return list(model._meta.concrete_fields)
+
+
+def _encode(field, value):
+    if value is None:
+        return ''
+    if isinstance(field, models.JSONField):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return value
+
+
+def _decode(field, value):
+    """Значение поля из архива; пустая строка — NULL (для nullable полей)"""
+    if value == '' and field.null:
+        return None
+    if isinstance(field, models.JSONField):
+        return json.loads(value)
+    if isinstance(field, models.DateTimeField):
+        return datetime.fromisoformat(value)
+    if isinstance(field, models.BooleanField):
+        return value == '1'
+    if isinstance(field, (models.IntegerField, models.ForeignKey)):
+        return int(value)
+    return value
+
+
+def table_dir(model):
+    return os.path.join(settings.ARCHIVE_DIR, model._meta.db_table)
+
+
+def _day_path(model, day, part=0):
+    table = model._meta.db_table
+    suffix = f'.{part}' if part else ''
+    return os.path.join(table_dir(model), f'{day:%Y}', f'{day:%m}', f'{table}-{day.isoformat()}{suffix}.csv.gz')
+
+
+def archived_files(model, day_from=None):
+    """
+    Файлы архива таблицы.
+
+    Returns:
+        Отсортированный список (день, путь), начиная с day_from
+    """
+    table = model._meta.db_table
+    files = []
+    for root, _, names in os.walk(table_dir(model)):
+        for name in names:
+            if not (name.startswith(f'{table}-') and name.endswith('.csv.gz')):
+                continue
+            day = date.fromisoformat(name[len(table) + 1:len(table) + 11])
+            if day_from is None or day >= day_from:
+                files.append((day, os.path.join(root, name)))
+    return sorted(files)
+
+
+def _day_rows(model, day):
+    return model.objects.filter(
+        created_at__gte=day_start(day),
+        created_at__lt=day_start(day + timedelta(days=1))
+    )
+
+
+def _day_files(model, day):
+    """Файлы архива за день (основной и дописанные части .N)"""
+    directory = os.path.dirname(_day_path(model, day))
+    prefix = f'{model._meta.db_table}-{day.isoformat()}'
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith(prefix) and name.endswith('.csv.gz')
+    )
+
+
+def _archived_ids(model, day):
+    pk = model._meta.pk
+    ids = set()
+    for path in _day_files(model, day):
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as archive:
+            ids.update(_decode(pk, row[pk.attname]) for row in csv.DictReader(archive))
+    return ids
+
+
+def iter_archived_rows(model, date_from, date_to=None):
+    """
+    Строки архива с created_at в [date_from, date_to) в виде словарей attname -> значение.
+
+    Строки, которые ещё хранятся в БД, пропускаются: их учитывает запрос к БД.
+    """
+    fields = {field.attname: field for field in _fields(model)}
+    pk_name = model._meta.pk.attname
+    stored_day, stored = None, set()
+    for day, path in archived_files(model, day_bucket(date_from)):
+        if day != stored_day:
+            stored_day = day
+            stored = set(_day_rows(model, day).values_list('pk', flat=True))
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as archive:
+            for row in csv.DictReader(archive):
+                values = {name: _decode(fields[name], value) for name, value in row.items()}
+                if values[pk_name] in stored:
+                    continue
+                created_at = values['created_at']
+                if created_at >= date_from and (date_to is None or created_at < date_to):
+                    yield values
+
+
+def _count_rows(path):
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as archive:
+        return sum(1 for _ in csv.reader(archive)) - 1
+
+
+class _DayWriter:
+    """CSV-файл одного дня: пишется во временный файл и переименовывается после проверки"""
+
+    def __init__(self, model, day, fields):
+        part = 0
+        while os.path.exists(_day_path(model, day, part)):
+            part += 1
+        self.day = day
+        self.path = _day_path(model, day, part)
+        self.tmp_path = f'{self.path}.tmp'
+        self.fields = fields
+        self.ids = []
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = gzip.open(self.tmp_path, 'wt', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([field.attname for field in fields])
+
+    def write(self, obj):
+        self._writer.writerow([_encode(field, getattr(obj, field.attname)) for field in self.fields])
+        self.ids.append(obj.pk)
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        """Удалить временный файл (если он ещё не переименован)"""
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _stored_rows(model, ids):
+    return sum(
+        model.objects.filter(pk__in=ids[start:start + CHUNK_SIZE]).count()
+        for start in range(0, len(ids), CHUNK_SIZE)
+    )
+
+
+def archive_day(model, day, delete=True):
+    """
+    Выгрузить строки модели за локальный день в архив.
+
+    Файл пишется во временный, сверяется с БД (число строк в файле,
+    выгруженных и всё ещё хранящихся) и только затем переименовывается;
+    после этого строки удаляются пачками.
+
+    Строки, которые уже есть в файлах дня (повторный запуск, --no-delete,
+    прерванное удаление), повторно не выгружаются, но удаляются вместе с новыми.
+
+    Returns:
+        Число заархивированных строк
+    """
+    rows = _day_rows(model, day).order_by('created_at', 'pk')
+    already_archived = _archived_ids(model, day)
+    archived_ids = []
+
+    writer = _DayWriter(model, day, _fields(model))
+    written = 0
+    try:
+        for obj in rows.iterator(chunk_size=CHUNK_SIZE):
+            if obj.pk in already_archived:
+                archived_ids.append(obj.pk)
+            else:
+                writer.write(obj)
+        writer.close()
+
+        if writer.ids:
+            written = _count_rows(writer.tmp_path)
+            stored = _stored_rows(model, writer.ids)
+            if written != len(writer.ids) or stored != len(writer.ids):
+                raise RuntimeError(
+                    f'{model._meta.db_table} {day}: archive has {written} rows, '
+                    f'expected {len(writer.ids)}, database has {stored}'
+                )
+            os.replace(writer.tmp_path, writer.path)
+            logger.info(f"{model._meta.db_table} {day}: archived {written} rows to {writer.path}")
+    finally:
+        writer.discard()
+
+    if delete:
+        archived_ids += writer.ids
+        for start in range(0, len(archived_ids), CHUNK_SIZE):
+            with transaction.atomic():
+                model.objects.filter(pk__in=archived_ids[start:start + CHUNK_SIZE]).delete()
+    return written
+
+
+def archive_rows(model, before_day, delete=True):
+    """
+    Выгрузить в архив строки модели за дни раньше before_day.
+
+    Args:
+        before_day: Первый локальный день, который остаётся в БД
+        delete: Удалять строки после проверки архива
+
+    Returns:
+        Словарь {день: заархивированных строк} для непустых дней
+    """
+    oldest = model.objects.filter(created_at__lt=day_start(before_day)).aggregate(oldest=Min('created_at'))['oldest']
+    archived = {}
+    if oldest is None:
+        return archived
+    day = day_bucket(oldest)
+    while day < before_day:
+        count = archive_day(model, day, delete)
+        if count:
+            archived[day] = count
+        day += timedelta(days=1)
+    return archived
+
+
+def archive_cutoff(today, days=None):
+    """Первый день, который остаётся в БД при сроке хранения days (по умолчанию ARCHIVE_AFTER_DAYS)"""
+    return today - timedelta(days=settings.ARCHIVE_AFTER_DAYS if days is None else days)
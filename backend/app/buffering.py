@@ -0,0 +1,361 @@
+"""
+Буфер записей с фоновой записью в БД пачками.
+
+Запрос кладёт компактную запись (dict, сериализуемый в JSON) в ограниченную
+очередь и сразу отвечает пользователю, а фоновый поток воркера забирает записи
+пачками и передаёт их в flush-функцию (обычно bulk_create).
+
+- Back-pressure: при заполненной очереди put() ждёт put_timeout, после чего
+  запись уходит на диск, а не теряется.
+- Если БД недоступна, пачка сохраняется в spool-файл (JSON Lines) и
+  дозаписывается после следующей успешной записи.
+- Если БД отвергла пачку из-за данных (DataError / IntegrityError), записи
+  пишутся по одной, а отвергнутые уходят в карантин (<name>-<pid>.quarantine),
+  чтобы одна плохая запись не блокировала остальные.
+- При завершении воркера (atexit) очередь сбрасывается синхронно.
+- metrics(): глубина очереди, задержка записи пачек, записи на диске и потерянные.
+"""
+import atexit
+import glob
+import ipaddress
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+from django.db import DataError, IntegrityError, close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, которые повторятся при каждой попытке записать те же данные
+_BAD_RECORD_ERRORS = (DataError, IntegrityError)
+
+# Файл, оставшийся от прерванной дозаписи: <spool>.jsonl.<pid>.replay
+_REPLAY_FILE = re.compile(r'^(?P<path>.+\.jsonl)\.(?P<pid>\d+)\.replay$')
+
+
+def valid_ip(value):
+    """IP-адрес в каноническом виде или None, если строка не является адресом"""
+    try:
+        return str(ipaddress.ip_address(value.strip())) if value else None
+    except ValueError:
+        return None
+
+
+def fit(value, max_length):
+    """Значение или None, если оно длиннее столбца (иначе упадёт запись всей пачки)"""
+    if value is None or len(value) <= max_length:
+        return value
+    return None
+
+
+class _FlushFailed(Exception):
+    """Запись прервалась не из-за данных; remaining — записи, которые ещё не записаны"""
+
+    def __init__(self, error, remaining, written):
+        super().__init__(str(error))
+        self.remaining = remaining
+        self.written = written
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BatchBuffer:
+    """
+    Ограниченный буфер с фоновым сбросом пачками.
+
+    Args:
+        name: Имя буфера (используется в логах и именах spool-файлов)
+        flush_func: Функция, записывающая список записей; исключение = запись не удалась
+        maxsize: Максимальное число записей в очереди
+        batch_size: Максимальный размер пачки
+        flush_interval: Максимальное время (сек) ожидания до записи неполной пачки
+        spool_dir: Каталог для spool-файлов (None — без записи на диск)
+        put_timeout: Сколько (сек) put() ждёт место в заполненной очереди
+    """
+
+    # Как часто (сек) фоновый поток проверяет сигнал остановки
+    _STOP_POLL = 0.2
+
+    def __init__(self, name, flush_func, maxsize=10000, batch_size=500,
+                 flush_interval=2.0, spool_dir=None, put_timeout=0.05):
+        self.name = name
+        self.flush_func = flush_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+        self._has_spool = True
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'spilled': 0,
+            'dropped': 0,
+            'quarantined': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+        }
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_last = 0.0
+        self._flush_seconds_max = 0.0
+
+    def put(self, record):
+        """
+        Добавить запись в буфер.
+
+        Returns:
+            True, если запись принята (в очередь или на диск)
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+            self._count('enqueued')
+            return True
+        except queue.Full:
+            logger.warning(f"{self.name} buffer is full, spilling record to disk")
+            spilled = self._spill([record])
+            self._count('spilled' if spilled else 'dropped')
+            return spilled
+
+    def qsize(self):
+        """Текущее число записей в очереди"""
+        return self._queue.qsize()
+
+    def metrics(self):
+        """
+        Метрики буфера в текущем процессе.
+
+        enqueued / written — записи, принятые в очередь и записанные в БД;
+        spilled — ушедшие на диск (заполненная очередь или ошибка записи);
+        dropped — потерянные (не удалось записать и на диск);
+        quarantined — отвергнутые БД из-за данных и отложенные в карантин.
+        """
+        with self._stats_lock:
+            flushes = self._stats['flushes']
+            return {
+                **self._stats,
+                'queue_depth': self.qsize(),
+                'queue_size': self._queue.maxsize,
+                'flush_ms_last': round(self._flush_seconds_last * 1000, 2),
+                'flush_ms_avg': round(self._flush_seconds_total / flushes * 1000, 2) if flushes else 0.0,
+                'flush_ms_max': round(self._flush_seconds_max * 1000, 2),
+            }
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def flush(self):
+        """Синхронно записать всё, что накопилось в очереди"""
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Остановить фоновый поток и записать остаток очереди"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def _ensure_worker(self):
+        # Поток запускается лениво и отдельно в каждом процессе (после fork)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-flusher', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take(block=True)
+            if batch:
+                self._write(batch)
+
+    def _take(self, block):
+        """Забрать из очереди пачку до batch_size записей"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    # При остановке отдаём набранное сразу, не дожидаясь flush_interval
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0 or self._stop.is_set():
+                        break
+                    batch.append(self._queue.get(timeout=min(timeout, self._STOP_POLL)))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                if not block:
+                    break
+        return batch
+
+    def _write(self, batch):
+        with self._write_lock:
+            close_old_connections()
+            started = time.perf_counter()
+            try:
+                self._flush_batch(batch)
+            except _FlushFailed as e:
+                logger.error(f"{self.name} flush of {len(batch)} records failed: {e}")
+                connection.close()
+                self._count('failed_flushes')
+                self._count('written', e.written)
+                self._count('spilled' if self._spill(e.remaining) else 'dropped', len(e.remaining))
+                return
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self._stats['flushes'] += 1
+                self._flush_seconds_total += elapsed
+                self._flush_seconds_last = elapsed
+                self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+            self._replay_spool()
+
+    def _flush_batch(self, batch):
+        """
+        Записать пачку, при ошибке данных — по одной записи.
+
+        Записанные учитываются в written, отвергнутые БД — в карантине.
+
+        Raises:
+            _FlushFailed: Запись не удалась по другой причине (например, БД недоступна)
+        """
+        try:
+            self.flush_func(batch)
+            self._count('written', len(batch))
+            return
+        except _BAD_RECORD_ERRORS as e:
+            if len(batch) == 1:
+                self._quarantine(batch, e)
+                return
+            logger.warning(f"{self.name}: batch of {len(batch)} records rejected ({e}), writing one by one")
+        except Exception as e:
+            raise _FlushFailed(e, batch, 0)
+
+        written = 0
+        for index, record in enumerate(batch):
+            try:
+                self.flush_func([record])
+                written += 1
+            except _BAD_RECORD_ERRORS as e:
+                self._quarantine([record], e)
+            except Exception as e:
+                raise _FlushFailed(e, batch[index:], written)
+        self._count('written', written)
+
+    def _quarantine(self, records, error):
+        """Отложить записи (или нечитаемые строки spool-файла), которые нельзя записать"""
+        logger.error(f"{self.name}: {len(records)} records quarantined: {error}")
+        self._count('quarantined', len(records))
+        if not self.spool_dir:
+            return
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            path = os.path.join(self.spool_dir, f'{self.name}-{os.getpid()}.quarantine')
+            lines = ''.join(
+                (record if isinstance(record, str) else json.dumps(record, ensure_ascii=False)).rstrip('\n') + '\n'
+                for record in records
+            )
+            with self._spool_lock, open(path, 'a', encoding='utf-8') as quarantine:
+                quarantine.write(lines)
+        except Exception as e:
+            logger.error(f"{self.name}: failed to quarantine {len(records)} records: {e}")
+
+    def _spill(self, records):
+        """Сохранить записи в spool-файл"""
+        if not self.spool_dir:
+            logger.error(f"{self.name}: no spool dir configured, {len(records)} records lost")
+            return False
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            path = os.path.join(self.spool_dir, f'{self.name}-{os.getpid()}.jsonl')
+            lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+            with self._spool_lock, open(path, 'a', encoding='utf-8') as spool:
+                spool.write(lines)
+            self._has_spool = True
+            return True
+        except Exception as e:
+            logger.error(f"{self.name}: failed to spill {len(records)} records to disk: {e}")
+            return False
+
+    def _spool_files(self):
+        """spool-файлы и файлы прерванной дозаписи (процесс-владелец завершился)"""
+        paths = glob.glob(os.path.join(self.spool_dir, f'{self.name}-*.jsonl'))
+        for path in glob.glob(os.path.join(self.spool_dir, f'{self.name}-*.jsonl.*.replay')):
+            match = _REPLAY_FILE.match(path)
+            if match and (int(match['pid']) == os.getpid() or not _pid_alive(int(match['pid']))):
+                paths.append(path)
+        return paths
+
+    def _replay_spool(self):
+        """Дозаписать записи из spool-файлов после восстановления БД"""
+        if not self.spool_dir or not self._has_spool:
+            return
+        self._has_spool = False
+        for path in self._spool_files():
+            # Переименование атомарно, поэтому файл забирает только один процесс
+            match = _REPLAY_FILE.match(path)
+            claimed = f"{match['path'] if match else path}.{os.getpid()}.replay"
+            try:
+                if claimed != path:
+                    os.rename(path, claimed)
+            except OSError:
+                continue
+
+            records = []
+            bad_lines = []
+            with open(claimed, encoding='utf-8', errors='replace') as spool:
+                for line in spool:
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Оборванная или повреждённая строка (например, после падения при записи)
+                        bad_lines.append(line)
+            if bad_lines:
+                self._quarantine(bad_lines, f'unreadable lines in {claimed}')
+
+            for start in range(0, len(records), self.batch_size):
+                try:
+                    self._flush_batch(records[start:start + self.batch_size])
+                except _FlushFailed as e:
+                    logger.error(f"{self.name}: replay of {claimed} failed: {e}")
+                    self._count('written', e.written)
+                    # Незаписанный остаток возвращаем в spool до следующей попытки
+                    if self._spill(e.remaining + records[start + self.batch_size:]):
+                        os.remove(claimed)
+                    return
+            os.remove(claimed)
+            logger.info(f"{self.name}: replayed {len(records)} spooled records")
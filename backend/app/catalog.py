@@ -0,0 +1,61 @@
+"""
+Каталог активных офферов в памяти воркера.
+
+Активных офферов немного, а меняются они только через админку, поэтому
+каждый воркер держит снимок каталога и перестраивает его, когда сигналы
+модели Offer поднимают версию (см. signals.py).
+"""
+from django.conf import settings
+
+from .models import Offer
+from .offer_index import OfferIndex
+from .payloads import PayloadCache
+from .snapshots import VersionedSnapshot, bump_version
+
+CATALOG_NAMESPACE = 'offers_catalog'
+
+
+class OfferCatalog:
+    """Неизменяемый снимок активных офферов"""
+
+    def __init__(self, offers):
+        self.offers = tuple(offers)
+        self.by_id = {offer.id: offer for offer in self.offers}
+        self.index = OfferIndex(self.offers)
+        # Офферы в виде EncodedJSON, строятся при первом запросе (см. offers.encoded_offers)
+        self.encoded = None
+        # Готовые ответы /api/offers/ этого снимка (см. offers.get_offers_payload)
+        self.payloads = PayloadCache(settings.OFFERS_PAYLOAD_CACHE_SIZE)
+
+    def __len__(self):
+        return len(self.offers)
+
+    def get(self, offer_id):
+        """Найти активный оффер по ID (None, если не найден)"""
+        try:
+            return self.by_id.get(int(offer_id))
+        except (TypeError, ValueError):
+            return None
+
+
+def _build_catalog():
+    offers = Offer.objects.filter(is_active=True).order_by('-priority', '-created_at')
+    return OfferCatalog(offers)
+
+
+_snapshot = VersionedSnapshot(
+    CATALOG_NAMESPACE,
+    _build_catalog,
+    ttl=settings.OFFERS_CATALOG_TTL,
+)
+
+
+def get_catalog():
+    """Получить актуальный снимок каталога"""
+    return _snapshot.get()
+
+
+def invalidate_catalog():
+    """Пометить каталог устаревшим во всех воркерах"""
+    _snapshot.invalidate()
+    bump_version(CATALOG_NAMESPACE)
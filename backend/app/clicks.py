@@ -0,0 +1,82 @@
+"""
+Буферизованная запись кликов по офферам.
+
+offer_redirect_view только кладёт компактную запись клика в буфер воркера,
+а поиск подписчиков, bulk_create и обновление агрегатов (см. rollups.py
+и sketches.py) выполняются фоновым потоком пачками.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .buffering import BatchBuffer, fit, valid_ip
+from .models import ClickLog, Offer, Subscriber
+from .rollups import record_click_rollups
+from .sketches import record_user_sketches
+
+
+def write_clicks(records):
+    """Записать пачку кликов в БД"""
+    user_ids = {record['vk_user_id'] for record in records if record.get('vk_user_id')}
+    subscribers = dict(
+        Subscriber.objects.filter(vk_user_id__in=user_ids).values_list('vk_user_id', 'id')
+    ) if user_ids else {}
+
+    # Оффер могли удалить, пока клик ждал в буфере
+    offer_ids = {record['offer_id'] for record in records}
+    existing_offers = set(Offer.objects.filter(id__in=offer_ids).values_list('id', flat=True))
+
+    click_objects = [
+        ClickLog(
+            offer_id=record['offer_id'] if record['offer_id'] in existing_offers else None,
+            vk_user_id=record.get('vk_user_id'),
+            subscriber_id=subscribers.get(record.get('vk_user_id')),
+            group_id=record.get('group_id'),
+            brand=record.get('brand'),
+            created_at=datetime.fromtimestamp(record['ts'], tz=dt_timezone.utc),
+            ip_address=record.get('ip_address'),
+            user_agent=record.get('user_agent'),
+        )
+        for record in records
+    ]
+
+    # Сырые клики, агрегаты и скетчи пишутся вместе: либо оба, либо пачка уходит в spool
+    with transaction.atomic():
+        ClickLog.objects.bulk_create(click_objects)
+        record_click_rollups(click_objects)
+        record_user_sketches(click_objects)
+
+
+click_buffer = BatchBuffer(
+    'clicks',
+    write_clicks,
+    maxsize=settings.CLICK_BUFFER_SIZE,
+    batch_size=settings.CLICK_FLUSH_BATCH_SIZE,
+    flush_interval=settings.CLICK_FLUSH_INTERVAL,
+    spool_dir=settings.SPOOL_DIR,
+)
+
+
+def _max_length(name):
+    return ClickLog._meta.get_field(name).max_length
+
+
+def enqueue_click(offer_id, vk_user_id=None, group_id=None, brand=None,
+                  ip_address=None, user_agent=None):
+    """
+    Поставить клик в очередь на запись
+
+    Значения из query-параметров, не помещающиеся в столбцы, и невалидный IP
+    отбрасываются здесь: иначе БД отвергнет всю пачку кликов.
+    """
+    return click_buffer.put({
+        'offer_id': offer_id,
+        'vk_user_id': fit(vk_user_id, _max_length('vk_user_id')),
+        'group_id': fit(group_id, _max_length('group_id')),
+        'brand': fit(brand, _max_length('brand')),
+        'ts': time.time(),
+        'ip_address': valid_ip(ip_address),
+        'user_agent': user_agent,
+    })
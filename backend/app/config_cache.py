@@ -0,0 +1,50 @@
+"""
+Кэш готового JSON-ответа /api/config/.
+
+Конфигурация запрашивается при каждом запуске мини-приложения, а меняется
+только через админку, поэтому ответ сериализуется один раз на версию.
+Версию поднимают сигналы AppConfig и BrandConfig (см. signals.py).
+"""
+from django.conf import settings
+from django.db.models import Max
+
+from .models import AppConfig, BrandConfig
+from .payloads import CachedPayload
+from .renderers import EncodedJSON
+from .snapshots import VersionedSnapshot, bump_version
+
+CONFIG_NAMESPACE = 'app_config'
+
+
+def _build_payload():
+    app_config = AppConfig.get_or_create_config()
+    brand_updated_at = BrandConfig.objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+
+    # ETag зависит только от времени последнего изменения конфигураций
+    etag_source = '|'.join([
+        app_config.updated_at.isoformat(),
+        brand_updated_at.isoformat() if brand_updated_at else '',
+    ])
+    # Данные сериализуются один раз и вставляются готовыми и в /api/config/, и в /api/bootstrap/
+    return CachedPayload.from_data(
+        {'success': True, 'data': EncodedJSON(app_config.to_dict())},
+        etag_source=etag_source,
+    )
+
+
+_snapshot = VersionedSnapshot(
+    CONFIG_NAMESPACE,
+    _build_payload,
+    ttl=settings.APP_CONFIG_CACHE_TTL,
+)
+
+
+def get_config_payload():
+    """Получить готовый ответ /api/config/ (CachedPayload)"""
+    return _snapshot.get()
+
+
+def invalidate_config():
+    """Пометить ответ устаревшим во всех воркерах"""
+    _snapshot.invalidate()
+    bump_version(CONFIG_NAMESPACE)
@@ -0,0 +1,373 @@
+"""
+Потоковая выгрузка кликов, событий VK Ads и статистики в CSV / JSONL.
+
+Строки журналов читаются курсором на стороне сервера (.iterator(chunk_size))
+и кодируются пачками по мере чтения, поэтому память не зависит от числа
+строк. Выгрузка отдаётся через StreamingHttpResponse
+(statistics_export_view) или пишется в файл командой export_logs.
+
+Фильтры журналов: date_from / date_to (локальные дни, включительно),
+offer, brand (только клики) и event (только события). Статистика
+выгружается за последние days дней.
+
+Большие выгрузки подписчиков из админки пишутся в фоне в файл в EXPORT_DIR
+(start_file_export), а пользователь получает ссылку на скачивание.
+"""
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ClickLog, VKAdsEvent
+from .rollups import day_start
+from .statistics import get_brand_statistics, get_daily_statistics, get_offer_statistics, get_top_offers
+
+logger = logging.getLogger(__name__)
+
+# Строк на одно чтение курсора и на одну порцию ответа
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Источник -> (модель, столбцы, фильтр запроса -> lookup)
+LOG_EXPORTS = {
+    'clicks': (
+        ClickLog,
+        ['id', 'created_at', 'offer_id', 'brand', 'group_id', 'vk_user_id',
+         'subscriber_id', 'ip_address', 'user_agent'],
+        {'offer': 'offer_id', 'brand': 'brand'},
+    ),
+    'events': (
+        VKAdsEvent,
+        ['id', 'created_at', 'event_name', 'vk_user_id', 'event_params', 'success',
+         'error_message', 'platform', 'ip_address', 'user_agent'],
+        # offer_id в параметрах события фронтенд передаёт строкой
+        {'offer': 'event_params__offer_id', 'event': 'event_name'},
+    ),
+}
+
+STATISTICS_EXPORTS = {
+    'offers': get_offer_statistics,
+    'brands': get_brand_statistics,
+    'daily': get_daily_statistics,
+    'top-offers': get_top_offers,
+}
+
+SOURCES = sorted([*LOG_EXPORTS, *STATISTICS_EXPORTS])
+
+
+class ExportError(ValueError):
+    """Неизвестный источник, формат или неверный фильтр"""
+
+
+def _parse_day(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} must be YYYY-MM-DD')
+
+
+def _filter_value(model, lookup, name, value):
+    """
+    Значение фильтра по полю модели, приведённое к типу поля.
+
+    Queryset ленивый: без проверки неверное значение (offer=abc) всплыло бы
+    только при чтении курсора, уже после начала ответа.
+    """
+    if '__' in lookup:
+        return value
+    field = model._meta.get_field(lookup)
+    field = getattr(field, 'target_field', field)
+    try:
+        value = field.to_python(value)
+        field.run_validators(value)
+    except ValidationError as e:
+        raise ExportError(f"{name}: {'; '.join(e.messages)}")
+    return value
+
+
+def _log_rows(source, params):
+    model, columns, lookups = LOG_EXPORTS[source]
+    filters = {}
+    if params.get('date_from'):
+        filters['created_at__gte'] = day_start(_parse_day(params['date_from'], 'date_from'))
+    if params.get('date_to'):
+        filters['created_at__lt'] = day_start(_parse_day(params['date_to'], 'date_to') + timedelta(days=1))
+    for name in ('offer', 'brand', 'event'):
+        value = params.get(name)
+        if not value:
+            continue
+        if name not in lookups:
+            raise ExportError(f'{source} cannot be filtered by {name}')
+        filters[lookups[name]] = _filter_value(model, lookups[name], name, value)
+
+    rows = model.objects.filter(**filters).order_by('created_at', 'pk').values_list(*columns)
+    return columns, rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+def _statistics_rows(source, params):
+    try:
+        days = int(params.get('days') or 30)
+    except ValueError:
+        raise ExportError('days must be an integer')
+    results = STATISTICS_EXPORTS[source](days=days)
+    columns = list(results[0]) if results else []
+    return columns, (tuple(row.get(column) for column in columns) for row in results)
+
+
+def export_rows(source, params):
+    """
+    Столбцы и ленивый итератор строк (кортежей) источника.
+
+    Args:
+        source: clicks, events или статистика (offers, brands, daily, top-offers)
+        params: Фильтры (словарь или QueryDict)
+    """
+    if source in LOG_EXPORTS:
+        return _log_rows(source, params)
+    if source in STATISTICS_EXPORTS:
+        return _statistics_rows(source, params)
+    raise ExportError(f"unknown source '{source}', expected one of: {', '.join(SOURCES)}")
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """Файловый объект для csv.writer, который возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else _plain(value)
+            for value in row
+        ])
+
+
+def _jsonl_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_plain) + '\n'
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= CHUNK_SIZE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+class ExportStats:
+    """Число выгруженных строк и скорость выгрузки"""
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed) if self.elapsed else 0
+
+    def count(self, rows):
+        for row in rows:
+            self.rows += 1
+            yield row
+        self.elapsed = time.perf_counter() - self.started
+
+
+def stream_export(source, fmt, params, stats=None):
+    """
+    Выгрузка порциями строк (str) в формате fmt (csv или jsonl).
+
+    Параметры проверяются сразу (ExportError), а строки читаются по мере
+    потребления порций. По завершении в лог пишется скорость в строках/с.
+    """
+    if fmt not in CONTENT_TYPES:
+        raise ExportError(f"unknown format '{fmt}', expected one of: {', '.join(CONTENT_TYPES)}")
+    columns, rows = export_rows(source, params)
+    stats = stats or ExportStats()
+    encode = _csv_lines if fmt == 'csv' else _jsonl_lines
+
+    def chunks():
+        yield from _batched(encode(columns, stats.count(rows)))
+        logger.info(
+            f"Export {source}.{fmt}: {stats.rows} rows in {stats.elapsed:.2f}s "
+            f"({stats.rows_per_second} rows/s)"
+        )
+    return chunks()
+
+
+SUBSCRIBER_COLUMNS = [
+    'VK User ID',
+    'Group ID',
+    'Brand',
+    'Subscribed',
+    'Allowed From Group',
+    'Can Receive Messages',
+    'Created At',
+    'Subscribed At',
+    'Unsubscribed At',
+    'Total Clicks',
+]
+
+
+def _yes_no(value):
+    return 'Yes' if value else 'No'
+
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def subscriber_clicks():
+    """Подзапрос: число кликов подписчика"""
+    return Coalesce(Subquery(
+        ClickLog.objects.filter(
+            subscriber=OuterRef('pk')
+        ).order_by().values('subscriber').annotate(
+            total=Count('pk')
+        ).values('total')[:1]
+    ), 0)
+
+
+def subscriber_rows(queryset):
+    """
+    Столбцы и ленивый итератор строк выгрузки подписчиков.
+
+    Число кликов считается в том же запросе коррелированным подзапросом
+    (queryset из админки уже несёт его как _clicks_count), а строки читаются
+    курсором на стороне сервера пачками по CHUNK_SIZE.
+    """
+    if '_clicks_count' not in queryset.query.annotations:
+        queryset = queryset.annotate(_clicks_count=subscriber_clicks())
+    rows = queryset.order_by('pk').values_list(
+        'vk_user_id', 'group_id', 'brand', 'subscribed', 'allowed_from_group',
+        'created_at', 'subscribed_at', 'unsubscribed_at', '_clicks_count'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    return SUBSCRIBER_COLUMNS, (
+        (
+            vk_user_id, group_id, brand,
+            _yes_no(subscribed), _yes_no(allowed), _yes_no(subscribed and allowed),
+            _timestamp(created_at), _timestamp(subscribed_at), _timestamp(unsubscribed_at),
+            total_clicks,
+        )
+        for (vk_user_id, group_id, brand, subscribed, allowed,
+             created_at, subscribed_at, unsubscribed_at, total_clicks) in rows
+    )
+
+
+def stream_csv(columns, rows, bom=False):
+    """Порции CSV (str) из уже подготовленных строк; bom — UTF-8 BOM для Excel"""
+    if bom:
+        yield '\ufeff'
+    yield from _batched(_csv_lines(columns, rows))
+
+
+_TOKEN = re.compile(r'^[a-z-]+-[0-9a-f]{32}$')
+
+
+def export_file_path(token):
+    """Путь к готовому файлу фоновой выгрузки; None для чужих токенов"""
+    if not _TOKEN.match(token):
+        return None
+    return os.path.join(settings.EXPORT_DIR, f'{token}.csv')
+
+
+def file_export_status(token):
+    """ready / pending / failed / missing"""
+    path = export_file_path(token)
+    if path is None:
+        return 'missing'
+    for status, candidate in (('ready', path), ('pending', f'{path}.part'), ('failed', f'{path}.failed')):
+        if os.path.exists(candidate):
+            return status
+    return 'missing'
+
+
+def _remove_expired_exports():
+    """Удалить файлы выгрузок старше EXPORT_FILE_TTL"""
+    expires = time.time() - settings.EXPORT_FILE_TTL
+    for name in os.listdir(settings.EXPORT_DIR):
+        path = os.path.join(settings.EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < expires:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def _write_file_export(token, build_rows):
+    path = export_file_path(token)
+    stats = ExportStats()
+    try:
+        columns, rows = build_rows()
+        with open(f'{path}.part', 'w', encoding='utf-8', newline='') as output:
+            for chunk in stream_csv(columns, stats.count(rows), bom=True):
+                output.write(chunk)
+        os.replace(f'{path}.part', path)
+        logger.info(
+            f"Export {token}: {stats.rows} rows in {stats.elapsed:.2f}s ({stats.rows_per_second} rows/s)"
+        )
+    except Exception as e:
+        logger.exception(f"Export {token} failed")
+        with open(f'{path}.failed', 'w', encoding='utf-8') as failed:
+            failed.write(str(e))
+        if os.path.exists(f'{path}.part'):
+            os.remove(f'{path}.part')
+    finally:
+        # У потока своё соединение с БД
+        connection.close()
+
+
+def start_file_export(name, build_rows):
+    """
+    Запустить выгрузку в CSV-файл в фоновом потоке.
+
+    Файл пишется как <token>.csv.part и переименовывается по готовности.
+    Поток не переживает перезапуск воркера: недописанная выгрузка
+    останется в статусе pending до удаления по EXPORT_FILE_TTL.
+
+    Args:
+        name: Префикс имени файла (латиница и дефисы)
+        build_rows: Функция без аргументов -> (столбцы, итератор строк);
+            вызывается в фоновом потоке
+
+    Returns:
+        Токен для file_export_status / export_file_path
+    """
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    _remove_expired_exports()
+    token = f'{name}-{uuid.uuid4().hex}'
+    # Пустой .part сразу: статус pending виден до первой записи потока
+    open(f'{export_file_path(token)}.part', 'w').close()
+    threading.Thread(
+        target=_write_file_export, args=(token, build_rows), name=f'export-{token}', daemon=True
+    ).start()
+    return token
@@ -0,0 +1,108 @@
+"""
+HyperLogLog — приближённый подсчёт уникальных значений.
+
+Скетч занимает 2^precision байт (4 КБ при precision=12), объединяется
+поэлементным максимумом регистров и даёт оценку со стандартной
+относительной ошибкой 1.04 / sqrt(2^precision) (~1.6% при precision=12).
+
+Для хранения скетч сворачивается в список ненулевых регистров
+(to_entries: индекс << ENTRY_RANK_BITS | значение): у скетча с сотней
+пользователей это сотня чисел, а не 4 КБ, и объединять такие списки
+можно в SQL обычными GROUP BY / max (см. sketches.py).
+"""
+import hashlib
+import math
+
+DEFAULT_PRECISION = 12
+
+# Младшие биты элемента to_entries — значение регистра (не больше 64 - precision + 1)
+ENTRY_RANK_BITS = 6
+ENTRY_RANK_MASK = (1 << ENTRY_RANK_BITS) - 1
+
+
+def _hash64(value):
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HyperLogLog:
+    """Скетч HyperLogLog с 64-битным хэшем"""
+
+    def __init__(self, registers=None, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            self.registers = bytearray(self.m)
+        else:
+            if len(registers) != self.m:
+                raise ValueError(f"Expected {self.m} registers, got {len(registers)}")
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_entries(cls, entries, precision=DEFAULT_PRECISION):
+        """Восстановить скетч из списка ненулевых регистров (см. to_entries)"""
+        sketch = cls(precision=precision)
+        registers = sketch.registers
+        for entry in entries:
+            index = entry >> ENTRY_RANK_BITS
+            rank = entry & ENTRY_RANK_MASK
+            if rank > registers[index]:
+                registers[index] = rank
+        return sketch
+
+    @staticmethod
+    def relative_error(precision=DEFAULT_PRECISION):
+        """Стандартная относительная ошибка оценки"""
+        return 1.04 / (1 << precision) ** 0.5
+
+    def add(self, value):
+        """Добавить значение"""
+        x = _hash64(value)
+        index = x >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = x & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        """Добавить несколько значений"""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Объединить с другим скетчем (на месте)"""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches with different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Оценка числа уникальных значений"""
+        nonzero = [rank for rank in self.registers if rank]
+        return self.estimate(len(nonzero), sum(2.0 ** -rank for rank in nonzero), self.precision)
+
+    @staticmethod
+    def estimate(nonzero, inverse_sum, precision=DEFAULT_PRECISION):
+        """
+        Оценка по сводке регистров, посчитанной без самого скетча (например, в SQL).
+
+        Args:
+            nonzero: Число ненулевых регистров
+            inverse_sum: Сумма 2^-значение по ненулевым регистрам
+        """
+        m = 1 << precision
+        zeros = m - nonzero
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / (inverse_sum + zeros)
+        # Для малых мощностей точнее линейный подсчёт
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_entries(self):
+        """Ненулевые регистры: [индекс << ENTRY_RANK_BITS | значение]"""
+        return [
+            index << ENTRY_RANK_BITS | rank
+            for index, rank in enumerate(self.registers) if rank
+        ]
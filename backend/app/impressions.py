@@ -0,0 +1,165 @@
+"""
+Счётчики показов офферов (OfferImpressionHourly).
+
+Показ — это оффер в выдаче /api/offers/ (и первой странице /api/bootstrap/).
+Строка на каждый показ умножила бы число записей на размер страницы, поэтому
+воркер считает показы в памяти по ключу (час, оффер, бренд, позиция), а фоновый
+поток раз в IMPRESSION_FLUSH_INTERVAL прибавляет накопленное к строкам таблицы
+одним INSERT ... ON CONFLICT DO UPDATE (на каждые CHUNK_SIZE ключей).
+
+Если запись не удалась, счётчики возвращаются в память до следующей попытки.
+При завершении воркера (atexit) накопленное записывается синхронно.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Offer, OfferImpressionHourly
+from .rollups import CHUNK_SIZE, hour_bucket
+
+logger = logging.getLogger(__name__)
+
+# Максимум PositiveSmallIntegerField: показы на более дальних позициях не считаются
+MAX_POSITION = 32767
+
+
+def _upsert_sql(rows):
+    table = OfferImpressionHourly._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * rows)
+    return (
+        f'INSERT INTO {table} (bucket, offer_id, brand, position, impressions) VALUES {values} '
+        f'ON CONFLICT (bucket, offer_id, brand, position) '
+        f'DO UPDATE SET impressions = {table}.impressions + EXCLUDED.impressions'
+    )
+
+
+def write_impressions(counts):
+    """
+    Прибавить показы к почасовым строкам.
+
+    Args:
+        counts: {(bucket, offer_id, brand, position): показов}
+    """
+    # Оффер могли удалить, пока показы копились в памяти
+    offer_ids = {offer_id for _, offer_id, _, _ in counts}
+    existing_offers = set(Offer.objects.filter(id__in=offer_ids).values_list('id', flat=True))
+    items = [
+        (key, count) for key, count in counts.items()
+        if key[1] in existing_offers
+    ]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(items), CHUNK_SIZE):
+            chunk = items[start:start + CHUNK_SIZE]
+            params = []
+            for (bucket, offer_id, brand, position), count in chunk:
+                bucket = connection.ops.adapt_datetimefield_value(bucket)
+                params += [bucket, offer_id, brand, position, count]
+            cursor.execute(_upsert_sql(len(chunk)), params)
+
+
+class ImpressionCounter:
+    """
+    Счётчики показов в памяти воркера с фоновой записью.
+
+    Args:
+        flush_func: Функция, записывающая {ключ: показов}; исключение = запись не удалась
+        flush_interval: Интервал (сек) между записями
+    """
+
+    def __init__(self, flush_func, flush_interval=10.0):
+        self.flush_func = flush_func
+        self.flush_interval = flush_interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+    def record(self, offer_ids, brand='', first_position=1):
+        """
+        Учесть показ страницы офферов.
+
+        Args:
+            offer_ids: ID офферов в порядке выдачи
+            brand: Бренд приложения ('' — неизвестен)
+            first_position: Позиция первого оффера страницы в выдаче (с 1)
+        """
+        self._ensure_worker()
+        bucket = hour_bucket(timezone.now())
+        brand = brand or ''
+        with self._lock:
+            for position, offer_id in enumerate(offer_ids, first_position):
+                if position > MAX_POSITION:
+                    break
+                self._counts[(bucket, offer_id, brand, position)] += 1
+
+    def pending(self):
+        """Число ключей, ожидающих записи"""
+        with self._lock:
+            return len(self._counts)
+
+    def flush(self):
+        """Синхронно записать накопленные показы"""
+        with self._write_lock:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+            if not counts:
+                return
+            close_old_connections()
+            try:
+                self.flush_func(counts)
+            except Exception as e:
+                logger.error(f"Impressions flush of {len(counts)} keys failed: {e}")
+                connection.close()
+                with self._lock:
+                    self._counts.update(counts)
+
+    def shutdown(self, timeout=5.0):
+        """Остановить фоновый поток и записать остаток"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def _ensure_worker(self):
+        # Поток запускается лениво и отдельно в каждом процессе (после fork)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Счётчики родителя записывает сам родитель
+                self._counts = Counter()
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='impressions-flusher', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+impression_counter = ImpressionCounter(
+    write_impressions,
+    flush_interval=settings.IMPRESSION_FLUSH_INTERVAL,
+)
+
+
+def record_impressions(offer_ids, brand='', first_position=1):
+    """Учесть показ страницы офферов (см. ImpressionCounter.record)"""
+    impression_counter.record(offer_ids, brand=brand, first_position=first_position)
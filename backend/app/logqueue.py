@@ -0,0 +1,97 @@
+"""
+Неблокирующий вывод логов через QueueHandler.
+
+Запрос только кладёт запись лога в ограниченную очередь, а форматирование
+и запись в поток выполняет фоновый QueueListener воркера. При переполненной
+очереди запись отбрасывается (счётчик dropped), а не задерживает запрос.
+
+Подключается в LOGGING (config/settings.py) как обработчик
+app.logqueue.QueueingStreamHandler; модуль не импортирует Django, потому что
+логирование настраивается до загрузки приложений.
+"""
+import logging
+import os
+import queue
+import threading
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+
+_handlers = weakref.WeakSet()
+
+
+class _BlockingStopListener(QueueListener):
+    """При остановке ждёт место в очереди для маркера, а не падает на Full"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class QueueingStreamHandler(QueueHandler):
+    """
+    QueueHandler с собственным QueueListener, который пишет в поток (stderr).
+
+    Слушатель запускается лениво и отдельно в каждом процессе (после fork),
+    а при close() (logging.shutdown при выходе, drain_logging) дописывает очередь.
+
+    Args:
+        maxsize: Максимальное число записей в очереди
+        stream: Поток вывода (по умолчанию stderr)
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._listener_lock = threading.Lock()
+        _handlers.add(self)
+
+    def setFormatter(self, fmt):
+        # Форматирует слушатель: QueueHandler передаёт уже подставленное сообщение
+        self.target.setFormatter(fmt)
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._listener = _BlockingStopListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+
+    def drain(self):
+        """Остановить слушатель, дописав очередь; следующая запись запустит новый"""
+        with self._listener_lock:
+            listener = self._listener
+            self._listener = None
+            if listener is not None and self._pid == os.getpid():
+                listener.stop()
+
+    def close(self):
+        self.drain()
+        self.target.close()
+        super().close()
+
+
+def drain_logging():
+    """Дописать очереди всех QueueingStreamHandler (при завершении воркера)"""
+    for handler in list(_handlers):
+        handler.drain()
+
+
+def logging_metrics():
+    """Глубина очередей логов и число отброшенных записей в текущем процессе"""
+    handlers = list(_handlers)
+    return {
+        'queue_depth': sum(handler.queue.qsize() for handler in handlers),
+        'dropped': sum(handler.dropped for handler in handlers),
+    }
@@ -0,0 +1,51 @@
+"""
+Перенос старых кликов и событий VK Ads в архив (см. archive.py).
+
+Запуск (например, по cron раз в сутки):
+    python manage.py archive_logs
+    python manage.py archive_logs --days 180
+    python manage.py archive_logs --model clicks --no-delete
+
+Агрегаты кликов не архивируются. На PostgreSQL опустевшие помесячные
+секции затем удаляются командой manage_partitions --retention-months.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.archive import archive_cutoff, archive_rows
+from app.models import ClickLog, VKAdsEvent
+
+MODELS = {
+    'clicks': ClickLog,
+    'events': VKAdsEvent,
+}
+
+
+class Command(BaseCommand):
+    help = 'Переносит клики и события VK Ads старше срока хранения в сжатые CSV-файлы по дням'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Срок хранения в БД, дней (по умолчанию ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--model', choices=sorted(MODELS), help='Обработать только эту таблицу')
+        parser.add_argument('--no-delete', action='store_true',
+                            help='Только выгрузить файлы, не удаляя строки из БД')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is not None and days < 1:
+            raise CommandError('--days must be at least 1')
+
+        cutoff = archive_cutoff(timezone.localdate(), days)
+        names = [options['model']] if options['model'] else list(MODELS)
+        for name in names:
+            model = MODELS[name]
+            archived = archive_rows(model, cutoff, delete=not options['no_delete'])
+            for day, count in archived.items():
+                self.stdout.write(f'{model._meta.db_table}: {day} — {count} rows')
+            self.stdout.write(
+                f'{model._meta.db_table}: archived {sum(archived.values())} rows '
+                f'in {len(archived)} days before {cutoff}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Done'))
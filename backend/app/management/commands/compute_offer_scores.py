@@ -0,0 +1,35 @@
+"""
+Пересчёт оценок популярности офферов (sort=popular).
+
+Запуск (в проде — раз в час сервисом maintenance, см. docker-compose.prod.yml):
+    python manage.py compute_offer_scores
+    python manage.py compute_offer_scores --days 14 --half-life 3
+"""
+from django.core.management.base import BaseCommand
+
+from app.scoring import (
+    SCORE_HALF_LIFE_DAYS,
+    SCORE_PRIOR_IMPRESSIONS,
+    SCORE_WINDOW_DAYS,
+    update_offer_scores,
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Offer.popularity_score (сглаженный CTR) по агрегатам кликов и показов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=SCORE_WINDOW_DAYS,
+                            help=f'Окно в днях (по умолчанию {SCORE_WINDOW_DAYS})')
+        parser.add_argument('--half-life', type=float, default=SCORE_HALF_LIFE_DAYS,
+                            help=f'Период полураспада веса кликов и показов в днях (по умолчанию {SCORE_HALF_LIFE_DAYS})')
+        parser.add_argument('--prior-impressions', type=float, default=SCORE_PRIOR_IMPRESSIONS,
+                            help=f'Сила сглаживания к среднему CTR каталога, показов (по умолчанию {SCORE_PRIOR_IMPRESSIONS})')
+
+    def handle(self, *args, **options):
+        changed = update_offer_scores(
+            days=options['days'],
+            half_life=options['half_life'],
+            prior_impressions=options['prior_impressions'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Updated scores of {changed} offers'))
@@ -0,0 +1,53 @@
+"""
+Потоковая выгрузка кликов, событий VK Ads и статистики в CSV / JSONL (см. exports.py).
+
+Запуск:
+    python manage.py export_logs clicks --date-from 2024-01-01 --date-to 2024-01-31 -o clicks.csv
+    python manage.py export_logs events --format jsonl --event lead -o events.jsonl
+    python manage.py export_logs offers --days 7
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.exports import CONTENT_TYPES, SOURCES, ExportError, ExportStats, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Выгружает клики, события VK Ads или статистику в CSV / JSONL с постоянным расходом памяти'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', choices=SOURCES)
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--date-from', help='Первый локальный день, YYYY-MM-DD')
+        parser.add_argument('--date-to', help='Последний локальный день (включительно), YYYY-MM-DD')
+        parser.add_argument('--offer', help='ID оффера')
+        parser.add_argument('--brand', help='Бренд (только clicks)')
+        parser.add_argument('--event', help='Тип события (только events)')
+        parser.add_argument('--days', type=int, help='Период статистики, дней (для offers, brands, daily, top-offers)')
+        parser.add_argument('-o', '--output', help='Файл (по умолчанию — stdout)')
+
+    def handle(self, *args, **options):
+        params = {
+            name: options[name]
+            for name in ('date_from', 'date_to', 'offer', 'brand', 'event', 'days')
+            if options[name] is not None
+        }
+        stats = ExportStats()
+        try:
+            chunks = stream_export(options['source'], options['format'], params, stats)
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        # Скорость — в stderr, чтобы не смешивать с выгрузкой в stdout
+        self.stderr.write(
+            f"{options['source']}: {stats.rows} rows in {stats.elapsed:.2f}s ({stats.rows_per_second} rows/s)"
+        )
@@ -0,0 +1,79 @@
+"""
+Обслуживание помесячных секций click_logs и vk_ads_events (см. partitions.py).
+
+Запуск (в docker-compose.prod.yml — сервис maintenance, раз в час):
+    python manage.py manage_partitions
+    python manage.py manage_partitions --ahead 6
+    python manage.py manage_partitions --retention-months 12
+    python manage.py manage_partitions --list
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.partitions import (
+    DEFAULT_MONTHS_AHEAD,
+    PARTITIONED_TABLES,
+    add_months,
+    default_partition_rows,
+    drop_partitions_before,
+    ensure_partitions,
+    is_partitioned,
+    is_supported,
+    list_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт помесячные секции журналов заранее и удаляет секции старше '
+        'срока хранения (только PostgreSQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=DEFAULT_MONTHS_AHEAD,
+                            help=f'На сколько месяцев вперёд создать секции (по умолчанию {DEFAULT_MONTHS_AHEAD})')
+        parser.add_argument('--retention-months', type=int,
+                            help='Удалить секции, которые целиком старше стольких месяцев '
+                                 '(агрегаты кликов при этом сохраняются)')
+        parser.add_argument('--table', choices=sorted(PARTITIONED_TABLES),
+                            help='Обработать только эту таблицу')
+        parser.add_argument('--list', action='store_true', help='Только показать секции')
+
+    def handle(self, *args, **options):
+        if not is_supported(connection):
+            self.stdout.write(self.style.WARNING(
+                f'Partitioning requires PostgreSQL, current database is {connection.vendor}'
+            ))
+            return
+        retention = options['retention_months']
+        if retention is not None and retention < 1:
+            raise CommandError('--retention-months must be at least 1')
+
+        tables = [options['table']] if options['table'] else list(PARTITIONED_TABLES)
+        for table in tables:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if not is_partitioned(cursor, table):
+                    self.stdout.write(self.style.WARNING(f'{table}: not partitioned, run migrate first'))
+                    continue
+
+                if options['list']:
+                    for month, name in list_partitions(cursor, table):
+                        self.stdout.write(f'{table}: {name} ({month:%Y-%m})')
+                else:
+                    for name in ensure_partitions(cursor, table, options['ahead']):
+                        self.stdout.write(f'{table}: created {name}')
+                    if retention is not None:
+                        cutoff = add_months(month_start(timezone.localdate()), -retention)
+                        for name in drop_partitions_before(cursor, table, cutoff):
+                            self.stdout.write(f'{table}: dropped {name}')
+
+                # Строки месяцев вне созданных секций (например, дальше --ahead)
+                stray = default_partition_rows(cursor, table)
+                if stray:
+                    self.stdout.write(self.style.WARNING(
+                        f'{table}: {stray} rows in {table}_default (outside monthly partitions)'
+                    ))
+
+        self.stdout.write(self.style.SUCCESS('Done'))
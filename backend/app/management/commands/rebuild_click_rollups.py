@@ -0,0 +1,56 @@
+"""
+Пересчёт агрегатов кликов и скетчей уникальных пользователей по сырым ClickLog.
+
+Запуск:
+    python manage.py rebuild_click_rollups --days 30
+
+Агрегаты и скетчи за дни до их появления заполняются один раз вручную после деплоя
+(каждый день пересчитывается в своей транзакции):
+    python manage.py rebuild_click_rollups --all
+
+Дни, уже перенесённые в архив (см. archive.py), пропускаются:
+их сырых кликов в БД нет, и пересчёт обнулил бы агрегаты.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from app.archive import archived_files
+from app.models import ClickLog
+from app.rollups import day_bucket, rebuild_rollups
+from app.sketches import rebuild_sketches
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегаты кликов и скетчи уникальных пользователей по сырым ClickLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help='Сколько последних дней обработать (по умолчанию 2)')
+        parser.add_argument('--all', action='store_true',
+                            help='Обработать все дни начиная с самого старого клика в БД (вместо --days)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['all']:
+            oldest = ClickLog.objects.aggregate(oldest=Min('created_at'))['oldest']
+            if oldest is None:
+                self.stdout.write('No clicks in the database')
+                return
+            first_day = day_bucket(oldest)
+        else:
+            first_day = today - timedelta(days=options['days'] - 1)
+        days = [first_day + timedelta(days=offset) for offset in range((today - first_day).days + 1)]
+
+        archived_days = {day for day, _ in archived_files(ClickLog, days[0])}
+        for day in days:
+            if day in archived_days:
+                self.stdout.write(f"{day}: archived, skipped")
+                continue
+            hourly, daily = rebuild_rollups(day)
+            sketches = rebuild_sketches(day)
+            self.stdout.write(f"{day}: rebuilt {hourly} hourly / {daily} daily rows, {sketches} sketches")
+
+        self.stdout.write(self.style.SUCCESS('Done'))
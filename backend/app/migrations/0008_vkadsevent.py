@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_appconfig_vk_button'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VKAdsEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_name', models.CharField(choices=[('lead', 'Лид (клик на оффер)'), ('subscribe', 'Подписка на уведомления'), ('product_card', 'Просмотр карточки'), ('purchase', 'Покупка'), ('add_to_cart', 'Добавление в корзину'), ('visit_website', 'Посещение сайта')], db_index=True, max_length=50, verbose_name='Тип события')),
+                ('vk_user_id', models.CharField(blank=True, db_index=True, max_length=100, null=True, verbose_name='VK User ID')),
+                ('event_params', models.JSONField(blank=True, help_text='offer_id, partner_name и др.', null=True, verbose_name='Параметры события')),
+                ('success', models.BooleanField(default=True, verbose_name='Успешно отправлено')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name='Сообщение об ошибке')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='IP адрес')),
+                ('user_agent', models.TextField(blank=True, null=True, verbose_name='User Agent')),
+                ('platform', models.CharField(blank=True, help_text='iOS, Android, Web', max_length=50, null=True, verbose_name='Платформа')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'VK Ads событие',
+                'verbose_name_plural': 'VK Ads события',
+                'db_table': 'vk_ads_events',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['event_name', 'created_at'], name='vk_ads_even_event_n_9603fa_idx'), models.Index(fields=['vk_user_id', 'created_at'], name='vk_ads_even_vk_user_2ce6c9_idx')],
+            },
+        ),
+    ]
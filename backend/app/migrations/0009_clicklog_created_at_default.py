@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_vkadsevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clicklog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата клика'),
+        ),
+    ]
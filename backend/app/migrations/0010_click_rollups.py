@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_clicklog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickRollupHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='Час')),
+                ('brand', models.CharField(blank=True, max_length=50, null=True, verbose_name='Бренд')),
+                ('group_id', models.CharField(blank=True, max_length=100, null=True, verbose_name='Group ID')),
+                ('clicks', models.PositiveIntegerField(default=0, verbose_name='Кликов')),
+                ('offer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.offer', verbose_name='Оффер')),
+            ],
+            options={
+                'verbose_name': 'Клики по часам',
+                'verbose_name_plural': 'Клики по часам',
+                'db_table': 'click_rollups_hourly',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['bucket'], name='click_rollu_bucket_5477bf_idx'), models.Index(fields=['offer', 'bucket'], name='click_rollu_offer_i_aaa295_idx'), models.Index(fields=['brand', 'bucket'], name='click_rollu_brand_a56ad1_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClickRollupDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateField(verbose_name='День')),
+                ('brand', models.CharField(blank=True, max_length=50, null=True, verbose_name='Бренд')),
+                ('group_id', models.CharField(blank=True, max_length=100, null=True, verbose_name='Group ID')),
+                ('clicks', models.PositiveIntegerField(default=0, verbose_name='Кликов')),
+                ('offer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.offer', verbose_name='Оффер')),
+            ],
+            options={
+                'verbose_name': 'Клики по дням',
+                'verbose_name_plural': 'Клики по дням',
+                'db_table': 'click_rollups_daily',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['bucket'], name='click_rollu_bucket_d70dc4_idx'), models.Index(fields=['offer', 'bucket'], name='click_rollu_offer_i_53969d_idx'), models.Index(fields=['brand', 'bucket'], name='click_rollu_brand_f317d4_idx')],
+            },
+        ),
+    ]
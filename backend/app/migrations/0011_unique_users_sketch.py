@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_click_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UniqueUsersSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('scope', models.CharField(choices=[('total', 'Все клики'), ('offer', 'Оффер'), ('brand', 'Бренд')], max_length=10, verbose_name='Разрез')),
+                ('key', models.CharField(blank=True, default='', help_text='ID оффера или бренд; пусто для разреза «Все клики»', max_length=100, verbose_name='Ключ')),
+                ('registers', models.BinaryField(verbose_name='Регистры HLL')),
+            ],
+            options={
+                'verbose_name': 'Скетч уникальных пользователей',
+                'verbose_name_plural': 'Скетчи уникальных пользователей',
+                'db_table': 'unique_users_sketches',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='uniqueuserssketch',
+            constraint=models.UniqueConstraint(fields=('scope', 'key', 'day'), name='unique_users_sketch_key'),
+        ),
+    ]
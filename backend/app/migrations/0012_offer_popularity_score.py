@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_unique_users_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, help_text='Сглаженное число кликов в день за последние недели', verbose_name='Популярность'),
+        ),
+    ]
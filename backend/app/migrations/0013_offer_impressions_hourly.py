@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_offer_popularity_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferImpressionHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='Час')),
+                ('brand', models.CharField(blank=True, default='', max_length=50, verbose_name='Бренд')),
+                ('position', models.PositiveSmallIntegerField(help_text='Позиция в выдаче, начиная с 1', verbose_name='Позиция')),
+                ('impressions', models.PositiveIntegerField(default=0, verbose_name='Показов')),
+                ('offer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.offer', verbose_name='Оффер')),
+            ],
+            options={
+                'verbose_name': 'Показы по часам',
+                'verbose_name_plural': 'Показы по часам',
+                'db_table': 'offer_impressions_hourly',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['offer', 'bucket'], name='offer_impre_offer_i_9af39e_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='offerimpressionhourly',
+            constraint=models.UniqueConstraint(fields=('bucket', 'offer', 'brand', 'position'), name='offer_impression_key'),
+        ),
+    ]
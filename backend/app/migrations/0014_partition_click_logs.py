@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from app.partitions import PARTITIONED_TABLES, is_partitioned, is_supported, partition_table, unpartition_table
+
+
+def partition_tables(apps, schema_editor):
+    # Секционирование есть только в PostgreSQL
+    if not is_supported(schema_editor.connection):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, column in PARTITIONED_TABLES.items():
+            if not is_partitioned(cursor, table):
+                partition_table(cursor, table, column)
+
+
+def unpartition_tables(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            if is_partitioned(cursor, table):
+                unpartition_table(cursor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_offer_impressions_hourly'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
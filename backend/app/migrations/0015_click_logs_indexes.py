@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_partition_click_logs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clicklog',
+            index=models.Index(fields=['created_at'], include=('offer', 'brand', 'vk_user_id'), name='click_logs_created_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clicklog',
+            index=models.Index(fields=['offer', 'created_at'], include=('vk_user_id', 'brand'), name='click_logs_offer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clicklog',
+            index=models.Index(fields=['brand', 'created_at'], include=('vk_user_id',), name='click_logs_brand_created_idx'),
+        ),
+    ]
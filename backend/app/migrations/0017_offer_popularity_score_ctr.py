@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_vkadsevent_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='offer',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, help_text='Сглаженный CTR (клики / показы) за последние недели', verbose_name='Популярность'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def _merge_and_index(table):
+    # Схлопываем строки-приращения в одну строку на ключ, затем запрещаем дубликаты:
+    # агрегаты обновляются через INSERT ... ON CONFLICT (см. rollups.py).
+    # Отложенные проверки внешних ключей после INSERT не дают создать индекс в той же транзакции
+    # (pending trigger events), поэтому выполняем их сразу
+    return f'''
+        WITH merged AS (
+            DELETE FROM {table} RETURNING bucket, offer_id, brand, group_id, clicks
+        )
+        INSERT INTO {table} (bucket, offer_id, brand, group_id, clicks)
+        SELECT bucket, offer_id, brand, group_id, SUM(clicks) FROM merged
+        GROUP BY bucket, offer_id, brand, group_id;
+
+        SET CONSTRAINTS ALL IMMEDIATE;
+        CREATE UNIQUE INDEX {table}_key ON {table} (bucket, offer_id, brand, group_id) NULLS NOT DISTINCT;
+    '''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_offer_popularity_score_ctr'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            _merge_and_index('click_rollups_hourly'),
+            'DROP INDEX IF EXISTS click_rollups_hourly_key;',
+        ),
+        migrations.RunSQL(
+            _merge_and_index('click_rollups_daily'),
+            'DROP INDEX IF EXISTS click_rollups_daily_key;',
+        ),
+    ]
@@ -0,0 +1,48 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+# Плотные регистры (4096 байт) -> список ненулевых регистров (индекс << 6 | значение), см. hll.py
+TO_ENTRIES = '''
+    UPDATE unique_users_sketches SET entries = ARRAY(
+        SELECT i << 6 | get_byte(registers, i)
+        FROM generate_series(0, length(registers) - 1) AS i
+        WHERE get_byte(registers, i) > 0
+        ORDER BY i
+    );
+'''
+
+TO_REGISTERS = '''
+    UPDATE unique_users_sketches SET registers = (
+        SELECT decode(string_agg(lpad(to_hex(coalesce(rank, 0)), 2, '0'), '' ORDER BY i), 'hex')
+        FROM generate_series(0, 4095) AS i
+        LEFT JOIN (
+            SELECT entry >> 6 AS idx, max(entry & 63) AS rank FROM unnest(entries) AS entry GROUP BY 1
+        ) AS nonzero ON nonzero.idx = i
+    );
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_click_rollups_key'),
+    ]
+
+    operations = [
+        # Nullable, чтобы при откате колонку можно было вернуть и заполнить из entries
+        migrations.AlterField(
+            model_name='uniqueuserssketch',
+            name='registers',
+            field=models.BinaryField(null=True, verbose_name='Регистры HLL'),
+        ),
+        migrations.AddField(
+            model_name='uniqueuserssketch',
+            name='entries',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, help_text='Ненулевые регистры: индекс << 6 | значение', size=None, verbose_name='Регистры HLL'),
+        ),
+        migrations.RunSQL(TO_ENTRIES, TO_REGISTERS),
+        migrations.RemoveField(
+            model_name='uniqueuserssketch',
+            name='registers',
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 from django.utils import timezone
 import json
@@ -308,6 +309,9 @@ class Offer(models.Model):
                                       help_text='Неактивные офферы не показываются пользователям')
     priority = models.IntegerField(default=0, verbose_name='Приоритет',
                                      help_text='Чем выше число, тем выше в списке')
+    # Пересчитывается командой compute_offer_scores (см. scoring.py), используется в sort=popular
+    popularity_score = models.FloatField(default=0, editable=False, verbose_name='Популярность',
+                                         help_text='Сглаженный CTR (клики / показы) за последние недели')
     
     # Даты
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
@@ -375,7 +379,8 @@ class ClickLog(models.Model):
     )
     group_id = models.CharField(max_length=100, null=True, blank=True, verbose_name='Group ID')
     brand = models.CharField(max_length=50, null=True, blank=True, verbose_name='Бренд')
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата клика')
+    # Время клика задаётся при постановке в буфер, а не при записи в БД (см. clicks.py)
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Дата клика')
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='IP адрес')
     user_agent = models.TextField(null=True, blank=True, verbose_name='User Agent')
 
@@ -384,11 +389,160 @@ class ClickLog(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Клик по офферу'
         verbose_name_plural = 'Клики по офферам'
+        # Пути доступа статистики (statistics.py) и фильтров админки:
+        # выборки по периоду с группировкой по офферу / бренду / пользователю
+        # читаются только из индекса (Index Only Scan), см. benchmarks/explain.py
+        indexes = [
+            models.Index(fields=['created_at'], include=['offer', 'brand', 'vk_user_id'],
+                         name='click_logs_created_cover_idx'),
+            models.Index(fields=['offer', 'created_at'], include=['vk_user_id', 'brand'],
+                         name='click_logs_offer_created_idx'),
+            models.Index(fields=['brand', 'created_at'], include=['vk_user_id'],
+                         name='click_logs_brand_created_idx'),
+        ]
 
     def __str__(self):
         return f"Click {self.offer.partner_name} by {self.vk_user_id} at {self.created_at}"
 
 
+class ClickRollupHourly(models.Model):
+    """
+    Агрегаты кликов по часам (оффер / бренд / группа).
+
+    Одна строка на ключ: счётчики прибавляются при записи пачек кликов
+    (см. rollups.py). Уникальный индекс ключа создаёт миграция 0018.
+    """
+    bucket = models.DateTimeField(verbose_name='Час')
+    offer = models.ForeignKey(
+        Offer,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Оффер',
+        null=True,
+        blank=True
+    )
+    brand = models.CharField(max_length=50, null=True, blank=True, verbose_name='Бренд')
+    group_id = models.CharField(max_length=100, null=True, blank=True, verbose_name='Group ID')
+    clicks = models.PositiveIntegerField(default=0, verbose_name='Кликов')
+
+    class Meta:
+        db_table = 'click_rollups_hourly'
+        ordering = ['-bucket']
+        verbose_name = 'Клики по часам'
+        verbose_name_plural = 'Клики по часам'
+        indexes = [
+            models.Index(fields=['bucket']),
+            models.Index(fields=['offer', 'bucket']),
+            models.Index(fields=['brand', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%d.%m.%Y %H:00} | offer {self.offer_id} | {self.brand}: {self.clicks}"
+
+
+class ClickRollupDaily(models.Model):
+    """Агрегаты кликов по дням (оффер / бренд / группа), см. ClickRollupHourly"""
+    bucket = models.DateField(verbose_name='День')
+    offer = models.ForeignKey(
+        Offer,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Оффер',
+        null=True,
+        blank=True
+    )
+    brand = models.CharField(max_length=50, null=True, blank=True, verbose_name='Бренд')
+    group_id = models.CharField(max_length=100, null=True, blank=True, verbose_name='Group ID')
+    clicks = models.PositiveIntegerField(default=0, verbose_name='Кликов')
+
+    class Meta:
+        db_table = 'click_rollups_daily'
+        ordering = ['-bucket']
+        verbose_name = 'Клики по дням'
+        verbose_name_plural = 'Клики по дням'
+        indexes = [
+            models.Index(fields=['bucket']),
+            models.Index(fields=['offer', 'bucket']),
+            models.Index(fields=['brand', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%d.%m.%Y} | offer {self.offer_id} | {self.brand}: {self.clicks}"
+
+
+class OfferImpressionHourly(models.Model):
+    """
+    Показы офферов по часам (оффер / бренд / позиция в выдаче).
+
+    Показы считаются в памяти воркера и периодически прибавляются к строкам
+    одним INSERT ... ON CONFLICT (см. impressions.py), поэтому на ключ
+    приходится ровно одна строка.
+    """
+    bucket = models.DateTimeField(verbose_name='Час')
+    offer = models.ForeignKey(
+        Offer,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Оффер'
+    )
+    brand = models.CharField(max_length=50, blank=True, default='', verbose_name='Бренд')
+    position = models.PositiveSmallIntegerField(verbose_name='Позиция', help_text='Позиция в выдаче, начиная с 1')
+    impressions = models.PositiveIntegerField(default=0, verbose_name='Показов')
+
+    class Meta:
+        db_table = 'offer_impressions_hourly'
+        ordering = ['-bucket']
+        verbose_name = 'Показы по часам'
+        verbose_name_plural = 'Показы по часам'
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'offer', 'brand', 'position'], name='offer_impression_key'),
+        ]
+        indexes = [
+            models.Index(fields=['offer', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%d.%m.%Y %H:00} | offer {self.offer_id} | #{self.position}: {self.impressions}"
+
+
+class UniqueUsersSketch(models.Model):
+    """
+    HyperLogLog-скетч уникальных пользователей за день (см. hll.py, sketches.py).
+
+    Скетчи объединяются за любой период без потери точности оценки,
+    поэтому уникальных пользователей за N дней можно получить без COUNT(DISTINCT).
+    Хранятся только ненулевые регистры (HyperLogLog.to_entries), и объединяет
+    их сама БД, возвращая по строке на оффер, бренд или день.
+    """
+    SCOPE_TOTAL = 'total'
+    SCOPE_OFFER = 'offer'
+    SCOPE_BRAND = 'brand'
+    SCOPES = [
+        (SCOPE_TOTAL, 'Все клики'),
+        (SCOPE_OFFER, 'Оффер'),
+        (SCOPE_BRAND, 'Бренд'),
+    ]
+
+    day = models.DateField(verbose_name='День')
+    scope = models.CharField(max_length=10, choices=SCOPES, verbose_name='Разрез')
+    key = models.CharField(max_length=100, blank=True, default='', verbose_name='Ключ',
+                           help_text='ID оффера или бренд; пусто для разреза «Все клики»')
+    entries = ArrayField(models.IntegerField(), default=list, verbose_name='Регистры HLL',
+                         help_text='Ненулевые регистры: индекс << 6 | значение')
+
+    class Meta:
+        db_table = 'unique_users_sketches'
+        ordering = ['-day']
+        verbose_name = 'Скетч уникальных пользователей'
+        verbose_name_plural = 'Скетчи уникальных пользователей'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key', 'day'], name='unique_users_sketch_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day:%d.%m.%Y} | {self.scope}:{self.key}"
+
+
 class VKAdsEvent(models.Model):
     """Логирование событий VK Ads"""
     EVENT_TYPES = [
@@ -417,7 +571,8 @@ class VKAdsEvent(models.Model):
     platform = models.CharField(max_length=50, null=True, blank=True, verbose_name='Платформа',
                                  help_text='iOS, Android, Web')
     
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания', db_index=True)
+    # Время события задаётся при постановке в очередь, а не при записи в БД (см. vk_ads_logger.py)
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Дата создания', db_index=True)
     
     class Meta:
         db_table = 'vk_ads_events'
@@ -0,0 +1,201 @@
+"""
+Индекс для подбора офферов по сумме и сроку.
+
+Оффер подходит, если sum_min <= sum_need <= sum_max и term_min <= term_days <= term_max,
+то есть запрос — это «протыкание» двух интервалов точкой. Для каждого измерения
+строится центрированное дерево интервалов, а для каждого режима sort_by заранее
+вычисляется порядок офферов, поэтому результат возвращается уже отсортированным.
+
+Модуль не зависит от Django: индекс строится по любым объектам с полями
+id/sum_min/sum_max/term_min/term_max/rate/priority/popularity_score.
+"""
+from bisect import bisect_left, bisect_right
+
+# Ключи сортировки для каждого режима sort_by. Последний элемент (-id) делает
+# порядок полным (более новые офферы раньше), поэтому ключ последнего оффера
+# страницы однозначно задаёт место продолжения (см. OfferIndex.after)
+SORT_KEYS = {
+    'rate': lambda offer: (offer.rate, -offer.priority, -offer.id),
+    'sum': lambda offer: (-offer.sum_max, -offer.priority, -offer.id),
+    'term': lambda offer: (-offer.term_max, -offer.priority, -offer.id),
+    # По популярности (popularity_score пересчитывается в фоне, см. scoring.py)
+    'popular': lambda offer: (-offer.popularity_score, -offer.priority, -offer.id),
+    # По умолчанию сортируем по приоритету
+    'priority': lambda offer: (-offer.priority, offer.rate, -offer.id),
+}
+
+DEFAULT_SORT = 'priority'
+
+
+def sort_mode(sort_by):
+    """Режим сортировки (неизвестный режим = DEFAULT_SORT)"""
+    return sort_by if sort_by in SORT_KEYS else DEFAULT_SORT
+
+# Если совпадений больше этой доли каталога, дешевле пройти по готовому
+# порядку с маской, чем сортировать совпадения
+DENSE_MATCH_RATIO = 0.25
+
+
+class _IntervalNode:
+    """Узел центрированного дерева интервалов"""
+    __slots__ = ('center', 'los', 'pos_by_lo', 'his', 'pos_by_hi', 'left', 'right')
+
+    def __init__(self, center, intervals):
+        self.center = center
+        by_lo = sorted(intervals, key=lambda item: item[0])
+        by_hi = sorted(intervals, key=lambda item: item[1])
+        self.los = [item[0] for item in by_lo]
+        self.pos_by_lo = [item[2] for item in by_lo]
+        self.his = [item[1] for item in by_hi]
+        self.pos_by_hi = [item[2] for item in by_hi]
+        self.left = None
+        self.right = None
+
+
+class IntervalTree:
+    """
+    Центрированное дерево интервалов.
+
+    stab(x) возвращает позиции всех интервалов [lo, hi], содержащих x,
+    за O(log n + m), где m — число найденных интервалов.
+    """
+
+    def __init__(self, intervals):
+        """
+        Args:
+            intervals: Список кортежей (lo, hi, pos)
+        """
+        self.root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        endpoints = sorted([item[0] for item in intervals] + [item[1] for item in intervals])
+        center = endpoints[len(endpoints) // 2]
+
+        left, right, here = [], [], []
+        for item in intervals:
+            if item[1] < center:
+                left.append(item)
+            elif item[0] > center:
+                right.append(item)
+            else:
+                here.append(item)
+
+        node = _IntervalNode(center, here)
+        node.left = self._build(left)
+        node.right = self._build(right)
+        return node
+
+    def stab(self, x):
+        """Позиции интервалов, содержащих точку x"""
+        result = []
+        node = self.root
+        while node is not None:
+            if x < node.center:
+                # Все интервалы узла заканчиваются правее x, проверяем только начало
+                result.extend(node.pos_by_lo[:bisect_right(node.los, x)])
+                node = node.left
+            elif x > node.center:
+                # Все интервалы узла начинаются левее x, проверяем только конец
+                result.extend(node.pos_by_hi[bisect_left(node.his, x):])
+                node = node.right
+            else:
+                result.extend(node.pos_by_lo)
+                break
+        return result
+
+
+class OfferIndex:
+    """
+    Индекс офферов для запросов по сумме/сроку с готовой сортировкой.
+
+    Позиции в результатах — индексы в кортеже self.offers.
+    """
+
+    def __init__(self, offers):
+        self.offers = tuple(offers)
+        self.sum_tree = IntervalTree(
+            (offer.sum_min, offer.sum_max, pos) for pos, offer in enumerate(self.offers)
+        )
+        self.term_tree = IntervalTree(
+            (offer.term_min, offer.term_max, pos) for pos, offer in enumerate(self.offers)
+        )
+
+        # Готовый порядок, ранг каждой позиции и отсортированные ключи
+        # для каждого режима сортировки
+        self.orders = {}
+        self.ranks = {}
+        self.sorted_keys = {}
+        for mode, key in SORT_KEYS.items():
+            keys = [key(offer) for offer in self.offers]
+            order = sorted(range(len(self.offers)), key=keys.__getitem__)
+            rank = [0] * len(order)
+            for i, pos in enumerate(order):
+                rank[pos] = i
+            self.orders[mode] = order
+            self.ranks[mode] = rank
+            self.sorted_keys[mode] = [keys[pos] for pos in order]
+
+    def __len__(self):
+        return len(self.offers)
+
+    def query(self, sum_need=None, term_days=None, sort_by='rate'):
+        """
+        Найти подходящие офферы.
+
+        Args:
+            sum_need: Нужная сумма (None — без фильтра)
+            term_days: Нужный срок (None — без фильтра)
+            sort_by: rate | sum | term | popular | priority (неизвестный режим = priority)
+
+        Returns:
+            Список позиций офферов в порядке сортировки (только для чтения:
+            без фильтров возвращается общий заранее вычисленный порядок)
+        """
+        mode = sort_mode(sort_by)
+        order = self.orders[mode]
+
+        if sum_need is None and term_days is None:
+            return order
+
+        if sum_need is not None:
+            matches = self.sum_tree.stab(sum_need)
+            if term_days is not None:
+                mask = self._mask(self.term_tree.stab(term_days))
+                matches = [pos for pos in matches if mask[pos]]
+        else:
+            matches = self.term_tree.stab(term_days)
+
+        if len(matches) > len(self.offers) * DENSE_MATCH_RATIO:
+            mask = self._mask(matches)
+            return [pos for pos in order if mask[pos]]
+        return sorted(matches, key=self.ranks[mode].__getitem__)
+
+    def sort_key(self, pos, sort_by):
+        """Ключ сортировки оффера на позиции pos"""
+        mode = sort_mode(sort_by)
+        return self.sorted_keys[mode][self.ranks[mode][pos]]
+
+    def after(self, positions, sort_by, key):
+        """
+        Продолжение выдачи после оффера с ключом сортировки key.
+
+        Args:
+            positions: Результат query() с тем же sort_by
+            sort_by: Режим сортировки
+            key: Ключ сортировки последнего показанного оффера
+
+        Returns:
+            Срез positions с офферами, ключ которых больше key. Оффер с этим
+            ключом может уже не существовать: продолжение всё равно корректно.
+        """
+        mode = sort_mode(sort_by)
+        start_rank = bisect_right(self.sorted_keys[mode], tuple(key))
+        return positions[bisect_left(positions, start_rank, key=self.ranks[mode].__getitem__):]
+
+    def _mask(self, positions):
+        mask = bytearray(len(self.offers))
+        for pos in positions:
+            mask[pos] = 1
+        return mask
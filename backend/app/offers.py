@@ -1,7 +1,37 @@
 """
 Функции для работы с офферами из базы данных.
 """
-from .models import Offer
+import base64
+import json
+
+from .catalog import get_catalog
+from .offer_index import sort_mode
+from .payloads import CachedPayload
+from .renderers import EncodedJSON
+
+
+# Размер страницы приходит из запроса: больше офферов за раз не отдаём
+MAX_PAGE_SIZE = 100
+
+
+def clamp_page_size(page_size):
+    """Размер страницы в пределах 1..MAX_PAGE_SIZE"""
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или выдан для другого режима сортировки"""
+
+
+class OffersPayload(CachedPayload):
+    """
+    Готовый ответ /api/offers/ вместе с показанной страницей.
+
+    offer_ids — ID офферов страницы по порядку, first_position — позиция
+    первого из них в выдаче (с 1); нужны для учёта показов (см. impressions.py).
+    """
+    offer_ids = ()
+    first_position = 1
 
 
 def serialize_offer(offer):
@@ -23,44 +53,51 @@ def serialize_offer(offer):
     }
 
 
+def encoded_offers(catalog):
+    """
+    Сериализованные офферы снимка каталога по позициям.
+
+    Каждый оффер сериализуется один раз на снимок, а в ответы вставляется
+    готовыми байтами (см. renderers.EncodedJSON).
+    """
+    if catalog.encoded is None:
+        catalog.encoded = tuple(EncodedJSON(serialize_offer(offer)) for offer in catalog.offers)
+    return catalog.encoded
+
+
+def _query_positions(catalog, sum_need, term_days, sort_by):
+    """Позиции подходящих офферов каталога в порядке сортировки"""
+    return catalog.index.query(
+        sum_need=int(sum_need) if sum_need else None,
+        term_days=int(term_days) if term_days else None,
+        sort_by=sort_by,
+    )
+
+
 def get_offers(sum_need=None, term_days=None, sort_by='rate', page=1, page_size=20):
     """
-    Получить список офферов с фильтрацией и сортировкой из БД.
+    Получить список офферов с фильтрацией и сортировкой.
+
+    Подбор выполняется в памяти по индексу снимка каталога активных
+    офферов (см. catalog.py и offer_index.py).
     """
-    # Базовый queryset - только активные офферы
-    queryset = Offer.objects.filter(is_active=True)
+    catalog = get_catalog()
+    page = max(page, 1)
+    page_size = clamp_page_size(page_size)
     
-    # Фильтрация по сумме
-    if sum_need:
-        sum_need = int(sum_need)
-        queryset = queryset.filter(sum_min__lte=sum_need, sum_max__gte=sum_need)
-    
-    # Фильтрация по сроку
-    if term_days:
-        term_days = int(term_days)
-        queryset = queryset.filter(term_min__lte=term_days, term_max__gte=term_days)
-    
-    # Сортировка
-    if sort_by == 'rate':
-        queryset = queryset.order_by('rate', '-priority')
-    elif sort_by == 'sum':
-        queryset = queryset.order_by('-sum_max', '-priority')
-    elif sort_by == 'term':
-        queryset = queryset.order_by('-term_max', '-priority')
-    else:
-        # По умолчанию сортируем по приоритету
-        queryset = queryset.order_by('-priority', 'rate')
+    # Фильтрация по сумме и сроку + сортировка
+    positions = _query_positions(catalog, sum_need, term_days, sort_by)
     
     # Подсчёт общего количества
-    total = queryset.count()
+    total = len(positions)
     
     # Пагинация
     start = (page - 1) * page_size
     end = start + page_size
-    offers = queryset[start:end]
     
+    encoded = encoded_offers(catalog)
     return {
-        'results': [serialize_offer(offer) for offer in offers],
+        'results': [encoded[pos] for pos in positions[start:end]],
         'count': total,
         'page': page,
         'page_size': page_size,
@@ -68,11 +105,107 @@ def get_offers(sum_need=None, term_days=None, sort_by='rate', page=1, page_size=
     }
 
 
-def get_offer_by_id(offer_id):
-    """Получить оффер по ID из БД"""
+def encode_cursor(sort_by, key):
+    """Непрозрачный курсор из режима сортировки и ключа последнего оффера"""
+    raw = json.dumps([sort_by, list(key)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor, sort_by):
+    """
+    Ключ сортировки из курсора.
+
+    Raises:
+        InvalidCursor: Курсор повреждён или выдан для другого sort_by
+    """
     try:
-        offer = Offer.objects.get(id=offer_id, is_active=True)
-        return serialize_offer(offer)
-    except Offer.DoesNotExist:
-        return None
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        mode, key = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+    if mode != sort_by:
+        raise InvalidCursor('Cursor was issued for another sort order')
+    if not isinstance(key, list) or not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool) for value in key
+    ):
+        raise InvalidCursor('Invalid cursor')
+    return tuple(key)
+
+
+def get_offers_page(sum_need=None, term_days=None, sort_by='rate', cursor=None,
+                    page_size=20, with_count=False):
+    """
+    Получить страницу офферов по курсору (для бесконечной ленты).
+
+    Курсор хранит ключ сортировки последнего оффера страницы (с id в конце),
+    поэтому следующая страница продолжается с места, где закончилась
+    предыдущая, даже если каталог между запросами изменился.
+
+    Args:
+        cursor: next_cursor предыдущей страницы (None — первая страница)
+        with_count: Добавить в ответ общее количество подходящих офферов
 
+    Raises:
+        InvalidCursor: Курсор повреждён или выдан для другого sort_by
+    """
+    data, _ = _get_offers_page(sum_need, term_days, sort_by, cursor, page_size, with_count)
+    return data
+
+
+def _get_offers_page(sum_need=None, term_days=None, sort_by='rate', cursor=None,
+                     page_size=20, with_count=False):
+    """Страница по курсору и число подходящих офферов перед ней"""
+    catalog = get_catalog()
+    mode = sort_mode(sort_by)
+    page_size = clamp_page_size(page_size)
+    
+    positions = _query_positions(catalog, sum_need, term_days, mode)
+    remaining = positions
+    if cursor:
+        remaining = catalog.index.after(positions, mode, decode_cursor(cursor, mode))
+    page_positions = remaining[:page_size]
+    
+    next_cursor = None
+    if len(remaining) > page_size:
+        next_cursor = encode_cursor(mode, catalog.index.sort_key(page_positions[-1], mode))
+    
+    encoded = encoded_offers(catalog)
+    data = {
+        'results': [encoded[pos] for pos in page_positions],
+        'next_cursor': next_cursor,
+        'page_size': page_size,
+    }
+    if with_count:
+        data['count'] = len(positions)
+    return data, len(positions) - len(remaining)
+
+
+def get_offers_payload(**params):
+    """
+    Готовый ответ /api/offers/ (OffersPayload) для набора параметров.
+
+    С параметром cursor страница строится get_offers_page, иначе get_offers.
+    Ответы хранятся в снимке каталога, поэтому сериализуются и сжимаются
+    один раз на версию каталога и набор параметров.
+
+    Raises:
+        InvalidCursor: Курсор повреждён или выдан для другого sort_by
+    """
+    def build():
+        if 'cursor' in params:
+            data, offset = _get_offers_page(**params)
+        else:
+            data = get_offers(**params)
+            offset = (data['page'] - 1) * data['page_size']
+        payload = OffersPayload.from_data({'success': True, 'data': data})
+        payload.offer_ids = tuple(offer['id'] for offer in data['results'])
+        payload.first_position = offset + 1
+        return payload
+
+    return get_catalog().payloads.get_or_build(tuple(sorted(params.items())), build)
+
+
+def get_offer_by_id(offer_id):
+    """Получить активный оффер по ID из снимка каталога"""
+    offer = get_catalog().get(offer_id)
+    return serialize_offer(offer) if offer else None
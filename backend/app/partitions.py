@@ -0,0 +1,288 @@
+"""
+Помесячное секционирование больших журналов в PostgreSQL (click_logs, vk_ads_events).
+
+Таблица секционируется по диапазонам created_at: одна секция на локальный
+месяц (TIME_ZONE, как у дневных агрегатов) плюс секция по умолчанию для
+строк вне созданных месяцев. Запросы с фильтром по created_at читают только
+нужные секции (partition pruning), а старые данные удаляются отсоединением
+и удалением целой секции вместо массового DELETE.
+
+Секции создаются заранее командой manage_partitions (в docker-compose.prod.yml —
+сервис maintenance, раз в час). Если строки месяца уже попали в секцию по
+умолчанию, create_partition переносит их в новую секцию. Модели и запросы ORM не меняются: первичный ключ таблицы —
+(id, created_at), а id по-прежнему уникален благодаря последовательности.
+
+На других СУБД (SQLite в разработке) таблицы не секционируются (см. is_supported).
+"""
+import logging
+import re
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Таблица -> столбец секционирования
+PARTITIONED_TABLES = {
+    'click_logs': 'created_at',
+    'vk_ads_events': 'created_at',
+}
+
+# Сколько месяцев вперёд создавать секции
+DEFAULT_MONTHS_AHEAD = 3
+
+_PARTITION_NAME = re.compile(r'^(?P<table>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$')
+
+
+def is_supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value):
+    """Первое число локального месяца для даты или datetime"""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    """Первое число месяца через count месяцев"""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def _bound(month):
+    """Граница секции: начало локального месяца с часовым поясом"""
+    return timezone.make_aware(datetime(month.year, month.month, 1)).isoformat()
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace",
+        [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """
+    Помесячные секции таблицы.
+
+    Returns:
+        Отсортированный список (month, имя секции); секция по умолчанию не входит
+    """
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = %s AND parent.relnamespace = current_schema()::regnamespace",
+        [table]
+    )
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_NAME.match(name)
+        if match and match.group('table') == table:
+            month = datetime(int(match.group('year')), int(match.group('month')), 1).date()
+            partitions.append((month, name))
+    return sorted(partitions)
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    return cursor.fetchone()[0] is not None
+
+
+def create_partition(cursor, table, month):
+    """
+    Создать секцию месяца, если её ещё нет.
+
+    PostgreSQL не создаёт секцию, пока строки её диапазона лежат в секции
+    по умолчанию. Тогда в одной транзакции секция по умолчанию отсоединяется,
+    секция месяца создаётся, строки переносятся в неё, и секция по умолчанию
+    присоединяется обратно (вставки в таблицу на это время ждут блокировку).
+
+    Returns:
+        True, если секция создана
+    """
+    name = partition_name(table, month)
+    if _table_exists(cursor, name):
+        return False
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+    create_sql = f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+
+    default = f'{table}_default'
+    column = PARTITIONED_TABLES.get(table, 'created_at')
+    if _table_exists(cursor, default):
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {column} >= %s AND {column} < %s)",
+            [lower, upper]
+        )
+        if cursor.fetchone()[0]:
+            with transaction.atomic():
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+                cursor.execute(create_sql)
+                cursor.execute(
+                    f"WITH moved AS (DELETE FROM {default} WHERE {column} >= %s AND {column} < %s RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved",
+                    [lower, upper]
+                )
+                moved = cursor.rowcount
+                cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+            logger.info(f"{name}: created, moved {moved} rows from {default}")
+            return True
+
+    cursor.execute(create_sql)
+    return True
+
+
+def ensure_partitions(cursor, table, months_ahead=DEFAULT_MONTHS_AHEAD, today=None):
+    """
+    Создать секции от текущего месяца на months_ahead месяцев вперёд.
+
+    Returns:
+        Имена созданных секций
+    """
+    current = month_start(today or timezone.localdate())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_partition(cursor, table, month):
+            created.append(partition_name(table, month))
+    return created
+
+
+def drop_partitions_before(cursor, table, month):
+    """
+    Отсоединить и удалить секции, целиком лежащие раньше month.
+
+    Returns:
+        Имена удалённых секций
+    """
+    dropped = []
+    for partition_month, name in list_partitions(cursor, table):
+        if partition_month >= month:
+            break
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
+        dropped.append(name)
+    return dropped
+
+
+def default_partition_rows(cursor, table):
+    """Число строк в секции по умолчанию (туда попадают строки вне созданных месяцев)"""
+    if not _table_exists(cursor, f'{table}_default'):
+        return 0
+    cursor.execute(f"SELECT count(*) FROM {table}_default")
+    return cursor.fetchone()[0]
+
+
+def _index_definitions(cursor, table):
+    """Определения неуникальных индексов таблицы"""
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "WHERE i.indrelid = %s::regclass AND NOT i.indisunique",
+        [table]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _unique_indexes(cursor, table):
+    cursor.execute(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = %s::regclass AND i.indisunique AND NOT i.indisprimary",
+        [table]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _foreign_keys(cursor, table):
+    """(имя, определение) внешних ключей таблицы"""
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def _recursive(definition):
+    """Индекс секционированной таблицы определён с ON ONLY — создаём его и на секциях"""
+    return definition.replace(' ON ONLY ', ' ON ', 1)
+
+
+def _rebuild(cursor, table, create_sql, primary_key, after_create):
+    """
+    Пересоздать таблицу с данными: переименовать старую, создать новую
+    (create_sql с {table}/{source}), скопировать строки и вернуть первичный
+    ключ, индексы, внешние ключи и последовательность id.
+    """
+    source = f'{table}_old'
+    indexes = _index_definitions(cursor, table)
+    foreign_keys = _foreign_keys(cursor, table)
+
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {source}")
+    cursor.execute(create_sql.format(table=table, source=source))
+    # Значение id по умолчанию ссылается на последовательность старой таблицы
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id DROP DEFAULT")
+    after_create()
+    cursor.execute(f"INSERT INTO {table} SELECT * FROM {source}")
+    # Вместе со старой таблицей удаляются её последовательность, индексы и ключи
+    cursor.execute(f"DROP TABLE {source}")
+
+    cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({', '.join(primary_key)})")
+    cursor.execute(f"CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    cursor.execute(f"SELECT setval('{table}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {table}")
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+    # Определения ссылаются на таблицу по имени, которое теперь у новой таблицы
+    for definition in indexes:
+        cursor.execute(_recursive(definition))
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+
+
+def partition_table(cursor, table, column='created_at', months_ahead=DEFAULT_MONTHS_AHEAD):
+    """
+    Преобразовать обычную таблицу в секционированную по месяцам column.
+
+    Секции создаются для всех месяцев с данными и на months_ahead месяцев
+    вперёд. Таблица блокируется на время копирования строк.
+    """
+    if _unique_indexes(cursor, table):
+        raise ValueError(f'{table}: unique indexes must include {column} to partition the table')
+
+    def create_partitions():
+        cursor.execute(f"SELECT MIN({column}) FROM {table}_old")
+        oldest = cursor.fetchone()[0]
+        current = month_start(timezone.localdate())
+        month = month_start(oldest) if oldest is not None else current
+        while month < current:
+            create_partition(cursor, table, month)
+            month = add_months(month, 1)
+        ensure_partitions(cursor, table, months_ahead)
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    _rebuild(
+        cursor, table,
+        "CREATE TABLE {table} (LIKE {source} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({column})",
+        ['id', column],
+        create_partitions,
+    )
+    logger.info(f"{table} partitioned by month of {column}")
+
+
+def unpartition_table(cursor, table):
+    """Преобразовать секционированную таблицу обратно в обычную"""
+    _rebuild(
+        cursor, table,
+        "CREATE TABLE {table} (LIKE {source} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        ['id'],
+        lambda: None,
+    )
+    logger.info(f"{table} converted back to a plain table")
@@ -0,0 +1,169 @@
+"""
+Заранее сериализованные JSON-ответы и условные GET-запросы (ETag / 304).
+
+Для каждого готового ответа один раз строятся сжатые варианты (gzip и,
+если установлен пакет brotli, br), а клиент получает вариант по Accept-Encoding.
+Маленькие ответы не сжимаются: выигрыш меньше накладных расходов.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags, patch_vary_headers
+
+from .renderers import dumps
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен
+    brotli = None
+
+# Варианты сжимаются один раз на версию ответа, поэтому уровни выше обычных
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# Кодировки в порядке предпочтения при равных q
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class CachedPayload:
+    """Готовое тело JSON-ответа вместе с его ETag (и исходными данными, если есть)"""
+
+    def __init__(self, body, etag, data=None):
+        self.body = body
+        self.etag = etag
+        self.data = data
+        self._variants = {}
+
+    @classmethod
+    def from_data(cls, data, etag_source=None):
+        """
+        Сериализовать данные так же, как это делает рендерер API (см. renderers.py).
+
+        Args:
+            data: Данные ответа
+            etag_source: Строка, из которой выводится ETag (по умолчанию — тело ответа)
+        """
+        body = dumps(data)
+        source = etag_source.encode('utf-8') if etag_source is not None else body
+        return cls(body, make_etag(source), data)
+
+    @property
+    def compressible(self):
+        return len(self.body) >= settings.RESPONSE_COMPRESSION_MIN_SIZE
+
+    def variant(self, encoding):
+        """Тело в кодировке encoding (сжимается при первом обращении)"""
+        body = self._variants.get(encoding)
+        if body is None:
+            body = self._variants[encoding] = _compress(self.body, encoding)
+        return body
+
+    def variant_etag(self, encoding):
+        """У каждого представления свой сильный ETag"""
+        return '%s-%s"' % (self.etag[:-1], encoding) if encoding else self.etag
+
+    def all_etags(self):
+        return [self.etag] + [self.variant_etag(encoding) for encoding in ENCODINGS]
+
+
+class PayloadCache:
+    """Ограниченный LRU-кэш готовых ответов по ключу"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._payloads = OrderedDict()
+
+    def get_or_build(self, key, builder):
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                return payload
+        payload = builder()
+        with self._lock:
+            self._payloads[key] = payload
+            while len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+        return payload
+
+
+def make_etag(source):
+    """Сильный ETag из байтов"""
+    return '"%s"' % hashlib.sha1(source).hexdigest()
+
+
+def is_not_modified(request, etag):
+    """Совпадает ли ETag (или один из ETag) с If-None-Match клиента"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    candidates = [etag] if isinstance(etag, str) else etag
+    return '*' in etags or any(candidate in etags for candidate in candidates)
+
+
+def choose_encoding(request):
+    """
+    Выбрать кодировку по Accept-Encoding клиента.
+
+    Returns:
+        'br', 'gzip' или None (без сжатия)
+    """
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    weights = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def payload_response(request, payload, cache_control='no-cache'):
+    """
+    Ответ из готового payload: 304 для совпавшего If-None-Match, иначе тело.
+
+    Cache-Control: no-cache заставляет клиента каждый раз ревалидировать ответ,
+    поэтому изменения из админки видны сразу, а неизменённые данные не передаются.
+    Достаточно большие ответы отдаются в сжатом варианте с Vary: Accept-Encoding.
+    """
+    encoding = choose_encoding(request) if payload.compressible else None
+    etag = payload.variant_etag(encoding)
+
+    if is_not_modified(request, payload.all_etags()):
+        response = HttpResponseNotModified()
+    else:
+        body = payload.variant(encoding) if encoding else payload.body
+        response = HttpResponse(body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    if payload.compressible:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,72 @@
+"""
+Разрешение ссылок для перехода /api/go/<offer_id>/ без запросов к БД.
+
+Воркер держит карту offer_id -> redirect_url всех активных офферов, поэтому
+неизвестные и неактивные ID отсекаются той же проверкой по словарю (негативный
+результат не требует обращения к БД, сколько бы случайных ID ни перебирали боты).
+
+Последняя построенная карта сохраняется и в общем кэше: если БД недоступна,
+а у воркера ещё нет своей копии (например, он только что запустился),
+переходы продолжают работать по карте из кэша.
+"""
+import logging
+
+from django.conf import settings
+
+from .catalog import CATALOG_NAMESPACE, get_catalog
+from .snapshots import SnapshotUnavailable, VersionedSnapshot, shared_cache
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_MAP_CACHE_KEY = 'redirects:map'
+
+
+def _build_redirect_map():
+    redirect_map = {offer.id: offer.redirect_url for offer in get_catalog().offers}
+    try:
+        shared_cache().set(REDIRECT_MAP_CACHE_KEY, redirect_map, None)
+    except Exception as e:
+        logger.warning(f"Failed to store redirect map in shared cache: {e}")
+    return redirect_map
+
+
+# Версия общая с каталогом: карта перестраивается при любом изменении офферов
+_snapshot = VersionedSnapshot(
+    CATALOG_NAMESPACE,
+    _build_redirect_map,
+    ttl=settings.OFFERS_CATALOG_TTL,
+)
+
+
+def get_redirect_map():
+    """Получить карту offer_id -> redirect_url"""
+    try:
+        return _snapshot.get()
+    except SnapshotUnavailable:
+        redirect_map = shared_cache().get(REDIRECT_MAP_CACHE_KEY)
+        if redirect_map is None:
+            raise
+        logger.warning("Serving redirects from the shared cache copy")
+        return redirect_map
+
+
+def resolve_redirect(offer_id):
+    """
+    Найти ссылку для перехода по ID оффера.
+
+    Returns:
+        Кортеж (offer_id, redirect_url) или None для неизвестного/неактивного оффера
+    """
+    try:
+        offer_id = int(offer_id)
+    except (TypeError, ValueError):
+        return None
+    redirect_url = get_redirect_map().get(offer_id)
+    if redirect_url is None:
+        return None
+    return offer_id, redirect_url
+
+
+def invalidate_redirects():
+    """Сбросить карту текущего воркера (версию поднимает invalidate_catalog)"""
+    _snapshot.invalidate()
@@ -0,0 +1,112 @@
+"""
+Быстрая JSON-сериализация ответов API.
+
+FastJSONRenderer даёт тот же JSON, что и JSONRenderer DRF (компактные
+разделители, UTF-8 без экранирования, даты в формате DRF), но сериализует
+через orjson, если он установлен, и через стандартный json иначе.
+
+Часто отдаваемые неизменяемые данные (офферы каталога, конфигурация)
+оборачиваются в EncodedJSON: они сериализуются один раз, а в ответ
+вставляются готовыми байтами без повторной сериализации.
+"""
+import json
+import re
+import secrets
+from collections.abc import Mapping
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+_drf_encoder = encoders.JSONEncoder()
+
+# Метка на месте EncodedJSON в сериализованном JSON: "\u0000<nonce>:<номер>"
+_FRAGMENT_MARK = re.compile(rb'"\\u0000([0-9a-f]{16}):(\d+)"')
+
+if orjson is not None:
+    # Даты сериализует DRF (миллисекунды, "Z" для UTC), остальное — orjson
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class EncodedJSON(Mapping):
+    """
+    Словарь вместе с его готовым JSON.
+
+    Ведёт себя как словарь только для чтения, а dumps() вставляет
+    в результат заранее сериализованные байты.
+    """
+
+    __slots__ = ('data', 'encoded')
+
+    def __init__(self, data):
+        self.data = data
+        self.encoded = dumps(data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'EncodedJSON({self.data!r})'
+
+
+def dumps(data, indent=None):
+    """
+    Сериализовать данные в JSON (bytes) так же, как JSONRenderer DRF.
+
+    Вместо каждого EncodedJSON сначала пишется уникальная метка, которая
+    затем заменяется готовыми байтами.
+    """
+    fragments = []
+    nonce = secrets.token_hex(8)
+
+    def default(obj):
+        if isinstance(obj, EncodedJSON):
+            fragments.append(obj.encoded)
+            return f'\x00{nonce}:{len(fragments) - 1}'
+        return _drf_encoder.default(obj)
+
+    body = None
+    if orjson is not None and indent is None:
+        try:
+            body = orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Например, целые больше 64 бит — их умеет только стандартный json
+            fragments.clear()
+    if body is None:
+        body = json.dumps(
+            data, default=default, ensure_ascii=False, allow_nan=False,
+            indent=indent, separators=(',', ':')
+        ).encode('utf-8')
+
+    # Как в DRF: U+2028/U+2029 допустимы в JSON, но не в JavaScript
+    body = body.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    if fragments:
+        nonce_bytes = nonce.encode('ascii')
+
+        def splice(match):
+            if match.group(1) != nonce_bytes:
+                return match.group(0)
+            return fragments[int(match.group(2))]
+
+        body = _FRAGMENT_MARK.sub(splice, body)
+    return body
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с поддержкой EncodedJSON"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, indent=indent)
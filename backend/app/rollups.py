@@ -0,0 +1,113 @@
+"""
+Агрегаты кликов по часам и дням (ClickRollupHourly / ClickRollupDaily).
+
+На каждый ключ (бакет, оффер, бренд, группа) приходится одна строка: при записи
+пачки кликов (см. clicks.py) счётчики прибавляются к ней одним
+INSERT ... ON CONFLICT DO UPDATE (на каждые CHUNK_SIZE ключей), как и показы
+в impressions.py. Уникальные индексы ключей создаёт миграция 0018
+(NULLS NOT DISTINCT: оффер, бренд и группа могут быть пустыми).
+
+Команда rebuild_click_rollups пересчитывает агрегаты по сырым ClickLog.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import ClickLog, ClickRollupDaily, ClickRollupHourly
+
+# Размер пачек для IN-запросов и bulk_create
+CHUNK_SIZE = 500
+
+
+def hour_bucket(dt):
+    """Начало часа в локальном часовом поясе (как у TruncHour)"""
+    return timezone.localtime(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(dt):
+    """Локальная дата (как у TruncDate)"""
+    return timezone.localtime(dt).date()
+
+
+def day_start(day):
+    """Начало локального дня в виде aware datetime"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _upsert_sql(model, rows):
+    table = model._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * rows)
+    return (
+        f'INSERT INTO {table} (bucket, offer_id, brand, group_id, clicks) VALUES {values} '
+        f'ON CONFLICT (bucket, offer_id, brand, group_id) '
+        f'DO UPDATE SET clicks = {table}.clicks + EXCLUDED.clicks'
+    )
+
+
+def _sort_key(item):
+    (bucket, offer_id, brand, group_id), _ = item
+    return bucket, offer_id or 0, brand or '', group_id or ''
+
+
+def _add_clicks(model, counts, adapt_bucket):
+    # Ключи в одном порядке во всех воркерах: параллельные пачки не ловят дедлоки
+    items = sorted(counts.items(), key=_sort_key)
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), CHUNK_SIZE):
+            chunk = items[start:start + CHUNK_SIZE]
+            params = []
+            for (bucket, offer_id, brand, group_id), count in chunk:
+                params += [adapt_bucket(bucket), offer_id, brand, group_id, count]
+            cursor.execute(_upsert_sql(model, len(chunk)), params)
+
+
+def record_click_rollups(clicks):
+    """Прибавить пачку записанных кликов к агрегатам"""
+    hourly = Counter()
+    daily = Counter()
+    for click in clicks:
+        key = (click.offer_id, click.brand, click.group_id)
+        hourly[(hour_bucket(click.created_at),) + key] += 1
+        daily[(day_bucket(click.created_at),) + key] += 1
+
+    with transaction.atomic():
+        _add_clicks(ClickRollupHourly, hourly, connection.ops.adapt_datetimefield_value)
+        _add_clicks(ClickRollupDaily, daily, connection.ops.adapt_datefield_value)
+
+
+def rebuild_rollups(day):
+    """
+    Пересчитать агрегаты за локальный день по сырым кликам.
+
+    Returns:
+        Кортеж (строк по часам, строк по дням)
+    """
+    date_from = day_start(day)
+    date_to = day_start(day + timedelta(days=1))
+    clicks = ClickLog.objects.filter(created_at__gte=date_from, created_at__lt=date_to)
+
+    hourly = clicks.annotate(bucket=TruncHour('created_at')).values(
+        'bucket', 'offer_id', 'brand', 'group_id'
+    ).annotate(total=Count('id')).order_by()
+    daily = clicks.annotate(bucket=TruncDate('created_at')).values(
+        'bucket', 'offer_id', 'brand', 'group_id'
+    ).annotate(total=Count('id')).order_by()
+
+    with transaction.atomic():
+        ClickRollupHourly.objects.filter(bucket__gte=date_from, bucket__lt=date_to).delete()
+        ClickRollupDaily.objects.filter(bucket=day).delete()
+        hourly_rows = ClickRollupHourly.objects.bulk_create([
+            ClickRollupHourly(bucket=row['bucket'], offer_id=row['offer_id'], brand=row['brand'],
+                              group_id=row['group_id'], clicks=row['total'])
+            for row in hourly
+        ], batch_size=CHUNK_SIZE)
+        daily_rows = ClickRollupDaily.objects.bulk_create([
+            ClickRollupDaily(bucket=row['bucket'], offer_id=row['offer_id'], brand=row['brand'],
+                             group_id=row['group_id'], clicks=row['total'])
+            for row in daily
+        ], batch_size=CHUNK_SIZE)
+    return len(hourly_rows), len(daily_rows)
@@ -0,0 +1,97 @@
+"""
+Оценка популярности офферов для sort=popular.
+
+Оценка — сглаженный CTR: (клики + α) / (показы + β). Клики берутся из
+дневных агрегатов (см. rollups.py), показы — из OfferImpressionHourly
+(см. impressions.py); и те и другие взвешиваются по давности с периодом
+полураспада SCORE_HALF_LIFE_DAYS. Априорное распределение — средний CTR
+каталога с весом β = SCORE_PRIOR_IMPRESSIONS показов (α = β · средний CTR),
+поэтому оффер с парой случайных кликов на десятке показов не окажется
+наверху, а редко показываемый оффер с высоким CTR не проигрывает
+часто показываемому только из-за числа кликов.
+
+Пока показов нет (до появления их учёта), средний CTR равен нулю и оценка
+пропорциональна числу кликов.
+
+Оценки пересчитываются командой compute_offer_scores и сохраняются
+в Offer.popularity_score, поэтому запрос офферов аналитику не выполняет.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .models import ClickRollupDaily, Offer, OfferImpressionHourly
+from .rollups import day_bucket, day_start
+
+SCORE_WINDOW_DAYS = 28
+SCORE_HALF_LIFE_DAYS = 7
+SCORE_PRIOR_IMPRESSIONS = 200
+
+
+def compute_offer_scores(days=SCORE_WINDOW_DAYS, half_life=SCORE_HALF_LIFE_DAYS,
+                         prior_impressions=SCORE_PRIOR_IMPRESSIONS):
+    """
+    Посчитать оценки популярности (сглаженный CTR) всех офферов.
+
+    Returns:
+        Словарь {offer_id: оценка}
+    """
+    today = timezone.localdate()
+    day_from = today - timedelta(days=days - 1)
+    weights = {
+        today - timedelta(days=age): 0.5 ** (age / half_life)
+        for age in range(days)
+    }
+
+    clicks = defaultdict(float)
+    rows = ClickRollupDaily.objects.filter(
+        bucket__gte=day_from,
+        offer__isnull=False
+    ).values_list('offer_id', 'bucket').annotate(total=Sum('clicks')).order_by()
+    for offer_id, bucket, total in rows:
+        clicks[offer_id] += weights.get(bucket, 0.0) * total
+
+    # Показы по часам: вес — по локальному дню часа
+    impressions = defaultdict(float)
+    rows = OfferImpressionHourly.objects.filter(
+        bucket__gte=day_start(day_from)
+    ).values_list('offer_id', 'bucket').annotate(total=Sum('impressions')).order_by()
+    for offer_id, bucket, total in rows:
+        impressions[offer_id] += weights.get(day_bucket(bucket), 0.0) * total
+
+    total_impressions = sum(impressions.values())
+    shown_clicks = sum(clicks[offer_id] for offer_id in impressions)
+    mean_ctr = shown_clicks / total_impressions if total_impressions else 0.0
+    prior_clicks = prior_impressions * mean_ctr
+
+    return {
+        offer_id: (clicks[offer_id] + prior_clicks) / (impressions[offer_id] + prior_impressions)
+        for offer_id in Offer.objects.values_list('id', flat=True)
+    }
+
+
+def update_offer_scores(**params):
+    """
+    Пересчитать и сохранить оценки популярности.
+
+    bulk_update не вызывает сигналы модели, поэтому каталог в воркерах
+    инвалидируется явно — и только если оценки изменились.
+
+    Returns:
+        Число офферов, у которых изменилась оценка
+    """
+    scores = compute_offer_scores(**params)
+    changed = []
+    for offer in Offer.objects.only('id', 'popularity_score'):
+        score = round(scores.get(offer.id, 0.0), 6)
+        if score != offer.popularity_score:
+            offer.popularity_score = score
+            changed.append(offer)
+
+    if changed:
+        Offer.objects.bulk_update(changed, ['popularity_score'], batch_size=500)
+        invalidate_catalog()
+    return len(changed)
@@ -0,0 +1,32 @@
+"""
+Сигналы моделей для инвалидации кэшей в памяти воркеров.
+
+Инвалидация откладывается до фиксации транзакции (админка сохраняет модели
+внутри atomic): иначе другой воркер успеет перестроить снапшот по старым
+данным и сохранить его под новой версией.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog
+from .config_cache import invalidate_config
+from .models import AppConfig, BrandConfig, Offer
+from .redirects import invalidate_redirects
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def offer_changed(sender, **kwargs):
+    """Оффер изменён или удалён в админке — перестраиваем каталог"""
+    transaction.on_commit(invalidate_catalog)
+    transaction.on_commit(invalidate_redirects)
+
+
+@receiver(post_save, sender=AppConfig)
+@receiver(post_delete, sender=AppConfig)
+@receiver(post_save, sender=BrandConfig)
+@receiver(post_delete, sender=BrandConfig)
+def config_changed(sender, **kwargs):
+    """Настройки внешнего вида изменены — пересобираем ответ /api/config/"""
+    transaction.on_commit(invalidate_config)
@@ -0,0 +1,191 @@
+"""
+Скетчи уникальных пользователей по дням (UniqueUsersSketch).
+
+Скетчи обновляются при записи пачек кликов (см. clicks.py) в разрезах:
+все клики, оффер, бренд. Уникальные пользователи за период — это объединение
+дневных скетчей, поэтому стоимость запроса не зависит от числа кликов.
+
+Скетчи объединяет БД: ненулевые регистры (см. HyperLogLog.to_entries) всех
+дневных скетчей сводятся максимумом по индексу регистра, и в Python приходит
+по строке на оффер, бренд или день, а не по скетчу на каждый день каждого ключа.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+from .hll import ENTRY_RANK_BITS, ENTRY_RANK_MASK, HyperLogLog
+from .models import ClickLog, UniqueUsersSketch
+from .rollups import day_bucket, day_start
+
+TOTAL = UniqueUsersSketch.SCOPE_TOTAL
+OFFER = UniqueUsersSketch.SCOPE_OFFER
+BRAND = UniqueUsersSketch.SCOPE_BRAND
+
+
+def _group_users(rows):
+    """Сгруппировать пользователей по ключам скетчей: (scope, key, day) -> set"""
+    groups = defaultdict(set)
+    for day, offer_id, brand, vk_user_id in rows:
+        if not vk_user_id:
+            continue
+        groups[(TOTAL, '', day)].add(vk_user_id)
+        if offer_id is not None:
+            groups[(OFFER, str(offer_id), day)].add(vk_user_id)
+        if brand:
+            groups[(BRAND, brand, day)].add(vk_user_id)
+    return groups
+
+
+def _build_sketches(groups):
+    sketches = {}
+    for sketch_key, users in groups.items():
+        sketch = HyperLogLog()
+        sketch.update(users)
+        sketches[sketch_key] = sketch
+    return sketches
+
+
+def merge_sketches(sketches):
+    """Объединить скетчи {(scope, key, day): HyperLogLog} с сохранёнными в БД"""
+    if not sketches:
+        return
+    with transaction.atomic():
+        # Сначала гарантируем наличие строк, затем блокируем их в одном порядке,
+        # чтобы параллельные воркеры не теряли обновления и не ловили дедлоки
+        UniqueUsersSketch.objects.bulk_create([
+            UniqueUsersSketch(scope=scope, key=key, day=day, entries=[])
+            for scope, key, day in sketches
+        ], ignore_conflicts=True)
+        rows = UniqueUsersSketch.objects.select_for_update().filter(
+            scope__in={scope for scope, _, _ in sketches},
+            key__in={key for _, key, _ in sketches},
+            day__in={day for _, _, day in sketches},
+        ).order_by('id')
+
+        updated = []
+        for row in rows:
+            sketch = sketches.get((row.scope, row.key, row.day))
+            if sketch is None:
+                continue
+            row.entries = HyperLogLog.from_entries(row.entries).merge(sketch).to_entries()
+            updated.append(row)
+        UniqueUsersSketch.objects.bulk_update(updated, ['entries'])
+
+
+def record_user_sketches(clicks):
+    """Добавить пользователей из пачки записанных кликов в дневные скетчи"""
+    groups = _group_users(
+        (day_bucket(click.created_at), click.offer_id, click.brand, click.vk_user_id)
+        for click in clicks
+    )
+    merge_sketches(_build_sketches(groups))
+
+
+def rebuild_sketches(day):
+    """
+    Пересчитать скетчи за локальный день по сырым кликам.
+
+    Returns:
+        Число скетчей
+    """
+    rows = ClickLog.objects.filter(
+        created_at__gte=day_start(day),
+        created_at__lt=day_start(day + timedelta(days=1)),
+        vk_user_id__isnull=False,
+    ).values_list('offer_id', 'brand', 'vk_user_id').distinct().order_by()
+
+    groups = _group_users((day, offer_id, brand, vk_user_id) for offer_id, brand, vk_user_id in rows.iterator())
+    sketches = _build_sketches(groups)
+    with transaction.atomic():
+        UniqueUsersSketch.objects.filter(day=day).delete()
+        UniqueUsersSketch.objects.bulk_create([
+            UniqueUsersSketch(scope=scope, key=key, day=sketch_day, entries=sketch.to_entries())
+            for (scope, key, sketch_day), sketch in sketches.items()
+        ])
+    return len(sketches)
+
+
+def _estimates(group_by, where, params):
+    """
+    Оценки уникальных пользователей с объединением скетчей в БД.
+
+    Args:
+        group_by: Колонки группировки ('key', 'day' или ('scope', 'key'))
+        where: Условие отбора скетчей (SQL с плейсхолдерами)
+        params: Параметры условия
+
+    Returns:
+        Словарь {значение group_by: оценка}; группы без пользователей отсутствуют
+    """
+    table = UniqueUsersSketch._meta.db_table
+    columns = ', '.join(group_by)
+    sql = (
+        f'SELECT {columns}, count(*), sum(power(2.0::float8, -rank)) FROM ('
+        f'SELECT {columns}, entry >> {ENTRY_RANK_BITS} AS idx, max(entry & {ENTRY_RANK_MASK}) AS rank '
+        f'FROM {table}, unnest(entries) AS entry WHERE {where} GROUP BY {columns}, idx'
+        f') AS registers GROUP BY {columns}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    width = len(group_by)
+    return {
+        (row[0] if width == 1 else row[:width]): HyperLogLog.estimate(row[width], row[width + 1])
+        for row in rows
+    }
+
+
+def count_unique_users(day_from, scope=TOTAL, key=''):
+    """
+    Оценка уникальных пользователей начиная с дня day_from.
+
+    Стандартная относительная ошибка — HyperLogLog.relative_error() (~1.6%).
+    """
+    estimates = _estimates(['key'], 'scope = %s AND key = %s AND day >= %s', [scope, key, day_from])
+    return estimates.get(key, 0)
+
+
+def count_unique_users_many(day_from, sketch_keys):
+    """
+    Оценки уникальных пользователей для нескольких ключей одним запросом.
+
+    Args:
+        day_from: Первый день периода
+        sketch_keys: Список пар (scope, key)
+
+    Returns:
+        Словарь {(scope, key): оценка}
+    """
+    sketch_keys = {tuple(sketch_key) for sketch_key in sketch_keys}
+    if not sketch_keys:
+        return {}
+    pairs = ', '.join(['(%s, %s)'] * len(sketch_keys))
+    params = [value for sketch_key in sketch_keys for value in sketch_key]
+    estimates = _estimates(['scope', 'key'], f'(scope, key) IN ({pairs}) AND day >= %s', params + [day_from])
+    return {sketch_key: estimates.get(sketch_key, 0) for sketch_key in sketch_keys}
+
+
+def count_unique_users_by_key(day_from, scope, keys=None):
+    """
+    Оценки уникальных пользователей по ключам разреза (офферам или брендам) одним запросом.
+
+    Args:
+        day_from: Первый день периода
+        scope: OFFER или BRAND
+        keys: Ограничить этими ключами (None — все ключи разреза)
+
+    Returns:
+        Словарь {key: оценка}
+    """
+    where = 'scope = %s AND day >= %s'
+    params = [scope, day_from]
+    if keys is not None:
+        where += ' AND key = ANY(%s)'
+        params.append(list(keys))
+    return _estimates(['key'], where, params)
+
+
+def count_unique_users_by_day(day_from, scope=TOTAL, key=''):
+    """Оценки уникальных пользователей по дням одним запросом: {day: оценка}"""
+    return _estimates(['day'], 'scope = %s AND key = %s AND day >= %s', [scope, key, day_from])
@@ -0,0 +1,125 @@
+"""
+Версионированные снапшоты редко меняющихся данных в памяти воркера.
+
+Каждый gunicorn-воркер держит собственную копию данных (каталог офферов и т.п.).
+Актуальность проверяется по номеру версии в общем кэше Django (алиас snapshots,
+а не default — тот у каждого процесса свой и занят django-ratelimit): сигналы моделей
+увеличивают версию, и при следующем обращении воркер перестраивает снапшот.
+TTL страхует от ситуации, когда общий кэш недоступен или не разделяется между
+процессами (например, LocMemCache).
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE = 'snapshots'
+VERSION_KEY_PREFIX = 'snapshot_version:'
+
+
+def shared_cache():
+    """Общий для воркеров кэш снапшотов"""
+    return caches[SNAPSHOT_CACHE]
+
+
+def get_version(namespace):
+    """Получить текущую версию данных из общего кэша"""
+    try:
+        return shared_cache().get(VERSION_KEY_PREFIX + namespace)
+    except Exception as e:
+        logger.warning(f"Snapshot version read failed for {namespace}: {e}")
+        return None
+
+
+def bump_version(namespace):
+    """Инвалидировать снапшоты во всех воркерах"""
+    try:
+        shared_cache().set(VERSION_KEY_PREFIX + namespace, time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"Snapshot version bump failed for {namespace}: {e}")
+
+
+class SnapshotUnavailable(Exception):
+    """Снапшот не удалось построить, и прежнего значения нет"""
+
+
+class VersionedSnapshot:
+    """
+    Лениво построенное значение, которое перестраивается при смене версии.
+
+    Если перестроить снапшот не удалось (например, БД недоступна), продолжает
+    отдаваться прежнее значение, а следующая попытка делается не раньше чем
+    через retry_interval — так сбой БД не превращается в шторм запросов к ней.
+
+    Args:
+        namespace: Имя версии в общем кэше
+        builder: Функция без аргументов, строящая значение
+        ttl: Максимальный возраст снапшота в секундах
+        check_interval: Как часто (в секундах) сверять версию с общим кэшем
+        retry_interval: Пауза (в секундах) между попытками после ошибки builder
+    """
+
+    def __init__(self, namespace, builder, ttl=300, check_interval=1.0, retry_interval=5.0):
+        self.namespace = namespace
+        self.builder = builder
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._value = None
+        self._has_value = False
+        self._version = None
+        self._built_at = None
+        self._checked_at = 0.0
+        self._failed_at = None
+
+    def get(self):
+        """Вернуть актуальное значение, при необходимости перестроив его"""
+        now = time.monotonic()
+        if self._built_at is not None and now - self._built_at < self.ttl:
+            if now - self._checked_at < self.check_interval:
+                return self._value
+            version = get_version(self.namespace)
+            self._checked_at = now
+            if version == self._version:
+                return self._value
+        else:
+            version = get_version(self.namespace)
+
+        with self._lock:
+            # Другой поток мог уже перестроить снапшот, пока мы ждали блокировку
+            if (self._built_at is not None and self._version == version
+                    and time.monotonic() - self._built_at < self.ttl):
+                return self._value
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                return self._stale_or_raise(None)
+            try:
+                return self._rebuild(version)
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                logger.error(f"Snapshot {self.namespace} rebuild failed: {e}")
+                return self._stale_or_raise(e)
+
+    def invalidate(self):
+        """Сбросить снапшот текущего воркера"""
+        # Без блокировки: инвалидация может прийти из сигнала во время
+        # перестроения (builder сам сохраняет модель), а присваивание атомарно
+        self._built_at = None
+
+    def _rebuild(self, version):
+        value = self.builder()
+        self._value = value
+        self._has_value = True
+        self._version = version
+        self._built_at = time.monotonic()
+        self._checked_at = self._built_at
+        self._failed_at = None
+        return value
+
+    def _stale_or_raise(self, error):
+        if self._has_value:
+            return self._value
+        raise SnapshotUnavailable(f"Snapshot {self.namespace} is unavailable") from error
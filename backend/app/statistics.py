@@ -1,68 +1,163 @@
 """
 Статистика по кликам и офферам
+
+Количество кликов читается из агрегатов ClickRollupHourly / ClickRollupDaily
+(см. rollups.py). Уникальные пользователи — в итогах и в разбивках по офферам,
+брендам и дням — оцениваются по дневным HyperLogLog-скетчам (см. sketches.py),
+а по сырым ClickLog считаются только при точном подсчёте (exact=True).
+Показы офферов (для CTR) читаются из OfferImpressionHourly (см. impressions.py).
+
+Агрегаты не архивируются, а сырые клики старше ARCHIVE_AFTER_DAYS переносятся
+в файлы (см. archive.py): итоги точного подсчёта дочитывают архивные дни,
+если период в них заходит, а разбивки по дням, брендам и офферам — только БД.
 """
-from django.db.models import Count, Q, Sum
-from django.db.models.functions import TruncDate, TruncHour
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from datetime import timedelta
-from .models import ClickLog, Offer, Subscriber
+from .archive import archived_files, iter_archived_rows
+from .models import ClickLog, ClickRollupDaily, ClickRollupHourly, OfferImpressionHourly, Subscriber
+from .hll import HyperLogLog
+from .rollups import day_bucket, day_start, hour_bucket
+from .catalog import get_catalog
+from .sketches import (
+    BRAND,
+    OFFER,
+    TOTAL,
+    count_unique_users,
+    count_unique_users_by_day,
+    count_unique_users_by_key,
+    count_unique_users_many,
+)
 
 
-def get_offer_statistics(days=30):
+def get_offer_statistics(days=30, exact=False, limit=None, offset=0):
     """
     Статистика по офферам за последние N дней
+    
+    Вместе с кликами — показы и CTR (клики / показы, %); офферы, которые
+    показывались, но не получили кликов, тоже попадают в список.
+    Уникальные пользователи — см. _unique_users_by — считаются только для
+    возвращаемой страницы [offset, offset + limit) (limit=None — все офферы):
+    объединение скетчей стоит пропорционально числу офферов, а их могут быть тысячи.
     """
     date_from = timezone.now() - timedelta(days=days)
     
-    # Статистика по офферам
-    offer_stats = ClickLog.objects.filter(
-        created_at__gte=date_from,
+    # Клики — из агрегатов по часам
+    offer_stats = list(ClickRollupHourly.objects.filter(
+        bucket__gte=hour_bucket(date_from),
         offer__isnull=False
     ).values(
         'offer__id',
         'offer__partner_name',
         'offer__logo_url'
     ).annotate(
-        total_clicks=Count('id'),
-        unique_users=Count('vk_user_id', distinct=True)
-    ).order_by('-total_clicks')
+        total_clicks=Sum('clicks')
+    ).order_by('-total_clicks', 'offer__id'))
+    
+    impression_stats = list(OfferImpressionHourly.objects.filter(
+        bucket__gte=hour_bucket(date_from)
+    ).values(
+        'offer__id',
+        'offer__partner_name',
+        'offer__logo_url'
+    ).annotate(
+        impressions=Sum('impressions')
+    ))
+    impressions = {row['offer__id']: row.pop('impressions') for row in impression_stats}
+    
+    # Показанные офферы без кликов — в конце списка
+    clicked = {row['offer__id'] for row in offer_stats}
+    offer_stats += [
+        {**row, 'total_clicks': 0}
+        for row in impression_stats if row['offer__id'] not in clicked
+    ]
     
-    return list(offer_stats)
+    offer_stats = offer_stats[offset:None if limit is None else offset + limit]
+    unique_users = _unique_users_by(
+        date_from, OFFER, exact, keys=[row['offer__id'] for row in offer_stats]
+    )
+    results = []
+    for row in offer_stats:
+        shown = impressions.get(row['offer__id'], 0)
+        results.append({
+            **row,
+            'unique_users': unique_users.get(row['offer__id'], 0),
+            'impressions': shown,
+            'ctr': _ctr(row['total_clicks'], shown),
+        })
+    return results
+
+
+def _ctr(clicks, impressions):
+    """CTR в процентах; None, если показов не было"""
+    return round(clicks / impressions * 100, 2) if impressions else None
 
 
-def get_brand_statistics(days=30):
+def _offer_impressions(offer_id, date_from):
+    """Показы оффера с начала часа date_from"""
+    return OfferImpressionHourly.objects.filter(
+        offer_id=offer_id,
+        bucket__gte=hour_bucket(date_from)
+    ).aggregate(total=Sum('impressions'))['total'] or 0
+
+
+def get_brand_statistics(days=30, exact=False):
     """
     Статистика по брендам за последние N дней
+    
+    Уникальные пользователи — см. _unique_users_by.
     """
     date_from = timezone.now() - timedelta(days=days)
     
-    brand_stats = ClickLog.objects.filter(
-        created_at__gte=date_from,
+    brand_stats = ClickRollupHourly.objects.filter(
+        bucket__gte=hour_bucket(date_from),
         brand__isnull=False
     ).values('brand').annotate(
-        total_clicks=Count('id'),
-        unique_users=Count('vk_user_id', distinct=True)
+        total_clicks=Sum('clicks')
     ).order_by('-total_clicks')
     
-    return list(brand_stats)
+    unique_users = _unique_users_by(date_from, BRAND, exact)
+    return [
+        {**row, 'unique_users': unique_users.get(row['brand'], 0)}
+        for row in brand_stats
+    ]
 
 
-def get_daily_statistics(days=30):
+def get_daily_statistics(days=30, exact=False):
     """
     Статистика по дням за последние N дней
+    
+    Уникальные пользователи за день — дневной скетч всех кликов;
+    exact=True — COUNT(DISTINCT) по сырым кликам.
     """
     date_from = timezone.now() - timedelta(days=days)
     
-    daily_stats = ClickLog.objects.filter(
-        created_at__gte=date_from
+    # Агрегаты по дням: первый день периода учитывается целиком
+    daily_stats = ClickRollupDaily.objects.filter(
+        bucket__gte=day_bucket(date_from)
+    ).values(
+        date=F('bucket')
     ).annotate(
-        date=TruncDate('created_at')
-    ).values('date').annotate(
-        total_clicks=Count('id'),
-        unique_users=Count('vk_user_id', distinct=True)
+        total_clicks=Sum('clicks')
     ).order_by('date')
     
-    return list(daily_stats)
+    if exact:
+        unique_users = dict(
+            ClickLog.objects.filter(
+                created_at__gte=day_start(day_bucket(date_from))
+            ).annotate(
+                date=TruncDate('created_at')
+            ).values('date').annotate(
+                unique_users=Count('vk_user_id', distinct=True)
+            ).values_list('date', 'unique_users')
+        )
+    else:
+        unique_users = count_unique_users_by_day(day_bucket(date_from))
+    return [
+        {**row, 'unique_users': unique_users.get(row['date'], 0)}
+        for row in daily_stats
+    ]
 
 
 def get_hourly_statistics(days=7):
@@ -71,25 +166,31 @@ def get_hourly_statistics(days=7):
     """
     date_from = timezone.now() - timedelta(days=days)
     
-    hourly_stats = ClickLog.objects.filter(
-        created_at__gte=date_from
+    hourly_stats = ClickRollupHourly.objects.filter(
+        bucket__gte=hour_bucket(date_from)
+    ).values(
+        hour=F('bucket')
     ).annotate(
-        hour=TruncHour('created_at')
-    ).values('hour').annotate(
-        total_clicks=Count('id')
+        total_clicks=Sum('clicks')
     ).order_by('hour')
     
-    return list(hourly_stats)
+    # Час в локальном поясе, как возвращал TruncHour по сырым кликам
+    return [
+        {**row, 'hour': timezone.localtime(row['hour'])}
+        for row in hourly_stats
+    ]
 
 
-def get_top_offers(limit=10, days=30):
+def get_top_offers(limit=10, days=30, exact=False):
     """
     ТОП офферов по кликам
+    
+    Уникальные пользователи — см. _unique_users_by.
     """
     date_from = timezone.now() - timedelta(days=days)
     
-    top_offers = ClickLog.objects.filter(
-        created_at__gte=date_from,
+    top_offers = list(ClickRollupHourly.objects.filter(
+        bucket__gte=hour_bucket(date_from),
         offer__isnull=False
     ).values(
         'offer__id',
@@ -97,29 +198,82 @@ def get_top_offers(limit=10, days=30):
         'offer__logo_url',
         'offer__rate_text'
     ).annotate(
-        total_clicks=Count('id'),
-        unique_users=Count('vk_user_id', distinct=True)
-    ).order_by('-total_clicks')[:limit]
+        total_clicks=Sum('clicks')
+    ).order_by('-total_clicks')[:limit])
+    
+    unique_users = _unique_users_by(
+        date_from, OFFER, exact, keys=[row['offer__id'] for row in top_offers]
+    )
+    return [
+        {**row, 'unique_users': unique_users.get(row['offer__id'], 0)}
+        for row in top_offers
+    ]
+
+
+_SCOPE_FIELDS = {OFFER: 'offer_id', BRAND: 'brand'}
+
+
+def _unique_users_by(date_from, scope, exact=False, keys=None):
+    """
+    Уникальные пользователи по офферам (OFFER) или брендам (BRAND): {offer_id | brand: число}
+    
+    По умолчанию — оценки по дневным скетчам (период с начала первого дня,
+    ошибка — как у unique_users_error), exact=True — по сырым кликам.
     
-    return list(top_offers)
+    Args:
+        keys: Только эти офферы или бренды (None — все)
+    """
+    field = _SCOPE_FIELDS[scope]
+    if exact:
+        clicks = ClickLog.objects.filter(created_at__gte=date_from)
+        if keys is not None:
+            clicks = clicks.filter(**{f'{field}__in': keys})
+        return dict(
+            clicks.values(field).annotate(
+                unique_users=Count('vk_user_id', distinct=True)
+            ).values_list(field, 'unique_users').order_by()
+        )
+    
+    estimates = count_unique_users_by_key(
+        day_bucket(date_from), scope, None if keys is None else [str(key) for key in keys]
+    )
+    if scope == OFFER:
+        return {int(key): count for key, count in estimates.items()}
+    return estimates
 
 
-def get_conversion_rate(days=30):
+def get_conversion_rate(days=30, exact=False):
     """
     Конверсия: клики / уникальные пользователи
+    
+    По умолчанию клики берутся из дневных агрегатов, а уникальные пользователи
+    оцениваются по HyperLogLog-скетчам (ошибка см. в unique_users_error);
+    период округляется до начала первого дня. exact=True считает всё по сырым кликам.
     """
     date_from = timezone.now() - timedelta(days=days)
     
-    total_clicks = ClickLog.objects.filter(created_at__gte=date_from).count()
-    unique_users = ClickLog.objects.filter(
-        created_at__gte=date_from
-    ).values('vk_user_id').distinct().count()
+    if exact:
+        totals = _exact_click_totals(date_from)
+        total_clicks = totals['total_clicks']
+        unique_users = totals['unique_users']
+    else:
+        day_from = day_bucket(date_from)
+        total_clicks = ClickRollupDaily.objects.filter(
+            bucket__gte=day_from
+        ).aggregate(total=Sum('clicks'))['total'] or 0
+        unique_users = count_unique_users(day_from)
     
+    return _conversion_metrics(total_clicks, unique_users, exact)
+
+
+def _conversion_metrics(total_clicks, unique_users, exact):
+    """Метрики конверсии из уже посчитанных кликов и уникальных пользователей"""
     conversion_rate = (total_clicks / unique_users * 100) if unique_users > 0 else 0
     
     return {
         'total_clicks': total_clicks,
         'unique_users': unique_users,
+        'unique_users_error': _unique_users_error(exact),
         'conversion_rate': round(conversion_rate, 2),
         'avg_clicks_per_user': round(total_clicks / unique_users, 2) if unique_users > 0 else 0
     }
@@ -128,45 +282,76 @@ def get_conversion_rate(days=30):
 def get_subscriber_statistics():
     """
     Статистика по подписчикам
-    """
-    total_subscribers = Subscriber.objects.count()
-    active_subscribers = Subscriber.objects.filter(subscribed=True).count()
-    with_messages = Subscriber.objects.filter(
-        subscribed=True, 
-        allowed_from_group=True
-    ).count()
     
+    Один сгруппированный запрос: общие итоги складываются из разбивки по брендам.
+    """
     # Подписчики по брендам
-    by_brand = Subscriber.objects.values('brand').annotate(
+    by_brand = list(Subscriber.objects.values('brand').annotate(
         total=Count('id'),
         active=Count('id', filter=Q(subscribed=True)),
         with_messages=Count('id', filter=Q(subscribed=True, allowed_from_group=True))
-    ).order_by('-total')
+    ).order_by('-total'))
     
     return {
-        'total': total_subscribers,
-        'active': active_subscribers,
-        'with_messages': with_messages,
-        'by_brand': list(by_brand)
+        'total': sum(row['total'] for row in by_brand),
+        'active': sum(row['active'] for row in by_brand),
+        'with_messages': sum(row['with_messages'] for row in by_brand),
+        'by_brand': by_brand
     }
 
 
-def get_offer_performance(offer_id, days=30):
+def get_offer_performance(offer_id, days=30, exact=False):
     """
     Детальная статистика по конкретному офферу
+    
+    exact=True считает по сырым кликам, иначе — по агрегатам и скетчам
+    (см. get_conversion_rate).
     """
     date_from = timezone.now() - timedelta(days=days)
     
-    # Общая статистика
-    total_clicks = ClickLog.objects.filter(
-        offer_id=offer_id,
-        created_at__gte=date_from
-    ).count()
+    if exact:
+        return _get_offer_performance_exact(offer_id, date_from)
     
-    unique_users = ClickLog.objects.filter(
-        offer_id=offer_id,
-        created_at__gte=date_from
-    ).values('vk_user_id').distinct().count()
+    day_from = day_bucket(date_from)
+    rollups = ClickRollupDaily.objects.filter(offer_id=offer_id, bucket__gte=day_from)
+    
+    # По дням
+    daily = rollups.values(
+        date=F('bucket')
+    ).annotate(
+        clicks=Sum('clicks')
+    ).order_by('date')
+    
+    # По брендам
+    by_brand = rollups.filter(
+        brand__isnull=False
+    ).values('brand').annotate(
+        clicks=Sum('clicks')
+    ).order_by('-clicks')
+    
+    daily = list(daily)
+    total_clicks = sum(row['clicks'] for row in daily)
+    unique_users = count_unique_users(day_from, scope=OFFER, key=str(offer_id))
+    impressions = _offer_impressions(offer_id, date_from)
+    
+    return {
+        'total_clicks': total_clicks,
+        'unique_users': unique_users,
+        'unique_users_error': _unique_users_error(exact),
+        'avg_clicks_per_user': round(total_clicks / unique_users, 2) if unique_users > 0 else 0,
+        'impressions': impressions,
+        'ctr': _ctr(total_clicks, impressions),
+        'daily': daily,
+        'by_brand': list(by_brand)
+    }
+
+
+def _get_offer_performance_exact(offer_id, date_from):
+    """Детальная статистика по офферу по сырым кликам"""
+    # Общая статистика (вместе с архивом)
+    totals = _exact_click_totals(date_from, offer_id=offer_id)
+    total_clicks = totals['total_clicks']
+    unique_users = totals['unique_users']
     
     # По дням
     daily = ClickLog.objects.filter(
@@ -187,53 +372,150 @@ def get_offer_performance(offer_id, days=30):
         clicks=Count('id')
     ).order_by('-clicks')
     
+    impressions = _offer_impressions(offer_id, date_from)
+    
     return {
         'total_clicks': total_clicks,
         'unique_users': unique_users,
+        'unique_users_error': _unique_users_error(True),
         'avg_clicks_per_user': round(total_clicks / unique_users, 2) if unique_users > 0 else 0,
+        'impressions': impressions,
+        'ctr': _ctr(total_clicks, impressions),
         'daily': list(daily),
         'by_brand': list(by_brand)
     }
 
 
-def get_dashboard_summary(days=30):
+def _exact_click_totals(date_from, **filters):
     """
-    Сводка для дашборда
+    Клики, уникальные пользователи и активные офферы по сырым кликам с date_from
+    
+    Без архивных файлов в периоде — один агрегирующий запрос. Иначе архивные
+    клики дочитываются из файлов, а уникальные пользователи и офферы
+    считаются объединением множеств из БД и архива (в памяти).
+    Клики без vk_user_id, как и в values('vk_user_id').distinct(), — один пользователь.
     """
-    date_from = timezone.now() - timedelta(days=days)
+    clicks = ClickLog.objects.filter(created_at__gte=date_from, **filters)
     
-    # Общие метрики
-    total_clicks = ClickLog.objects.filter(created_at__gte=date_from).count()
-    unique_users = ClickLog.objects.filter(
-        created_at__gte=date_from
-    ).values('vk_user_id').distinct().count()
+    if not archived_files(ClickLog, day_bucket(date_from)):
+        totals = clicks.aggregate(
+            total_clicks=Count('id'),
+            unique_users=Count('vk_user_id', distinct=True),
+            anonymous_clicks=Count('id', filter=Q(vk_user_id__isnull=True)),
+            active_offers=Count('offer_id', distinct=True)
+        )
+        if totals.pop('anonymous_clicks'):
+            totals['unique_users'] += 1
+        return totals
     
-    # Активные офферы (с кликами)
-    active_offers = ClickLog.objects.filter(
-        created_at__gte=date_from,
+    total_clicks = clicks.count()
+    users = set(clicks.values_list('vk_user_id', flat=True).distinct().order_by())
+    offers = set(clicks.filter(
         offer__isnull=False
-    ).values('offer_id').distinct().count()
+    ).values_list('offer_id', flat=True).distinct().order_by())
+    # Значения фильтров приводим к типам полей, как это делает ORM (offer_id из URL — строка)
+    fields = {field.attname: field for field in ClickLog._meta.concrete_fields}
+    archive_filters = {name: fields[name].to_python(value) for name, value in filters.items()}
+    for row in iter_archived_rows(ClickLog, date_from):
+        if any(row[name] != value for name, value in archive_filters.items()):
+            continue
+        total_clicks += 1
+        users.add(row['vk_user_id'])
+        if row['offer_id'] is not None:
+            offers.add(row['offer_id'])
     
-    # Всего офферов
-    total_offers = Offer.objects.filter(is_active=True).count()
-    
-    # Подписчики
-    subscribers = get_subscriber_statistics()
+    return {
+        'total_clicks': total_clicks,
+        'unique_users': len(users),
+        'active_offers': len(offers),
+    }
+
+
+def _unique_users_error(exact):
+    """Стандартная относительная ошибка unique_users"""
+    return 0 if exact else round(HyperLogLog.relative_error(), 4)
+
+
+def get_dashboard_summary(days=30, exact=False):
+    """
+    Сводка для дашборда
     
-    # ТОП-5 офферов
-    top_offers = get_top_offers(limit=5, days=days)
+    Все метрики по кликам собираются одним сгруппированным запросом (плюс
+    запрос скетчей или ТОП-5 в точном режиме) и переиспользуются: конверсия
+    считается из тех же итогов, а число активных офферов берётся из каталога.
+    exact=True считает по сырым кликам, иначе — по агрегатам и скетчам
+    (см. get_conversion_rate).
+    """
+    date_from = timezone.now() - timedelta(days=days)
     
-    # Конверсия
-    conversion = get_conversion_rate(days=days)
+    if exact:
+        metrics = _collect_click_metrics_exact(date_from, top_limit=5)
+    else:
+        metrics = _collect_click_metrics(date_from, top_limit=5)
     
     return {
         'period_days': days,
-        'total_clicks': total_clicks,
-        'unique_users': unique_users,
-        'active_offers': active_offers,
-        'total_offers': total_offers,
-        'subscribers': subscribers,
+        'total_clicks': metrics['total_clicks'],
+        'unique_users': metrics['unique_users'],
+        'unique_users_error': _unique_users_error(exact),
+        'active_offers': metrics['active_offers'],
+        'total_offers': len(get_catalog()),
+        'subscribers': get_subscriber_statistics(),
+        'top_offers': metrics['top_offers'],
+        'conversion': _conversion_metrics(metrics['total_clicks'], metrics['unique_users'], exact)
+    }
+
+
+def _collect_click_metrics(date_from, top_limit):
+    """Метрики кликов для дашборда по дневным агрегатам и скетчам (2 запроса)"""
+    day_from = day_bucket(date_from)
+    
+    # Клики по офферам; строка с offer__id=None — клики без оффера
+    by_offer = list(ClickRollupDaily.objects.filter(
+        bucket__gte=day_from
+    ).values(
+        'offer__id',
+        'offer__partner_name',
+        'offer__logo_url',
+        'offer__rate_text'
+    ).annotate(
+        total_clicks=Sum('clicks')
+    ).order_by('-total_clicks'))
+    
+    offers = [row for row in by_offer if row['offer__id'] is not None and row['total_clicks']]
+    top_offers = offers[:top_limit]
+    
+    unique_users = count_unique_users_many(
+        day_from,
+        [(TOTAL, '')] + [(OFFER, str(row['offer__id'])) for row in top_offers]
+    )
+    for row in top_offers:
+        row['unique_users'] = unique_users[(OFFER, str(row['offer__id']))]
+    
+    return {
+        'total_clicks': sum(row['total_clicks'] for row in by_offer),
+        'unique_users': unique_users[(TOTAL, '')],
+        'active_offers': len(offers),
         'top_offers': top_offers,
-        'conversion': conversion
     }
 
+
+def _collect_click_metrics_exact(date_from, top_limit):
+    """Метрики кликов для дашборда по сырым кликам (2 запроса без архива)"""
+    clicks = ClickLog.objects.filter(created_at__gte=date_from)
+    
+    totals = _exact_click_totals(date_from)
+    
+    top_offers = clicks.filter(
+        offer__isnull=False
+    ).values(
+        'offer__id',
+        'offer__partner_name',
+        'offer__logo_url',
+        'offer__rate_text'
+    ).annotate(
+        total_clicks=Count('id'),
+        unique_users=Count('vk_user_id', distinct=True)
+    ).order_by('-total_clicks')[:top_limit]
+    
+    return {**totals, 'top_offers': list(top_offers)}
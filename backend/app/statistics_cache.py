@@ -0,0 +1,133 @@
+"""
+Кэш результатов /api/statistics/* в памяти воркера.
+
+Результат хранится по ключу (эндпоинт, параметры запроса):
+- пока он свежее TTL эндпоинта, отдаётся из памяти (HIT);
+- в течение stale_ttl после этого отдаётся устаревший результат (STALE),
+  а новый считается в фоновом потоке;
+- одновременные запросы с одним ключом ждут одно вычисление (single-flight),
+  а не запускают каждый своё.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+COALESCED = 'COALESCED'
+
+CachedResult = namedtuple('CachedResult', ['value', 'age', 'status'])
+
+
+class _Flight:
+    """Вычисление, которого ждут запросы с одинаковым ключом"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class StatisticsCache:
+    """
+    TTL-кэш результатов с stale-while-revalidate и single-flight.
+
+    Args:
+        ttls: Время свежести (сек) по эндпоинтам
+        default_ttl: Время свежести для эндпоинтов, которых нет в ttls
+        stale_ttl: Сколько (сек) после истечения TTL отдавать устаревший результат
+        max_entries: Максимальное число ключей (вытесняются давно не читавшиеся)
+    """
+
+    def __init__(self, ttls=None, default_ttl=60, stale_ttl=300, max_entries=512):
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+
+    def get(self, endpoint, func, **params):
+        """
+        Вернуть результат func(**params) из кэша или посчитать его.
+
+        Returns:
+            CachedResult(value, age, status), где age — возраст результата в секундах
+        """
+        key = (endpoint,) + tuple(sorted(params.items()))
+        ttl = self.ttls.get(endpoint, self.default_ttl)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, computed_at = entry
+                age = time.monotonic() - computed_at
+                if age < ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    if age < ttl:
+                        return CachedResult(value, age, HIT)
+                    if key not in self._flights:
+                        flight = self._flights[key] = _Flight()
+                        threading.Thread(
+                            target=self._refresh, args=(key, flight, func, params),
+                            name=f'statistics-refresh-{endpoint}', daemon=True
+                        ).start()
+                    return CachedResult(value, age, STALE)
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._compute(key, flight, func, params)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return CachedResult(flight.value, 0.0, MISS if leader else COALESCED)
+
+    def clear(self):
+        """Сбросить все результаты"""
+        with self._lock:
+            self._entries.clear()
+
+    def _compute(self, key, flight, func, params):
+        try:
+            flight.value = func(**params)
+        except Exception as e:
+            flight.error = e
+            logger.error(f"Statistics computation {key} failed: {e}")
+        else:
+            with self._lock:
+                self._entries[key] = (flight.value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _refresh(self, key, flight, func, params):
+        # Фоновый поток открывает собственное соединение с БД — закрываем его сами
+        try:
+            self._compute(key, flight, func, params)
+        finally:
+            connection.close()
+
+
+statistics_cache = StatisticsCache(
+    ttls=settings.STATISTICS_CACHE_TTLS,
+    default_ttl=settings.STATISTICS_CACHE_TTL,
+    stale_ttl=settings.STATISTICS_CACHE_STALE_TTL,
+    max_entries=settings.STATISTICS_CACHE_MAX_ENTRIES,
+)
@@ -1,8 +1,10 @@
 """
 API views для статистики
 """
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
+from django.utils import timezone
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
@@ -17,6 +19,32 @@ from .statistics import (
     get_offer_performance,
     get_dashboard_summary
 )
+from .statistics_cache import statistics_cache
+
+# Больше офферов на странице статистики — дороже объединение их скетчей
+OFFER_STATISTICS_MAX_LIMIT = 500
+from .exports import CONTENT_TYPES, ExportError, stream_export
+
+
+def _get_exact(request):
+    """Флаг ?exact=true: точный подсчёт по сырым кликам вместо скетчей"""
+    return request.GET.get('exact', '').lower() in ('1', 'true', 'yes')
+
+
+def _cached_response(endpoint, func, **params):
+    """
+    Ответ со статистикой из кэша результатов (см. statistics_cache.py)
+    
+    X-Statistics-Cache: HIT / STALE / MISS / COALESCED, Age: возраст данных в секундах
+    """
+    result = statistics_cache.get(endpoint, func, **params)
+    response = Response({
+        'success': True,
+        'data': result.value
+    })
+    response['X-Statistics-Cache'] = result.status
+    response['Age'] = str(int(result.age))
+    return response
 
 
 @staff_member_required
@@ -30,18 +58,14 @@ def statistics_dashboard_html(request):
 @api_view(['GET'])
 def statistics_dashboard_view(request):
     """
-    GET /api/statistics/dashboard/?days=30
+    GET /api/statistics/dashboard/?days=30&exact=false
     
     Сводка статистики для дашборда
     """
     days = int(request.GET.get('days', 30))
     
     try:
-        summary = get_dashboard_summary(days=days)
-        return Response({
-            'success': True,
-            'data': summary
-        })
+        return _cached_response('dashboard', get_dashboard_summary, days=days, exact=_get_exact(request))
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
@@ -52,18 +76,19 @@ def statistics_dashboard_view(request):
 @api_view(['GET'])
 def statistics_offers_view(request):
     """
-    GET /api/statistics/offers/?days=30
+    GET /api/statistics/offers/?days=30&limit=100&offset=0&exact=false
     
-    Статистика по офферам
+    Статистика по офферам (страница по убыванию кликов, limit не больше OFFER_STATISTICS_MAX_LIMIT)
     """
     days = int(request.GET.get('days', 30))
+    limit = min(max(int(request.GET.get('limit', 100)), 1), OFFER_STATISTICS_MAX_LIMIT)
+    offset = max(int(request.GET.get('offset', 0)), 0)
     
     try:
-        stats = get_offer_statistics(days=days)
-        return Response({
-            'success': True,
-            'data': stats
-        })
+        return _cached_response(
+            'offers', get_offer_statistics,
+            days=days, exact=_get_exact(request), limit=limit, offset=offset
+        )
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
@@ -74,18 +99,14 @@ def statistics_offers_view(request):
 @api_view(['GET'])
 def statistics_brands_view(request):
     """
-    GET /api/statistics/brands/?days=30
+    GET /api/statistics/brands/?days=30&exact=false
     
     Статистика по брендам
     """
     days = int(request.GET.get('days', 30))
     
     try:
-        stats = get_brand_statistics(days=days)
-        return Response({
-            'success': True,
-            'data': stats
-        })
+        return _cached_response('brands', get_brand_statistics, days=days, exact=_get_exact(request))
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
@@ -96,18 +117,14 @@ def statistics_brands_view(request):
 @api_view(['GET'])
 def statistics_daily_view(request):
     """
-    GET /api/statistics/daily/?days=30
+    GET /api/statistics/daily/?days=30&exact=false
     
     Статистика по дням
     """
     days = int(request.GET.get('days', 30))
     
     try:
-        stats = get_daily_statistics(days=days)
-        return Response({
-            'success': True,
-            'data': stats
-        })
+        return _cached_response('daily', get_daily_statistics, days=days, exact=_get_exact(request))
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
@@ -118,7 +135,7 @@ def statistics_daily_view(request):
 @api_view(['GET'])
 def statistics_top_offers_view(request):
     """
-    GET /api/statistics/top-offers/?limit=10&days=30
+    GET /api/statistics/top-offers/?limit=10&days=30&exact=false
     
     ТОП офферов по кликам
     """
@@ -126,11 +143,7 @@ def statistics_top_offers_view(request):
     days = int(request.GET.get('days', 30))
     
     try:
-        stats = get_top_offers(limit=limit, days=days)
-        return Response({
-            'success': True,
-            'data': stats
-        })
+        return _cached_response('top_offers', get_top_offers, limit=limit, days=days, exact=_get_exact(request))
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
@@ -141,18 +154,17 @@ def statistics_top_offers_view(request):
 @api_view(['GET'])
 def statistics_offer_detail_view(request, offer_id):
     """
-    GET /api/statistics/offers/<offer_id>/?days=30
+    GET /api/statistics/offers/<offer_id>/?days=30&exact=false
     
     Детальная статистика по офферу
     """
     days = int(request.GET.get('days', 30))
     
     try:
-        stats = get_offer_performance(offer_id=offer_id, days=days)
-        return Response({
-            'success': True,
-            'data': stats
-        })
+        return _cached_response(
+            'offer_detail', get_offer_performance,
+            offer_id=offer_id, days=days, exact=_get_exact(request)
+        )
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
@@ -163,18 +175,14 @@ def statistics_offer_detail_view(request, offer_id):
 @api_view(['GET'])
 def statistics_conversion_view(request):
     """
-    GET /api/statistics/conversion/?days=30
+    GET /api/statistics/conversion/?days=30&exact=false
     
     Конверсия и метрики
     """
     days = int(request.GET.get('days', 30))
     
     try:
-        stats = get_conversion_rate(days=days)
-        return Response({
-            'success': True,
-            'data': stats
-        })
+        return _cached_response('conversion', get_conversion_rate, days=days, exact=_get_exact(request))
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
@@ -190,14 +198,28 @@ def statistics_subscribers_view(request):
     Статистика по подписчикам
     """
     try:
-        stats = get_subscriber_statistics()
-        return Response({
-            'success': True,
-            'data': stats
-        })
+        return _cached_response('subscribers', get_subscriber_statistics)
     except Exception as e:
         return Response(
             {'success': False, 'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+@staff_member_required
+def statistics_export_view(request, source):
+    """
+    GET /api/statistics/export/<source>/?format=csv&date_from=2024-01-01&date_to=2024-01-31&offer=10&brand=kokos
+    
+    Потоковая выгрузка в CSV / JSONL (для админов): clicks и events — сырые
+    журналы с фильтрами, offers / brands / daily / top-offers — статистика за ?days=30
+    """
+    fmt = request.GET.get('format', 'csv')
+    try:
+        chunks = stream_export(source, fmt, request.GET)
+    except ExportError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{source}-{timezone.localdate():%Y-%m-%d}.{fmt}"'
+    return response
@@ -0,0 +1,517 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DataError, OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .archive import archive_rows, archived_files
+from .buffering import BatchBuffer
+from .catalog import get_catalog, invalidate_catalog
+from .config_cache import invalidate_config
+from .clicks import write_clicks
+from .hll import HyperLogLog
+from .models import AppConfig, ClickLog, ClickRollupDaily, ClickRollupHourly, Offer, OfferImpressionHourly, Subscriber
+from .rollups import hour_bucket
+from .scoring import compute_offer_scores
+from .sketches import OFFER, TOTAL, count_unique_users_by_day, count_unique_users_by_key, count_unique_users_many, merge_sketches
+from .statistics import get_brand_statistics, get_dashboard_summary, get_offer_performance, get_offer_statistics
+
+
+def create_offer(name='Тест', **fields):
+    return Offer.objects.create(**{
+        'partner_name': name,
+        'logo_url': 'https://example.com/logo.png',
+        'sum_min': 1000,
+        'sum_max': 30000,
+        'term_min': 5,
+        'term_max': 30,
+        'rate': 0.8,
+        'rate_text': '0.8% в день',
+        'approval_time': '15 минут',
+        'approval_probability': 'высокая',
+        'redirect_url': 'https://example.com/go?sub={sub_id}',
+        **fields,
+    })
+
+
+class CatalogInvalidationTests(TestCase):
+    """Каталог перестраивается только после фиксации транзакции"""
+
+    def setUp(self):
+        invalidate_catalog()
+
+    def test_offer_change_is_applied_on_commit(self):
+        get_catalog()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            offer = create_offer()
+            # До фиксации версия не поднята: другие воркеры ещё не видят изменения
+            self.assertIsNone(get_catalog().get(offer.pk))
+        self.assertTrue(callbacks)
+        self.assertEqual(get_catalog().get(offer.pk), offer)
+
+
+class ConfigETagTests(TestCase):
+    """Условные запросы /api/config/"""
+
+    def setUp(self):
+        invalidate_config()
+
+    def test_matching_etag_returns_304(self):
+        response = self.client.get('/api/config/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get('/api/config/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_config(self):
+        etag = self.client.get('/api/config/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            AppConfig.get_or_create_config().save()
+
+        response = self.client.get('/api/config/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(response.json()['success'])
+
+
+class OffersPaginationTests(TestCase):
+    """Границы постраничной и курсорной выдачи /api/offers/"""
+
+    def setUp(self):
+        self.offers = [create_offer(f'Оффер {index}', rate=index / 10) for index in range(7)]
+        invalidate_catalog()
+
+    def get(self, **params):
+        return self.client.get('/api/offers/', params)
+
+    def test_cursor_pages_cover_every_offer_once(self):
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            data = self.get(cursor=cursor, page_size=3).json()['data']
+            self.assertLessEqual(len(data['results']), 3)
+            seen += [offer['id'] for offer in data['results']]
+            cursor = data['next_cursor']
+
+        self.assertEqual(sorted(seen), sorted(offer.pk for offer in self.offers))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_last_full_page_has_no_next_cursor(self):
+        data = self.get(cursor='', page_size=7).json()['data']
+        self.assertEqual(len(data['results']), 7)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_page_size_is_clamped(self):
+        for page_size, expected in (('0', 1), ('-5', 1), ('1000', 100)):
+            for params in ({'cursor': ''}, {'page': '1'}):
+                with self.subTest(page_size=page_size, **params):
+                    response = self.get(page_size=page_size, **params)
+                    self.assertEqual(response.status_code, 200)
+                    data = response.json()['data']
+                    self.assertEqual(data['page_size'], expected)
+                    self.assertEqual(len(data['results']), min(expected, 7))
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'page_size': 'abc'}, {'page': 'x'}, {'cursor': 'garbage'}):
+            with self.subTest(**params):
+                self.assertEqual(self.get(**params).status_code, 400)
+        self.assertEqual(self.client.get('/api/bootstrap/', {'page_size': 'abc'}).status_code, 400)
+
+
+class BatchBufferTests(SimpleTestCase):
+    """Spool-файл при недоступной БД и карантин для отвергнутых записей"""
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+        self.written = []
+        self.db_down = False
+
+    def flush(self, records):
+        if self.db_down:
+            raise OperationalError('connection refused')
+        if any(record['id'] < 0 for record in records):
+            raise DataError('value out of range')
+        self.written.extend(records)
+
+    def make_buffer(self):
+        buffer = BatchBuffer('test', self.flush, batch_size=10, flush_interval=0.05, spool_dir=self.spool_dir)
+        self.addCleanup(buffer.shutdown)
+        return buffer
+
+    def spool_files(self, suffix):
+        return [name for name in os.listdir(self.spool_dir) if name.endswith(suffix)]
+
+    def test_records_are_spooled_and_replayed(self):
+        buffer = self.make_buffer()
+        self.db_down = True
+        for index in range(3):
+            buffer.put({'id': index})
+        buffer.shutdown()
+        self.assertEqual(self.written, [])
+        self.assertEqual(len(self.spool_files('.jsonl')), 1)
+
+        # Первая успешная запись дозаписывает spool
+        self.db_down = False
+        buffer.put({'id': 3})
+        buffer.shutdown()
+        self.assertEqual(sorted(record['id'] for record in self.written), [0, 1, 2, 3])
+        self.assertEqual(self.spool_files('.jsonl'), [])
+        self.assertEqual(buffer.metrics()['spilled'], 3)
+        self.assertEqual(buffer.metrics()['written'], 4)
+
+    def test_rejected_record_is_quarantined(self):
+        buffer = self.make_buffer()
+        for record_id in (1, -1, 2):
+            buffer.put({'id': record_id})
+        buffer.shutdown()
+
+        self.assertEqual(sorted(record['id'] for record in self.written), [1, 2])
+        self.assertEqual(buffer.metrics()['quarantined'], 1)
+        [quarantine] = self.spool_files('.quarantine')
+        with open(os.path.join(self.spool_dir, quarantine), encoding='utf-8') as lines:
+            self.assertEqual([json.loads(line) for line in lines], [{'id': -1}])
+
+
+@override_settings(RESPONSE_COMPRESSION_MIN_SIZE=0)
+class CompressedPayloadTests(TestCase):
+    """Сжатые варианты готового ответа /api/offers/"""
+
+    def setUp(self):
+        create_offer()
+        invalidate_catalog()
+
+    def test_gzip_variant_has_own_etag(self):
+        plain = self.client.get('/api/offers/')
+        compressed = self.client.get('/api/offers/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(compressed['ETag'], plain['ETag'][:-1] + '-gzip"')
+
+    def test_any_variant_etag_returns_304(self):
+        plain_etag = self.client.get('/api/offers/')['ETag']
+        response = self.client.get('/api/offers/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain_etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], plain_etag[:-1] + '-gzip"')
+
+
+class ArchiveTestCase(TestCase):
+    """Тесты с архивом журналов во временном каталоге"""
+
+    def setUp(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir, ignore_errors=True)
+        archive_settings = override_settings(ARCHIVE_DIR=archive_dir)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+
+
+class ExactTotalsWithArchiveTests(ArchiveTestCase):
+    """Точные итоги статистики включают архивные дни"""
+
+    def setUp(self):
+        super().setUp()
+        self.offer = create_offer()
+        other = create_offer('Другой')
+        old = timezone.now() - timedelta(days=10)
+        for vk_user_id in ('1', '2'):
+            ClickLog.objects.create(offer=self.offer, vk_user_id=vk_user_id, created_at=old)
+        ClickLog.objects.create(offer=other, vk_user_id='3', created_at=old)
+        ClickLog.objects.create(offer=self.offer, vk_user_id='1')
+        self.cutoff = timezone.localdate() - timedelta(days=5)
+
+    def test_offer_performance_counts_archived_clicks(self):
+        archive_rows(ClickLog, self.cutoff)
+        self.assertEqual(ClickLog.objects.count(), 1)
+
+        # offer_id приходит из URL строкой
+        performance = get_offer_performance(str(self.offer.pk), days=30, exact=True)
+
+        self.assertEqual(performance['total_clicks'], 3)
+        self.assertEqual(performance['unique_users'], 2)
+
+    def test_rows_kept_in_database_are_not_counted_twice(self):
+        archive_rows(ClickLog, self.cutoff, delete=False)
+        archive_rows(ClickLog, self.cutoff, delete=False)
+        self.assertEqual(len(archived_files(ClickLog)), 1)
+        self.assertEqual(get_offer_performance(self.offer.pk, days=30, exact=True)['total_clicks'], 3)
+
+        # Удаление прервалось после части строк
+        ClickLog.objects.filter(vk_user_id='2').delete()
+        self.assertEqual(get_offer_performance(self.offer.pk, days=30, exact=True)['total_clicks'], 3)
+
+        archive_rows(ClickLog, self.cutoff)
+        self.assertEqual(ClickLog.objects.count(), 1)
+        self.assertEqual(len(archived_files(ClickLog)), 1)
+        self.assertEqual(get_offer_performance(self.offer.pk, days=30, exact=True)['total_clicks'], 3)
+
+
+class ClickRollupsTests(TestCase):
+    """Пачки кликов прибавляются к одной строке агрегата на ключ"""
+
+    def test_batches_are_added_to_existing_rows(self):
+        offer = create_offer()
+        now = timezone.now().timestamp()
+        batch = [
+            {'offer_id': offer.pk, 'vk_user_id': '1', 'brand': 'kokos', 'ts': now},
+            # Пустые бренд и группа — тоже один ключ
+            {'offer_id': offer.pk, 'vk_user_id': '2', 'ts': now},
+        ]
+        write_clicks(batch)
+        write_clicks(batch)
+
+        for model in (ClickRollupHourly, ClickRollupDaily):
+            with self.subTest(model=model.__name__):
+                rows = model.objects.order_by('brand').values_list('brand', 'group_id', 'clicks')
+                self.assertEqual(list(rows), [('kokos', None, 2), (None, None, 2)])
+
+
+class HyperLogLogTests(SimpleTestCase):
+    """Оценка, объединение и хранение скетчей"""
+
+    def test_estimate_is_within_error(self):
+        sketch = HyperLogLog()
+        sketch.update(range(20000))
+        self.assertAlmostEqual(sketch.count(), 20000, delta=20000 * 3 * HyperLogLog.relative_error())
+
+    def test_merge_equals_sketch_of_union(self):
+        first, second, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        first.update(range(0, 6000))
+        second.update(range(4000, 10000))
+        union.update(range(10000))
+
+        self.assertEqual(first.merge(second).registers, union.registers)
+
+    def test_entries_round_trip(self):
+        sketch = HyperLogLog()
+        sketch.update(range(300))
+        entries = sketch.to_entries()
+
+        self.assertEqual(len(entries), len([rank for rank in sketch.registers if rank]))
+        self.assertEqual(HyperLogLog.from_entries(entries).registers, sketch.registers)
+
+
+class UniqueUsersSketchTests(TestCase):
+    """Скетчи объединяются в БД так же, как в Python"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.days = [self.today - timedelta(days=offset) for offset in range(3)]
+        # Пользователи дней пересекаются: за три дня их 3000, а не 4500
+        self.users = {day: range(index * 750, index * 750 + 1500) for index, day in enumerate(self.days)}
+        sketches = {}
+        for day, users in self.users.items():
+            for scope, key in ((TOTAL, ''), (OFFER, '1')):
+                sketches[(scope, key, day)] = HyperLogLog()
+                sketches[(scope, key, day)].update(users)
+        merge_sketches(sketches)
+        # Повторное объединение тех же пользователей ничего не меняет
+        merge_sketches(sketches)
+
+    def expected(self, days):
+        merged = HyperLogLog()
+        for day in days:
+            merged.update(self.users[day])
+        return merged.count()
+
+    def test_period_estimate_matches_python_merge(self):
+        day_from = self.days[-1]
+        estimate = count_unique_users_by_key(day_from, OFFER)['1']
+
+        self.assertEqual(estimate, self.expected(self.days))
+        self.assertAlmostEqual(estimate, 3000, delta=3000 * 3 * HyperLogLog.relative_error())
+        self.assertEqual(
+            count_unique_users_many(day_from, [(TOTAL, ''), (OFFER, '1'), (OFFER, '2')]),
+            {(TOTAL, ''): estimate, (OFFER, '1'): estimate, (OFFER, '2'): 0},
+        )
+
+    def test_estimates_by_day(self):
+        self.assertEqual(
+            count_unique_users_by_day(self.days[-1]),
+            {day: self.expected([day]) for day in self.days},
+        )
+
+
+class SubscriberAdminTests(TestCase):
+    """Клики подписчиков в админке считаются для строк страницы"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        offer = create_offer()
+        self.subscribers = [
+            Subscriber.objects.create(vk_user_id=str(index), group_id='1', brand='kokos')
+            for index in range(3)
+        ]
+        for index, subscriber in enumerate(self.subscribers):
+            for _ in range(index * 2):
+                ClickLog.objects.create(offer=offer, subscriber=subscriber, vk_user_id=subscriber.vk_user_id)
+
+    def test_changelist_counts_clicks_without_joining_click_logs(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/app/subscriber/')
+
+        self.assertEqual(response.status_code, 200)
+        counts = {row.vk_user_id: row._clicks_count for row in response.context['cl'].result_list}
+        self.assertEqual(counts, {'0': 0, '1': 2, '2': 4})
+        page_queries = [query['sql'] for query in queries if '_clicks_count' in query['sql']]
+        self.assertEqual(len(page_queries), 1)
+        self.assertNotIn('JOIN "click_logs"', page_queries[0])
+
+    def test_csv_export_counts_clicks_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/admin/app/subscriber/', {
+                'action': 'export_subscribers_to_csv',
+                '_selected_action': [subscriber.pk for subscriber in self.subscribers],
+            })
+            lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+
+        self.assertEqual({line.split(',')[0]: line.split(',')[-1] for line in lines[1:]}, {'0': '0', '1': '2', '2': '4'})
+        export_queries = [query['sql'] for query in queries if '_clicks_count' in query['sql']]
+        self.assertEqual(len(export_queries), 1)
+        self.assertEqual(export_queries[0].count('"click_logs"'), 1)
+        self.assertNotIn('JOIN "click_logs"', export_queries[0])
+
+
+class OfferScoresTests(TestCase):
+    """Оценка популярности — сглаженный CTR, а не число кликов"""
+
+    def record(self, offer, clicks, impressions):
+        now = timezone.now()
+        ClickRollupDaily.objects.create(bucket=timezone.localdate(), offer=offer, clicks=clicks)
+        OfferImpressionHourly.objects.create(bucket=hour_bucket(now), offer=offer, position=1, impressions=impressions)
+
+    def test_high_ctr_offer_ranks_above_high_click_offer(self):
+        rare = create_offer('Редкий')
+        popular = create_offer('Частый')
+        self.record(rare, clicks=30, impressions=100)
+        self.record(popular, clicks=300, impressions=10000)
+
+        scores = compute_offer_scores()
+
+        self.assertGreater(scores[rare.pk], scores[popular.pk])
+
+
+class StatisticsQueryCountTests(ArchiveTestCase):
+    """Число запросов статистики не зависит от числа офферов, брендов и кликов"""
+
+    def setUp(self):
+        super().setUp()
+        offers = [create_offer(f'Оффер {index}') for index in range(8)]
+        now = timezone.now()
+        write_clicks([
+            {
+                'offer_id': offers[index % len(offers)].pk,
+                'vk_user_id': str(index % 13),
+                'brand': ('kubyshka', 'kokos')[index % 2],
+                'ts': (now - timedelta(days=index % 5)).timestamp(),
+            }
+            for index in range(60)
+        ])
+        # Каталог живёт в памяти воркера: загружаем заранее
+        get_catalog()
+
+    def test_dashboard_summary(self):
+        # Агрегаты по офферам, скетчи, подписчики
+        with self.assertNumQueries(3):
+            summary = get_dashboard_summary(days=30)
+        self.assertEqual(summary['total_clicks'], 60)
+
+    def test_dashboard_summary_exact(self):
+        # Итоги по сырым кликам, ТОП-5, подписчики
+        with self.assertNumQueries(3):
+            summary = get_dashboard_summary(days=30, exact=True)
+        self.assertEqual(summary['total_clicks'], 60)
+        self.assertEqual(summary['unique_users'], 13)
+
+    def test_offer_statistics(self):
+        # Клики, показы, уникальные пользователи
+        for exact in (False, True):
+            with self.subTest(exact=exact), self.assertNumQueries(3):
+                stats = get_offer_statistics(days=30, exact=exact)
+            self.assertEqual(len(stats), 8)
+
+    def test_offer_statistics_page(self):
+        full = get_offer_statistics(days=30)
+        with self.assertNumQueries(3):
+            page = get_offer_statistics(days=30, limit=3, offset=2)
+        self.assertEqual(page, full[2:5])
+
+    def test_brand_statistics(self):
+        # Клики, уникальные пользователи
+        for exact in (False, True):
+            with self.subTest(exact=exact), self.assertNumQueries(2):
+                stats = get_brand_statistics(days=30, exact=exact)
+            self.assertEqual({row['brand']: row['total_clicks'] for row in stats}, {'kubyshka': 30, 'kokos': 30})
+
+
+class LogExportTests(TestCase):
+    """Выгрузка журналов через /api/statistics/export/"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.offer = create_offer()
+        ClickLog.objects.create(offer=self.offer, vk_user_id='1')
+
+    def test_non_numeric_offer_filter_is_rejected(self):
+        for value in ('abc', '99999999999999999999'):
+            with self.subTest(value=value):
+                response = self.client.get('/api/statistics/export/clicks/', {'offer': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('offer', response.json()['error'])
+
+    def test_offer_filter(self):
+        response = self.client.get('/api/statistics/export/clicks/', {'format': 'jsonl', 'offer': self.offer.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 1)
+
+
+@mock.patch('app.vk_ads_logger.vk_ads_event_buffer.put', return_value=True)
+class VKAdsEventsBatchTests(TestCase):
+    """Проверка пачки событий POST /api/vk-ads/log-events/"""
+
+    def post(self, data):
+        return self.client.post('/api/vk-ads/log-events/', data, content_type='application/json')
+
+    def test_events_are_validated_one_by_one(self, put):
+        response = self.post({'events': [
+            {'event_name': 'lead', 'vk_user_id': 1060115968, 'event_params': {'offer_id': 1}},
+            {'vk_user_id': '1'},
+            {'event_name': 'lead', 'success': 'yes'},
+            'lead',
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual((data['accepted'], data['rejected']), (1, 3))
+        self.assertEqual(data['results'], [
+            {'accepted': True},
+            {'accepted': False, 'error': 'event_name is required'},
+            {'accepted': False, 'error': 'success must be a boolean'},
+            {'accepted': False, 'error': 'event must be an object'},
+        ])
+        [(record,), _] = put.call_args
+        self.assertEqual(record['vk_user_id'], '1060115968')
+
+    def test_single_event_is_accepted(self, put):
+        response = self.post({'event_name': 'subscribe'})
+        self.assertEqual(response.json()['data']['accepted'], 1)
+
+    @override_settings(VK_ADS_EVENTS_BATCH_MAX=2)
+    def test_invalid_batches_are_rejected(self, put):
+        for data in ({'events': []}, {'events': {'event_name': 'lead'}}, [{'event_name': 'lead'}] * 3):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+        put.assert_not_called()
@@ -8,6 +8,7 @@ urlpatterns = [
     path('config/', views.config_view, name='config'),
     path('offers/', views.offers_view, name='offers'),
     path('go/<str:offer_id>/', views.offer_redirect_view, name='offer_redirect'),
+    path('bootstrap/', views.bootstrap_view, name='bootstrap'),
     
     # Subscription API
     path('subscribe/', views.subscribe_view, name='subscribe'),
@@ -17,6 +18,7 @@ urlpatterns = [
     
     # VK Ads Events Logging
     path('vk-ads/log-event/', views.log_vk_ads_event_view, name='log_vk_ads_event'),
+    path('vk-ads/log-events/', views.log_vk_ads_events_batch_view, name='log_vk_ads_events'),
     
     # Statistics HTML (для админов)
     path('statistics/', statistics_views.statistics_dashboard_html, name='statistics_html'),
@@ -30,6 +32,7 @@ urlpatterns = [
     path('statistics/top-offers/', statistics_views.statistics_top_offers_view, name='statistics_top_offers'),
     path('statistics/conversion/', statistics_views.statistics_conversion_view, name='statistics_conversion'),
     path('statistics/subscribers/', statistics_views.statistics_subscribers_view, name='statistics_subscribers'),
+    path('statistics/export/<str:source>/', statistics_views.statistics_export_view, name='statistics_export'),
     
     # VK Callback API
     path('vk-callback/', callbacks.vk_callback_view, name='vk_callback'),
@@ -1,5 +1,7 @@
+import os
+import time
+
 from django.conf import settings
-from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.utils import timezone
 from rest_framework.decorators import api_view
@@ -7,21 +9,18 @@ from rest_framework.response import Response
 from rest_framework import status
 from django_ratelimit.decorators import ratelimit
 
-from .brands import get_brand_config
-from .offers import get_offers, get_offer_by_id
-from .models import ClickLog, Subscriber, Offer, AppConfig, VKAdsEvent
-from .vk_api import check_messages_allowed, VKAPIError
-from .vk_ads_logger import log_vk_ads_event
-from .statistics import (
-    get_offer_statistics,
-    get_brand_statistics,
-    get_daily_statistics,
-    get_top_offers,
-    get_conversion_rate,
-    get_subscriber_statistics,
-    get_offer_performance,
-    get_dashboard_summary
-)
+from .brands import GROUP_TO_BRAND, get_brand_config
+from .buffering import valid_ip
+from .clicks import click_buffer, enqueue_click
+from .config_cache import get_config_payload
+from .impressions import record_impressions
+from .logqueue import logging_metrics
+from .payloads import payload_response
+from .redirects import resolve_redirect
+from .offers import InvalidCursor, clamp_page_size, get_offers, get_offers_payload
+from .models import Subscriber
+from .vk_ads_logger import log_vk_ads_event, log_vk_ads_events, vk_ads_event_buffer
+from .vk_security import get_launch_params_from_request, verify_vk_launch_params
 
 
 @ratelimit(key='ip', rate='60/m', method='GET')  # 60 запросов в минуту с IP
@@ -32,11 +31,13 @@ def config_view(request):
     
     Возвращает единую конфигурацию внешнего вида приложения.
     Параметры group_id и brand игнорируются - используется единая конфигурация из БД.
+    
+    Ответ сериализуется (и сжимается) один раз на версию конфигурации и отдаётся
+    с ETag: на запрос с совпавшим If-None-Match возвращается 304 без тела.
     """
-    # Получаем единую конфигурацию из БД
+    # Получаем готовый ответ с единой конфигурацией
     try:
-        app_config = AppConfig.get_or_create_config()
-        config_data = app_config.to_dict()
+        payload = get_config_payload()
     except Exception as e:
         # Fallback на старую систему если что-то пошло не так
         print(f"Failed to load AppConfig: {e}")
@@ -48,11 +49,12 @@ def config_view(request):
             brand=brand,
             default_brand=default_brand
         )
+        return Response({
+            'success': True,
+            'data': config_data
+        })
     
-    return Response({
-        'success': True,
-        'data': config_data
-    })
+    return payload_response(request, payload)
 
 
 @ratelimit(key='ip', rate='100/m', method='GET')  # 100 запросов в минуту с IP
@@ -60,27 +62,76 @@ def config_view(request):
 def offers_view(request):
     """
     GET /api/offers?group_id=123&sum_need=10000&term_days=30&sort=rate&page=1
+    GET /api/offers?sum_need=10000&sort=rate&cursor=&with_count=true
     
     Возвращает список офферов с фильтрацией и сортировкой.
+    С параметром cursor (пустой — первая страница) вместо page/count/total_pages
+    возвращается next_cursor для следующей страницы; count — только с with_count=true.
+    
+    Готовый ответ хранится на версию каталога и отдаётся с ETag и сжатием
+    по Accept-Encoding (см. payloads.py). Показы офферов страницы (в том числе
+    при ответе 304) учитываются в счётчиках воркера (см. impressions.py).
     """
     sum_need = request.GET.get('sum_need')
     term_days = request.GET.get('term_days')
     sort_by = request.GET.get('sort', 'rate')
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 20))
+    cursor = request.GET.get('cursor')
+    try:
+        page = max(_int_param(request, 'page', 1), 1)
+        page_size = clamp_page_size(_int_param(request, 'page_size', 20))
+    except ValueError as e:
+        return Response(
+            {'success': False, 'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    offers_data = get_offers(
-        sum_need=sum_need,
-        term_days=term_days,
-        sort_by=sort_by,
-        page=page,
-        page_size=page_size
-    )
+    if cursor is not None:
+        try:
+            payload = get_offers_payload(
+                sum_need=sum_need,
+                term_days=term_days,
+                sort_by=sort_by,
+                cursor=cursor,
+                page_size=page_size,
+                with_count=request.GET.get('with_count', '').lower() in ('1', 'true', 'yes')
+            )
+        except InvalidCursor as e:
+            return Response(
+                {'success': False, 'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    else:
+        payload = get_offers_payload(
+            sum_need=sum_need,
+            term_days=term_days,
+            sort_by=sort_by,
+            page=page,
+            page_size=page_size
+        )
     
-    return Response({
-        'success': True,
-        'data': offers_data
-    })
+    _record_impressions(request, payload.offer_ids, payload.first_position)
+    return payload_response(request, payload)
+
+
+def _int_param(request, name, default):
+    """Целый параметр запроса (ValueError, если передано не число)"""
+    value = request.GET.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+
+def _record_impressions(request, offer_ids, first_position=1):
+    """Учесть показ офферов; бренд — из параметра brand или по group_id"""
+    brand = request.GET.get('brand') or GROUP_TO_BRAND.get(request.GET.get('group_id'), '')
+    try:
+        record_impressions(offer_ids, brand=brand[:50], first_position=first_position)
+    except Exception as e:
+        # Не падаем, если учёт показов не удался
+        print(f"Failed to record impressions: {e}")
 
 
 @api_view(['GET'])
@@ -89,34 +140,28 @@ def offer_redirect_view(request, offer_id):
     GET /go/:offer_id?vk_user_id=123&group_id=456
     
     Логирует клик и делает редирект на партнёрскую ссылку.
+    
+    Ссылка берётся из карты активных офферов в памяти воркера (см. redirects.py),
+    а клик ставится в буфер и записывается в БД фоновым потоком (см. clicks.py).
     """
     vk_user_id = request.GET.get('vk_user_id')
     group_id = request.GET.get('group_id')
     brand = request.GET.get('brand')
     
-    # Получаем оффер из БД
-    try:
-        offer_obj = Offer.objects.get(id=offer_id, is_active=True)
-    except Offer.DoesNotExist:
+    # Получаем ссылку для перехода
+    resolved = resolve_redirect(offer_id)
+    if resolved is None:
         return Response(
             {'success': False, 'error': 'Offer not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    offer_pk, redirect_url = resolved
     
     # Логируем клик
     try:
-        # Находим подписчика если есть
-        subscriber = None
-        if vk_user_id:
-            try:
-                subscriber = Subscriber.objects.get(vk_user_id=vk_user_id)
-            except Subscriber.DoesNotExist:
-                pass
-        
-        ClickLog.objects.create(
-            offer=offer_obj,
+        enqueue_click(
+            offer_id=offer_pk,
             vk_user_id=vk_user_id,
-            subscriber=subscriber,
             group_id=group_id,
             brand=brand,
             ip_address=get_client_ip(request),
@@ -127,27 +172,33 @@ def offer_redirect_view(request, offer_id):
         print(f"Failed to log click: {e}")
     
     # Редирект на партнёрскую ссылку (используем URL как есть, без модификаций)
-    redirect_url = offer_obj.redirect_url
-    
     return redirect(redirect_url)
 
 
 def get_client_ip(request):
-    """Получить IP адрес клиента"""
+    """Получить IP адрес клиента (None, если заголовок содержит не адрес)"""
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
         ip = x_forwarded_for.split(',')[0]
     else:
         ip = request.META.get('REMOTE_ADDR')
-    return ip
+    return valid_ip(ip)
 
 
 @api_view(['GET'])
 def health_check(request):
-    """Проверка работоспособности API"""
+    """Проверка работоспособности API и метрики отложенной записи в текущем воркере"""
     return Response({
         'status': 'ok',
-        'service': 'vk-miniapp-backend'
+        'service': 'vk-miniapp-backend',
+        'worker': {
+            'pid': os.getpid(),
+            'buffers': {
+                'vk_ads_events': vk_ads_event_buffer.metrics(),
+                'clicks': click_buffer.metrics(),
+            },
+            'logging': logging_metrics(),
+        }
     })
 
 
@@ -339,32 +390,115 @@ def subscription_status_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    return Response({
+        'success': True,
+        'data': get_subscription_status(vk_user_id)
+    })
+
+
+def get_subscription_status(vk_user_id):
+    """Статус подписки пользователя (для неизвестного пользователя — не подписан)"""
     try:
         subscriber = Subscriber.objects.get(vk_user_id=vk_user_id)
-        return Response({
-            'success': True,
-            'data': {
-                'vk_user_id': subscriber.vk_user_id,
-                'subscribed': subscriber.subscribed,
-                'allowed_from_group': subscriber.allowed_from_group,
-                'can_receive_messages': subscriber.can_receive_messages,
-                'created_at': subscriber.created_at,
-                'subscribed_at': subscriber.subscribed_at,
-                'brand': subscriber.brand,
-            }
-        })
     except Subscriber.DoesNotExist:
-        return Response({
-            'success': True,
-            'data': {
-                'vk_user_id': vk_user_id,
-                'subscribed': False,
-                'allowed_from_group': False,
-                'can_receive_messages': False,
-            }
-        })
+        return {
+            'vk_user_id': vk_user_id,
+            'subscribed': False,
+            'allowed_from_group': False,
+            'can_receive_messages': False,
+        }
+    return {
+        'vk_user_id': subscriber.vk_user_id,
+        'subscribed': subscriber.subscribed,
+        'allowed_from_group': subscriber.allowed_from_group,
+        'can_receive_messages': subscriber.can_receive_messages,
+        'created_at': subscriber.created_at,
+        'subscribed_at': subscriber.subscribed_at,
+        'brand': subscriber.brand,
+    }
 
 
+# ============================================================================
+# BOOTSTRAP API
+# ============================================================================
+
+@ratelimit(key='ip', rate='60/m', method='GET')
+@api_view(['GET'])
+def bootstrap_view(request):
+    """
+    GET /api/bootstrap/?vk_user_id=...&sign=...&sort=rate&page_size=20
+    
+    Всё, что нужно для первого экрана, одним запросом: конфигурация
+    (как /api/config/), первая страница офферов (как /api/offers/) и статус
+    подписки (как /api/subscription/status/).
+    
+    Параметры запуска VK необязательны и проверяются здесь, а не в middleware:
+    без них subscription = null, с неверной подписью — 403.
+    Конфигурация и офферы берутся из снимков в памяти воркера, в timings_ms —
+    время сборки каждой части.
+    """
+    try:
+        page_size = clamp_page_size(_int_param(request, 'page_size', 20))
+    except ValueError as e:
+        return Response(
+            {'success': False, 'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    timings = {}
+    
+    started = time.perf_counter()
+    launch_params = get_launch_params_from_request(request)
+    vk_user_id = None
+    if launch_params:
+        if not verify_vk_launch_params(launch_params):
+            return Response(
+                {'success': False, 'error': 'Invalid VK signature. Request rejected.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        vk_user_id = launch_params.get('vk_user_id')
+    timings['launch_params'] = _elapsed_ms(started)
+    
+    started = time.perf_counter()
+    try:
+        config_data = get_config_payload().data['data']
+    except Exception as e:
+        # Fallback как в config_view
+        print(f"Failed to load AppConfig: {e}")
+        config_data = get_brand_config(
+            group_id=request.GET.get('group_id'),
+            brand=request.GET.get('brand'),
+            default_brand=settings.DEFAULT_BRAND
+        )
+    timings['config'] = _elapsed_ms(started)
+    
+    started = time.perf_counter()
+    default_sort = config_data.get('features', {}).get('default_sort', 'rate')
+    offers_data = get_offers(
+        sort_by=request.GET.get('sort') or default_sort,
+        page=1,
+        page_size=page_size
+    )
+    _record_impressions(request, [offer['id'] for offer in offers_data['results']])
+    timings['offers'] = _elapsed_ms(started)
+    
+    started = time.perf_counter()
+    subscription = get_subscription_status(vk_user_id) if vk_user_id else None
+    timings['subscription'] = _elapsed_ms(started)
+    
+    return Response({
+        'success': True,
+        'data': {
+            'config': config_data,
+            'offers': offers_data,
+            'subscription': subscription,
+            'timings_ms': timings,
+        }
+    })
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
 
 # ============================================================================
 # VK ADS EVENTS LOGGING
@@ -388,35 +522,86 @@ def log_vk_ads_event_view(request):
     }
     """
     data = request.data
-    event_name = data.get('event_name')
-    vk_user_id = data.get('vk_user_id')
-    event_params = data.get('event_params')
-    success = data.get('success', True)
-    error_message = data.get('error_message')
-    platform = data.get('platform')
-    
-    if not event_name:
+    
+    # Событие проверяется сразу, а в БД пишется фоновым потоком (см. vk_ads_logger.py)
+    try:
+        logged = log_vk_ads_event(
+            event_name=data.get('event_name'),
+            vk_user_id=data.get('vk_user_id'),
+            event_params=data.get('event_params'),
+            success=data.get('success', True),
+            error_message=data.get('error_message'),
+            ip_address=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            platform=data.get('platform')
+        )
+    except ValueError as e:
+        return Response(
+            {'success': False, 'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # event_id оставлен для совместимости: id появляется только после записи пачки
+    return Response({
+        'success': True,
+        'data': {
+            'event_id': None,
+            'logged': logged
+        }
+    })
+
+
+@ratelimit(key='ip', rate='30/m', method='POST')  # 30 пачек в минуту с IP
+@api_view(['POST'])
+def log_vk_ads_events_batch_view(request):
+    """
+    POST /api/vk-ads/log-events/
+    
+    Пакетное логирование событий VK Ads с фронтенда: до VK_ADS_EVENTS_BATCH_MAX
+    событий за запрос, ставятся в очередь и записываются в БД фоновым потоком.
+    
+    Body: {
+        events: [
+            { event_name: 'lead', vk_user_id: '1060115968', event_params: {...}, success: true, platform: 'iOS' },
+            ...
+        ]
+    }
+    Одиночное событие в формате /api/vk-ads/log-event/ тоже принимается.
+    
+    Ответ: results — по одному на событие в том же порядке:
+    { accepted: true } или { accepted: false, error: '...' }
+    """
+    data = request.data
+    if isinstance(data, dict) and 'events' not in data:
+        events = [data]
+    elif isinstance(data, dict):
+        events = data['events']
+    else:
+        events = data
+    
+    if not isinstance(events, list) or not events:
         return Response(
-            {'success': False, 'error': 'event_name is required'},
+            {'success': False, 'error': 'events must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(events) > settings.VK_ADS_EVENTS_BATCH_MAX:
+        return Response(
+            {'success': False, 'error': f'at most {settings.VK_ADS_EVENTS_BATCH_MAX} events per request'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Логируем событие
-    event = log_vk_ads_event(
-        event_name=event_name,
-        vk_user_id=vk_user_id,
-        event_params=event_params,
-        success=success,
-        error_message=error_message,
+    results = log_vk_ads_events(
+        events,
         ip_address=get_client_ip(request),
         user_agent=request.META.get('HTTP_USER_AGENT', ''),
-        platform=platform
     )
+    accepted = sum(1 for result in results if result['accepted'])
     
     return Response({
         'success': True,
         'data': {
-            'event_id': event.id if event else None,
-            'logged': event is not None
+            'accepted': accepted,
+            'rejected': len(results) - accepted,
+            'results': results
         }
     })
@@ -1,12 +1,115 @@
 """
 Утилиты для логирования событий VK Ads
+
+События пишутся в БД отложенно: запрос проверяет событие и кладёт компактную
+запись в буфер воркера (BatchBuffer, см. buffering.py), а фоновый поток
+сохраняет пачки одним bulk_create и пишет строки в лог. Время события
+фиксируется при постановке в очередь.
 """
 import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from .buffering import BatchBuffer, valid_ip
 from .models import VKAdsEvent
 
 logger = logging.getLogger(__name__)
 
 
+def _log_event(record):
+    """Записать событие в файл логов"""
+    log_msg = f"VK_ADS_EVENT | {record['event_name']} | User: {record.get('vk_user_id')}"
+    if record.get('event_params'):
+        log_msg += f" | Params: {record['event_params']}"
+    if not record.get('success', True) and record.get('error_message'):
+        log_msg += f" | ERROR: {record['error_message']}"
+    
+    if record.get('success', True):
+        logger.info(log_msg)
+    else:
+        logger.error(log_msg)
+
+
+def write_vk_ads_events(records):
+    """Записать пачку событий в БД"""
+    VKAdsEvent.objects.bulk_create([
+        VKAdsEvent(
+            event_name=record['event_name'],
+            vk_user_id=record.get('vk_user_id'),
+            event_params=record.get('event_params'),
+            success=record.get('success', True),
+            error_message=record.get('error_message'),
+            ip_address=record.get('ip_address'),
+            user_agent=record.get('user_agent'),
+            platform=record.get('platform'),
+            created_at=datetime.fromtimestamp(record['ts'], tz=dt_timezone.utc),
+        )
+        for record in records
+    ])
+    for record in records:
+        _log_event(record)
+
+
+vk_ads_event_buffer = BatchBuffer(
+    'vk_ads_events',
+    write_vk_ads_events,
+    maxsize=settings.VK_ADS_EVENT_BUFFER_SIZE,
+    batch_size=settings.VK_ADS_EVENT_FLUSH_BATCH_SIZE,
+    flush_interval=settings.VK_ADS_EVENT_FLUSH_INTERVAL,
+    spool_dir=settings.SPOOL_DIR,
+)
+
+
+def _optional_string(data, name, max_length):
+    value = data.get(name)
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        raise ValueError(f'{name} must be a string')
+    if len(value) > max_length:
+        raise ValueError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def build_vk_ads_record(data, ip_address=None, user_agent=None):
+    """
+    Проверить событие из запроса и собрать запись для буфера
+    
+    Raises:
+        ValueError: Событие не прошло проверку (текст — для ответа клиенту)
+    """
+    if not isinstance(data, dict):
+        raise ValueError('event must be an object')
+    event_name = _optional_string(data, 'event_name', VKAdsEvent._meta.get_field('event_name').max_length)
+    if not event_name:
+        raise ValueError('event_name is required')
+    event_params = data.get('event_params')
+    if event_params is not None and not isinstance(event_params, dict):
+        raise ValueError('event_params must be an object')
+    success = data.get('success', True)
+    if not isinstance(success, bool):
+        raise ValueError('success must be a boolean')
+    error_message = data.get('error_message')
+    if error_message is not None and not isinstance(error_message, str):
+        error_message = str(error_message)
+    
+    return {
+        'event_name': event_name,
+        'vk_user_id': _optional_string(data, 'vk_user_id', VKAdsEvent._meta.get_field('vk_user_id').max_length),
+        'event_params': event_params,
+        'success': success,
+        'error_message': error_message,
+        'ts': time.time(),
+        'ip_address': valid_ip(ip_address),
+        'user_agent': user_agent,
+        'platform': _optional_string(data, 'platform', VKAdsEvent._meta.get_field('platform').max_length),
+    }
+
+
 def log_vk_ads_event(
     event_name: str,
     vk_user_id: str = None,
@@ -18,7 +121,7 @@ def log_vk_ads_event(
     platform: str = None
 ):
     """
-    Логирует событие VK Ads в базу данных и файл логов
+    Ставит событие VK Ads в очередь на запись в базу данных и файл логов
     
     Args:
         event_name: Тип события (lead, subscribe, product_card и т.д.)
@@ -29,34 +132,50 @@ def log_vk_ads_event(
         ip_address: IP адрес клиента
         user_agent: User Agent
         platform: Платформа (iOS, Android, Web)
+    
+    Returns:
+        True, если событие принято буфером
+    
+    Raises:
+        ValueError: Событие не прошло проверку
     """
-    try:
-        # Сохраняем в БД
-        event = VKAdsEvent.objects.create(
-            event_name=event_name,
-            vk_user_id=vk_user_id,
-            event_params=event_params,
-            success=success,
-            error_message=error_message,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            platform=platform
-        )
-        
-        # Логируем в файл
-        log_msg = f"VK_ADS_EVENT | {event_name} | User: {vk_user_id}"
-        if event_params:
-            log_msg += f" | Params: {event_params}"
-        if not success and error_message:
-            log_msg += f" | ERROR: {error_message}"
-        
-        if success:
-            logger.info(log_msg)
+    record = build_vk_ads_record({
+        'event_name': event_name,
+        'vk_user_id': vk_user_id,
+        'event_params': event_params,
+        'success': success,
+        'error_message': error_message,
+        'platform': platform,
+    }, ip_address, user_agent)
+    return vk_ads_event_buffer.put(record)
+
+
+def log_vk_ads_events(events_data, ip_address=None, user_agent=None):
+    """
+    Ставит пачку событий VK Ads в очередь на запись
+    
+    Каждое событие проверяется отдельно: невалидные отклоняются,
+    остальные передаются в буфер. Размер пачки ограничивает вызывающий код
+    (VK_ADS_EVENTS_BATCH_MAX).
+    
+    Args:
+        events_data: Список событий в формате POST /api/vk-ads/log-event/
+        ip_address: IP адрес клиента
+        user_agent: User Agent
+    
+    Returns:
+        Результаты в порядке событий: {'accepted': True}
+        или {'accepted': False, 'error': ...}
+    """
+    results = []
+    for data in events_data:
+        try:
+            record = build_vk_ads_record(data, ip_address, user_agent)
+        except ValueError as e:
+            results.append({'accepted': False, 'error': str(e)})
+            continue
+        if vk_ads_event_buffer.put(record):
+            results.append({'accepted': True})
         else:
-            logger.error(log_msg)
-            
-        return event
-        
-    except Exception as e:
-        logger.error(f"Failed to log VK Ads event: {e}")
-        return None
+            results.append({'accepted': False, 'error': 'queue is full'})
+    return results
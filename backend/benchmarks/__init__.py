@@ -0,0 +1,3 @@
+"""
+Бенчмарки бэкенда. Запуск из каталога backend: python -m benchmarks.<имя>
+"""
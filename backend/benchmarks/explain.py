@@ -0,0 +1,223 @@
+"""
+Проверка планов запросов статистики к click_logs (EXPLAIN) на PostgreSQL.
+
+Запуск (из каталога backend; данные сгенерированы benchmarks.seed):
+    python -m benchmarks.explain
+    python -m benchmarks.explain --analyze --natural
+    python -m benchmarks.explain --only get_dashboard_summary --verbose
+
+Каждая функция statistics.py выполняется с перехватом SQL-запросов, и для
+каждого запроса к click_logs выполняется EXPLAIN (FORMAT JSON). По умолчанию
+последовательное сканирование запрещено планировщику (enable_seqscan = off):
+Seq Scan в плане остаётся только тогда, когда подходящего индекса нет,
+независимо от объёма данных. С --natural выбор остаётся за планировщиком —
+так план совпадает с рабочим, но на небольших данных Seq Scan бывает дешевле.
+
+Завершается с кодом 1, если в каком-либо плане click_logs или её секция,
+в которой не меньше --min-rows строк (по pg_class.reltuples), читается
+целиком, хотя нужна только часть строк: Seq Scan или индекс, условие
+которого не ограничивает его первый столбец (например, первичный ключ
+(id, created_at) при фильтре по created_at). Пустые секции будущих месяцев
+планировщик всегда читает последовательно.
+"""
+import argparse
+import os
+import re
+import sys
+from collections import Counter
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from app import statistics  # noqa: E402
+from app.models import ClickLog  # noqa: E402
+
+# Большая таблица и её помесячные секции (см. app/partitions.py)
+BIG_TABLE = re.compile(r'^click_logs(_p\d{4}_\d{2}|_default)?$')
+
+SCAN_NODES = {'Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+FULL_INDEX_SCAN = 'Full Index Scan'
+# Узлы, которые читают секцию целиком
+FULL_SCANS = {'Seq Scan', FULL_INDEX_SCAN}
+# Доля строк секции, при которой чтение всего индекса уже не считается ошибкой
+SELECTIVE_SHARE = 0.5
+
+
+def _checks(offer_id, days):
+    """Имя проверки -> функция без аргументов"""
+    return {
+        'get_offer_statistics': lambda: statistics.get_offer_statistics(days),
+        'get_offer_statistics.exact': lambda: statistics.get_offer_statistics(days, exact=True),
+        'get_brand_statistics': lambda: statistics.get_brand_statistics(days),
+        'get_brand_statistics.exact': lambda: statistics.get_brand_statistics(days, exact=True),
+        'get_daily_statistics': lambda: statistics.get_daily_statistics(days),
+        'get_daily_statistics.exact': lambda: statistics.get_daily_statistics(days, exact=True),
+        'get_hourly_statistics': lambda: statistics.get_hourly_statistics(min(days, 7)),
+        'get_top_offers': lambda: statistics.get_top_offers(10, days),
+        'get_top_offers.exact': lambda: statistics.get_top_offers(10, days, exact=True),
+        'get_conversion_rate': lambda: statistics.get_conversion_rate(days),
+        'get_conversion_rate.exact': lambda: statistics.get_conversion_rate(days, exact=True),
+        'get_offer_performance': lambda: statistics.get_offer_performance(offer_id, days),
+        'get_offer_performance.exact': lambda: statistics.get_offer_performance(offer_id, days, exact=True),
+        'get_dashboard_summary': lambda: statistics.get_dashboard_summary(days),
+        'get_dashboard_summary.exact': lambda: statistics.get_dashboard_summary(days, exact=True),
+    }
+
+
+def _busiest_offer():
+    row = ClickLog.objects.filter(
+        offer__isnull=False
+    ).values('offer_id').annotate(clicks=Count('id')).order_by('-clicks').first()
+    return row['offer_id'] if row else 0
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _nodes(child)
+
+
+def _table_rows():
+    """Оценка числа строк click_logs и её секций"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relname LIKE 'click\\_logs%' AND relkind = 'r'")
+        return dict(cursor.fetchall())
+
+
+def _leading_columns():
+    """Первый столбец каждого индекса click_logs и её секций"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT ic.relname, a.attname FROM pg_index i "
+            "JOIN pg_class ic ON ic.oid = i.indexrelid "
+            "JOIN pg_class t ON t.oid = i.indrelid "
+            "JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0] "
+            "WHERE t.relname LIKE 'click\\_logs%'"
+        )
+        return dict(cursor.fetchall())
+
+
+def _full_index_scan(node, leading):
+    """Индекс читается целиком ради условия не на его первый столбец"""
+    column = leading.get(node.get('Index Name'))
+    condition = node.get('Index Cond')
+    return column is not None and condition is not None and not re.search(rf'\b{column}\b', condition)
+
+
+def explain(sql, leading, rows, natural=False):
+    """
+    Сканирования click_logs в плане запроса.
+
+    Полное чтение индекса (например, первичного ключа (id, created_at) при
+    условии только на created_at) помечается как 'Full Index Scan' и считается
+    таким же последовательным чтением, как Seq Scan, — если по оценке
+    планировщика нужна меньшая часть секции (SELECTIVE_SHARE). Когда в период
+    попадает вся секция, прочитать её индекс целиком — правильный план.
+
+    Returns:
+        Список (тип узла, таблица, индекс или None)
+    """
+    with connection.cursor() as cursor:
+        if not natural:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+    scans = []
+    for node in _nodes(plan[0]['Plan']):
+        if node['Node Type'] not in SCAN_NODES or not BIG_TABLE.match(node.get('Relation Name', '')):
+            continue
+        # Индекс bitmap-сканирования — в дочерних узлах Bitmap Index Scan
+        index_nodes = list(_nodes(node))[1:] if node['Node Type'] == 'Bitmap Heap Scan' else [node]
+        node_type = node['Node Type']
+        selective = node['Plan Rows'] < rows.get(node['Relation Name'], 0) * SELECTIVE_SHARE
+        if selective and any(_full_index_scan(index_node, leading) for index_node in index_nodes):
+            node_type = FULL_INDEX_SCAN
+        scans.append((node_type, node['Relation Name'], node.get('Index Name')))
+    return scans
+
+
+def run(checks, natural=False, min_rows=0, verbose=False):
+    """
+    Выполнить проверки.
+
+    Returns:
+        Список строк с найденными полными сканированиями
+    """
+    rows = _table_rows()
+    leading = _leading_columns()
+    failures = []
+    for name, func in checks.items():
+        with CaptureQueriesContext(connection) as captured:
+            func()
+        queries = [query['sql'] for query in captured.captured_queries if 'click_logs' in query['sql']]
+
+        scans = Counter()
+        for sql in queries:
+            nodes = explain(sql, leading, rows, natural)
+            scans.update(node_type for node_type, _, _ in nodes)
+            full = sorted({
+                f'{node_type} on {table}' for node_type, table, _ in nodes
+                if node_type in FULL_SCANS and rows.get(table, 0) >= min_rows
+            })
+            if full:
+                failures.append(f"{name}: {', '.join(full)}\n    {sql}")
+            if verbose:
+                print(f'  {sql}')
+                for node_type, table, index in nodes:
+                    print(f"    {node_type} on {table}" + (f" using {index}" if index else ''))
+
+        summary = ', '.join(f'{node_type} x{count}' for node_type, count in sorted(scans.items())) or '-'
+        print(f"{name:>30}  {len(queries)} queries  {summary}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', help='Проверки или их префиксы (например, get_offer_performance)')
+    parser.add_argument('--days', type=int, default=30, help='Период статистики, дней')
+    parser.add_argument('--offer', type=int, help='Оффер для get_offer_performance (по умолчанию — с наибольшим числом кликов)')
+    parser.add_argument('--natural', action='store_true', help='Не запрещать планировщику Seq Scan')
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='Не считать ошибкой Seq Scan по секциям меньше стольких строк')
+    parser.add_argument('--analyze', action='store_true',
+                        help='Сначала выполнить VACUUM ANALYZE click_logs (статистика планировщика и карта видимости)')
+    parser.add_argument('--verbose', action='store_true', help='Показать запросы и узлы сканирования')
+    args = parser.parse_args()
+
+    if connection.vendor != 'postgresql':
+        parser.error(f'EXPLAIN checks require PostgreSQL, current database is {connection.vendor}')
+
+    checks = _checks(args.offer or _busiest_offer(), args.days)
+    if args.only:
+        checks = {
+            name: func for name, func in checks.items()
+            if any(name == prefix or name.startswith(prefix + '.') for prefix in args.only)
+        }
+    if not checks:
+        parser.error('no checks selected')
+
+    if args.analyze:
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM ANALYZE click_logs')
+
+    failures = run(checks, args.natural, args.min_rows, args.verbose)
+    if failures:
+        print('\nfull scans:')
+        for line in failures:
+            print(f'  {line}')
+        sys.exit(1)
+    print('\nno full scans of click_logs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Нагрузочный тест горячих эндпоинтов API с сохранением и сравнением базовой линии.
+
+Запуск (из каталога backend; сервер запущен с RATELIMIT_ENABLE=false и тем же
+VK_APP_SECRET, данные сгенерированы benchmarks.seed):
+    python -m benchmarks.load --base-url http://localhost:8000 --save baseline.json
+    python -m benchmarks.load --concurrency 32 --seconds 30 --compare baseline.json
+    python -m benchmarks.load --scenarios offers go --queries
+
+Каждый сценарий нагружается отдельно concurrency потоками с keep-alive
+соединениями. Для каждого считаются p50/p95/p99 задержки, пропускная
+способность и доля ошибок, а с --queries — число SQL-запросов на запрос
+(сценарий выполняется в процессе через тестовый клиент Django на той же БД).
+
+--compare завершается с кодом 1, если по сравнению с базовой линией p95
+вырос или пропускная способность упала больше чем на --tolerance,
+выросло число SQL-запросов или появились ошибки.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from benchmarks.seed import USER_PREFIX  # noqa: E402
+from benchmarks.signer import make_launch_params  # noqa: E402
+
+SORTS = ['rate', 'sum', 'term', 'popular']
+SUMS = [None, 3000, 10000, 30000]
+TERMS = [None, 7, 30, 90]
+
+
+class Scenario:
+    """
+    Генератор запросов одного эндпоинта.
+
+    request(rnd) возвращает (метод, путь с query string, тело или None).
+    """
+
+    def __init__(self, name, request):
+        self.name = name
+        self.request = request
+
+
+def build_scenarios(offer_ids, users, secret):
+    def config(rnd):
+        return 'GET', '/api/config/', None
+
+    def offers(rnd):
+        params = {'sort': rnd.choice(SORTS), 'page': rnd.choice([1, 1, 1, 2, 3])}
+        sum_need, term_days = rnd.choice(SUMS), rnd.choice(TERMS)
+        if sum_need:
+            params['sum_need'] = sum_need
+        if term_days:
+            params['term_days'] = term_days
+        return 'GET', '/api/offers/?' + urlencode(params), None
+
+    def go(rnd):
+        params = {'vk_user_id': f'{USER_PREFIX}{rnd.randrange(users)}', 'group_id': '123456789'}
+        return 'GET', f'/api/go/{rnd.choice(offer_ids)}/?' + urlencode(params), None
+
+    def subscribe(rnd):
+        launch_params = make_launch_params(f'{USER_PREFIX}{rnd.randrange(users)}', secret=secret)
+        return 'POST', '/api/subscribe/', {'launch_params': launch_params}
+
+    def dashboard(rnd):
+        return 'GET', '/api/statistics/dashboard/?days=30', None
+
+    return [
+        Scenario('config', config),
+        Scenario('offers', offers),
+        Scenario('go', go),
+        Scenario('subscribe', subscribe),
+        Scenario('dashboard', dashboard),
+    ]
+
+
+class HTTPDriver:
+    """Поток запросов одного сценария по keep-alive соединению"""
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.hostname, url.port, timeout=timeout)
+
+    def send(self, method, path, body):
+        headers = {'Accept-Encoding': 'gzip, br'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            # Сервер мог закрыть соединение — следующий запрос откроет новое
+            self.connection.close()
+            return None
+
+    def close(self):
+        self.connection.close()
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_scenario(scenario, base_url, concurrency, seconds, timeout, seed):
+    """Нагрузить сценарий на seconds секунд; вернуть метрики"""
+    deadline = time.perf_counter() + seconds
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        rnd = random.Random(seed * 1000 + index)
+        driver = HTTPDriver(base_url, timeout)
+        local_latencies, local_errors = [], 0
+        try:
+            while time.perf_counter() < deadline:
+                method, path, body = scenario.request(rnd)
+                started = time.perf_counter()
+                status = driver.send(method, path, body)
+                elapsed = time.perf_counter() - started
+                if status is None or status >= 400:
+                    local_errors += 1
+                else:
+                    local_latencies.append(elapsed)
+        finally:
+            driver.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    error_count = sum(errors)
+    total = len(latencies) + error_count
+    return {
+        'requests': total,
+        'errors': error_count,
+        'error_rate': round(error_count / total, 4) if total else 0,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': _ms(percentile(latencies, 0.50)),
+        'p95_ms': _ms(percentile(latencies, 0.95)),
+        'p99_ms': _ms(percentile(latencies, 0.99)),
+        'mean_ms': _ms(statistics.fmean(latencies) if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def count_queries(scenario, base_url, samples, seed):
+    """
+    Число SQL-запросов на запрос (медиана по samples запросам).
+
+    Первый запрос прогревает кэши воркера (каталог, конфигурация) и не учитывается.
+    Host берётся из base_url, чтобы запрос прошёл проверку ALLOWED_HOSTS.
+    """
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client(SERVER_NAME=urlsplit(base_url).hostname)
+    rnd = random.Random(seed)
+
+    def send(method, path, body):
+        if method == 'POST':
+            return client.post(path, data=json.dumps(body), content_type='application/json')
+        return client.get(path)
+
+    send(*scenario.request(rnd))
+    counts = []
+    for _ in range(samples):
+        with CaptureQueriesContext(connection) as queries:
+            send(*scenario.request(rnd))
+        counts.append(len(queries.captured_queries))
+    return int(statistics.median(counts))
+
+
+def fetch_offer_ids(base_url, timeout):
+    """ID активных офферов для сценария go (первые страницы выдачи)"""
+    driver = HTTPDriver(base_url, timeout)
+    offer_ids = []
+    try:
+        for page in range(1, 6):
+            driver.connection.request('GET', f'/api/offers/?page_size=100&page={page}')
+            response = driver.connection.getresponse()
+            results = json.loads(response.read())['data']['results']
+            offer_ids += [offer['id'] for offer in results]
+            if len(results) < 100:
+                break
+    finally:
+        driver.close()
+    return offer_ids
+
+
+def compare(baseline, results, tolerance):
+    """Регрессии относительно базовой линии: список строк"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('endpoints', {}).get(name)
+        if base is None:
+            continue
+        if base.get('p95_ms') and current['p95_ms'] and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+        if base.get('rps') and current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']} -> {current['rps']} req/s")
+        if base.get('queries') is not None and current.get('queries') is not None \
+                and current['queries'] > base['queries']:
+            regressions.append(f"{name}: queries {base['queries']} -> {current['queries']}")
+        if current['error_rate'] > base.get('error_rate', 0):
+            regressions.append(f"{name}: error rate {base.get('error_rate', 0)} -> {current['error_rate']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000', help='Адрес сервера')
+    parser.add_argument('--scenarios', nargs='+', help='Сценарии (по умолчанию все)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Число одновременных клиентов')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Длительность каждого сценария')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Таймаут запроса, секунд')
+    parser.add_argument('--users', type=int, default=1_000_000,
+                        help='Число пользователей bench-N (как --subscribers в benchmarks.seed)')
+    parser.add_argument('--secret', help='Секрет подписи (по умолчанию VK_APP_SECRET из настроек)')
+    parser.add_argument('--queries', action='store_true',
+                        help='Посчитать SQL-запросы на запрос (нужен доступ к БД сервера)')
+    parser.add_argument('--query-samples', type=int, default=5, help='Запросов для подсчёта SQL')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора случайных чисел')
+    parser.add_argument('--save', help='Сохранить результаты как базовую линию (JSON)')
+    parser.add_argument('--compare', help='Сравнить с базовой линией (JSON)')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Допустимое ухудшение p95 и пропускной способности (доля)')
+    args = parser.parse_args()
+
+    secret = args.secret if args.secret is not None else settings.VK_APP_SECRET
+    offer_ids = fetch_offer_ids(args.base_url, args.timeout)
+    if not offer_ids:
+        parser.error(f'{args.base_url} returned no offers; run python -m benchmarks.seed first')
+
+    scenarios = build_scenarios(offer_ids, args.users, secret)
+    if args.scenarios:
+        unknown = set(args.scenarios) - {scenario.name for scenario in scenarios}
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.scenarios]
+
+    print(f"{'scenario':>10} {'requests':>9} {'errors':>7} {'req/s':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    results = {}
+    for scenario in scenarios:
+        result = run_scenario(scenario, args.base_url, args.concurrency, args.seconds, args.timeout, args.seed)
+        result['queries'] = count_queries(scenario, args.base_url, args.query_samples, args.seed) if args.queries else None
+        results[scenario.name] = result
+        print(f"{scenario.name:>10} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9} "
+              f"{result['p50_ms'] or '-':>8} {result['p95_ms'] or '-':>8} {result['p99_ms'] or '-':>8} "
+              f"{result['queries'] if result['queries'] is not None else '-':>8}")
+
+    report = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'seconds': args.seconds,
+            'python': platform.python_version(),
+        },
+        'endpoints': results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump(report, baseline_file, indent=2, ensure_ascii=False)
+        print(f"\nbaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print('\nregressions:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f"\nno regressions against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
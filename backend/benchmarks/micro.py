@@ -0,0 +1,283 @@
+"""
+Микробенчмарки функций, которые выполняются на каждом запросе.
+
+Запуск (из каталога backend):
+    python -m benchmarks.micro
+    python -m benchmarks.micro --save micro_baseline.json
+    python -m benchmarks.micro --compare micro_baseline.json
+    python -m benchmarks.micro --only vk_signature serialize_offer --no-db
+
+Сеть не нужна, БД — только для бенчмарков с пометкой db (get_brand_config
+читает BrandConfig); --no-db их пропускает.
+
+Как в pytest-benchmark: число вызовов в раунде подбирается так, чтобы раунд
+длился не меньше --min-time, затем выполняется --rounds раундов, и для
+одного вызова считаются min / median / mean / stddev.
+
+Базовая линия хранит результаты вместе с порогом регрессии каждого бенчмарка.
+--compare завершается с кодом 1, если медиана выросла больше порога
+(--threshold задаёт один порог для всех).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+
+from app.brands import get_brand_config  # noqa: E402
+from app.models import AppConfig, BrandConfig, Offer  # noqa: E402
+from app.offers import serialize_offer  # noqa: E402
+from app.vk_security import get_launch_params_from_request, verify_vk_launch_params  # noqa: E402
+from benchmarks.signer import make_launch_params  # noqa: E402
+
+# Порог регрессии по умолчанию: рост медианы на 20%
+DEFAULT_THRESHOLD = 0.2
+
+BENCHMARKS = {}
+
+
+def benchmark(name, threshold=DEFAULT_THRESHOLD, db=False):
+    """
+    Зарегистрировать бенчмарк.
+
+    Декорируемая функция выполняет подготовку (она не замеряется)
+    и возвращает функцию без аргументов, которая и замеряется.
+    """
+    def register(setup):
+        BENCHMARKS[name] = {'setup': setup, 'threshold': threshold, 'db': db}
+        return setup
+    return register
+
+
+def _secret():
+    # Без секрета verify_vk_launch_params отвечает False, не считая подпись
+    if not settings.VK_APP_SECRET:
+        settings.VK_APP_SECRET = 'benchmark-secret'
+    return settings.VK_APP_SECRET
+
+
+def _launch_params():
+    return make_launch_params(
+        '123456789', secret=_secret(), vk_group_id='987654321',
+        vk_language='ru', vk_is_app_user='1', vk_are_notifications_enabled='0',
+    )
+
+
+@benchmark('vk_signature.verify')
+def bench_verify_signature():
+    params = _launch_params()
+    return lambda: verify_vk_launch_params(params)
+
+
+@benchmark('launch_params.json_body')
+def bench_launch_params_json_body():
+    body = json.dumps({'launch_params': _launch_params()})
+    factory = RequestFactory()
+
+    def run():
+        # Новый запрос на каждый вызов: WSGIRequest кэширует прочитанное тело
+        request = factory.post('/api/subscribe/', data=body, content_type='application/json')
+        return get_launch_params_from_request(request)
+    return run
+
+
+@benchmark('launch_params.drf_data')
+def bench_launch_params_drf_data():
+    body = json.dumps({'launch_params': _launch_params()})
+    factory = RequestFactory()
+
+    def run():
+        request = Request(
+            factory.post('/api/subscribe/', data=body, content_type='application/json'),
+            parsers=[JSONParser()],
+        )
+        return get_launch_params_from_request(request)
+    return run
+
+
+@benchmark('launch_params.query_string')
+def bench_launch_params_query_string():
+    params = _launch_params()
+    factory = RequestFactory()
+
+    def run():
+        return get_launch_params_from_request(factory.get('/api/subscription/status/', params))
+    return run
+
+
+def _offers(count):
+    """Несохранённые офферы с разными значениями полей"""
+    return [
+        Offer(
+            id=i + 1,
+            partner_name=f'Партнёр {i}',
+            logo_url=f'https://cdn.example.com/logos/{i}.png',
+            sum_min=1000 + i % 20 * 1000,
+            sum_max=30000 + i % 50 * 1000,
+            term_min=5 + i % 10,
+            term_max=30 + i % 365,
+            rate=round(i % 100 / 100, 2),
+            rate_text=f'{i % 100 / 100}% в день',
+            approval_time='15 минут',
+            approval_probability='высокая',
+            features=['Без отказа', 'Первый займ 0%', 'Онлайн'],
+            redirect_url=f'https://partner.example.com/go?offer={i}&sub_id={{sub_id}}',
+        )
+        for i in range(count)
+    ]
+
+
+@benchmark('serialize_offer.x100')
+def bench_serialize_offer_100():
+    offers = _offers(100)
+    return lambda: [serialize_offer(offer) for offer in offers]
+
+
+@benchmark('serialize_offer.x10000')
+def bench_serialize_offer_10000():
+    offers = _offers(10_000)
+    return lambda: [serialize_offer(offer) for offer in offers]
+
+
+@benchmark('app_config.to_dict')
+def bench_app_config_to_dict():
+    config = AppConfig()
+    return config.to_dict
+
+
+@benchmark('brand_config.to_dict')
+def bench_brand_config_to_dict():
+    config = BrandConfig(brand_key='kokos', name='Кокос', logo_url='https://cdn.example.com/kokos.png')
+    return config.to_dict
+
+
+@benchmark('brands.get_brand_config', threshold=0.5, db=True)
+def bench_get_brand_config():
+    # Запрос к BrandConfig на каждый вызов, поэтому разброс больше
+    return lambda: get_brand_config(group_id='123456789')
+
+
+def measure(func, rounds, min_time):
+    """Время одного вызова по раундам (секунды)"""
+    func()
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - started) / loops)
+    return timings, loops
+
+
+def run(names, rounds, min_time):
+    results = {}
+    print(f"{'benchmark':>28} {'min us':>10} {'median us':>10} {'mean us':>10} {'stddev':>8} {'ops/s':>10}")
+    for name in names:
+        spec = BENCHMARKS[name]
+        timings, loops = measure(spec['setup'](), rounds, min_time)
+        median = statistics.median(timings)
+        result = {
+            'min_us': round(min(timings) * 1e6, 3),
+            'median_us': round(median * 1e6, 3),
+            'mean_us': round(statistics.fmean(timings) * 1e6, 3),
+            'stddev_us': round(statistics.stdev(timings) * 1e6, 3) if len(timings) > 1 else 0.0,
+            'ops': round(1 / median, 1),
+            'rounds': rounds,
+            'loops': loops,
+            'threshold': spec['threshold'],
+        }
+        results[name] = result
+        print(f"{name:>28} {result['min_us']:>10} {result['median_us']:>10} {result['mean_us']:>10} "
+              f"{result['stddev_us']:>8} {result['ops']:>10}")
+    return results
+
+
+def compare(baseline, results, threshold=None):
+    """Регрессии относительно базовой линии: список строк"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            continue
+        limit = threshold if threshold is not None else base.get('threshold', DEFAULT_THRESHOLD)
+        change = current['median_us'] / base['median_us'] - 1
+        if change > limit:
+            regressions.append(
+                f"{name}: median {base['median_us']} -> {current['median_us']} us "
+                f"(+{change:.0%}, threshold {limit:.0%})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', help='Бенчмарки или их префиксы (например, launch_params)')
+    parser.add_argument('--no-db', action='store_true', help='Пропустить бенчмарки, которым нужна БД')
+    parser.add_argument('--rounds', type=int, default=7, help='Число раундов')
+    parser.add_argument('--min-time', type=float, default=0.1, help='Минимальная длительность раунда, секунд')
+    parser.add_argument('--save', help='Сохранить результаты как базовую линию (JSON)')
+    parser.add_argument('--compare', help='Сравнить с базовой линией (JSON)')
+    parser.add_argument('--threshold', type=float,
+                        help='Порог регрессии для всех бенчмарков (по умолчанию — из базовой линии)')
+    args = parser.parse_args()
+
+    names = [
+        name for name, spec in BENCHMARKS.items()
+        if not (args.no_db and spec['db'])
+        and (not args.only or any(name == prefix or name.startswith(prefix + '.') for prefix in args.only))
+    ]
+    if not names:
+        parser.error('no benchmarks selected')
+
+    results = run(names, args.rounds, args.min_time)
+
+    if args.save:
+        report = {
+            'meta': {
+                'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+            },
+            'benchmarks': results,
+        }
+        with open(args.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump(report, baseline_file, indent=2, ensure_ascii=False)
+        print(f"\nbaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print('\nregressions:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f"\nno regressions against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Бенчмарк подбора офферов: индекс интервалов против линейного сканирования.
+
+Запуск (из каталога backend):
+    python -m benchmarks.offer_index
+    python -m benchmarks.offer_index --sizes 10000 100000 --queries 500
+
+Django не требуется: офферы синтетические, индекс строится по простым объектам.
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from app.offer_index import SORT_KEYS, OfferIndex
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+SORT_MODES = ['rate', 'sum', 'term', 'popular', 'priority']
+
+
+def generate_offers(count, seed=42):
+    """Синтетические офферы с реалистичными диапазонами сумм и сроков"""
+    rnd = random.Random(seed)
+    offers = []
+    for i in range(count):
+        sum_min = rnd.choice([1000, 2000, 3000, 5000, 10000, 20000])
+        term_min = rnd.choice([1, 5, 7, 10, 14, 30, 61])
+        offers.append(SimpleNamespace(
+            id=i + 1,
+            sum_min=sum_min,
+            sum_max=sum_min + rnd.randrange(5000, 500000, 1000),
+            term_min=term_min,
+            term_max=term_min + rnd.randrange(7, 365),
+            rate=round(rnd.uniform(0, 1.5), 2),
+            priority=rnd.randint(0, 100),
+            popularity_score=round(rnd.expovariate(0.1), 3),
+        ))
+    return offers
+
+
+def generate_queries(count, seed=7):
+    """Запросы пользователей: сумма, срок и режим сортировки (часть без фильтров)"""
+    rnd = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        sum_need = rnd.choice([None, rnd.randrange(1000, 600000, 500)])
+        term_days = rnd.choice([None, rnd.randint(1, 450)])
+        queries.append((sum_need, term_days, rnd.choice(SORT_MODES)))
+    return queries
+
+
+def linear_scan(offers, sum_need, term_days, sort_by):
+    """Прежний алгоритм: фильтрация сканированием и сортировка на каждый запрос"""
+    matches = offers
+    if sum_need is not None:
+        matches = [o for o in matches if o.sum_min <= sum_need <= o.sum_max]
+    if term_days is not None:
+        matches = [o for o in matches if o.term_min <= term_days <= o.term_max]
+    return sorted(matches, key=SORT_KEYS[sort_by])
+
+
+def measure(func, queries):
+    """Среднее и p95 время одного запроса, мс"""
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        func(*query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return sum(timings) / len(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def run(sizes, query_count, scan_limit):
+    queries = generate_queries(query_count)
+    print(f"{'offers':>10} {'build, s':>10} {'index avg':>10} {'index p95':>10} "
+          f"{'scan avg':>10} {'scan p95':>10}")
+
+    for size in sizes:
+        offers = generate_offers(size)
+
+        started = time.perf_counter()
+        index = OfferIndex(offers)
+        build_time = time.perf_counter() - started
+
+        # Проверяем, что индекс возвращает то же, что и сканирование
+        for sum_need, term_days, sort_by in queries[:20]:
+            expected = [o.id for o in linear_scan(offers, sum_need, term_days, sort_by)]
+            got = [offers[pos].id for pos in index.query(sum_need, term_days, sort_by)]
+            assert got == expected, f'index mismatch for {(sum_need, term_days, sort_by)}'
+
+        index_avg, index_p95 = measure(index.query, queries)
+        if size <= scan_limit:
+            scan_avg, scan_p95 = measure(lambda *q: linear_scan(offers, *q), queries)
+            scan_cols = f"{scan_avg:>10.3f} {scan_p95:>10.3f}"
+        else:
+            scan_cols = f"{'-':>10} {'-':>10}"
+
+        print(f"{size:>10} {build_time:>10.2f} {index_avg:>10.3f} {index_p95:>10.3f} {scan_cols}")
+
+    print('\nВремя запроса в миллисекундах.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Размеры каталога')
+    parser.add_argument('--queries', type=int, default=200, help='Количество запросов на каждый размер')
+    parser.add_argument('--scan-limit', type=int, default=100_000,
+                        help='Максимальный размер каталога для замера линейного сканирования')
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.scan_limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Бенчмарк сериализации ответов API: JSONRenderer DRF против FastJSONRenderer.
+
+Запуск (из каталога backend):
+    python -m benchmarks.renderers
+    python -m benchmarks.renderers --offers 20 100 500 --seconds 0.5
+
+Сравниваются ответы со списком офферов, конфигурацией и статистикой.
+Для офферов отдельно замеряется вставка готовых фрагментов (EncodedJSON),
+как это делает /api/offers/. БД не нужна: данные синтетические.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from app import renderers  # noqa: E402
+from app.models import AppConfig  # noqa: E402
+from app.renderers import EncodedJSON, FastJSONRenderer  # noqa: E402
+
+DEFAULT_OFFER_COUNTS = [20, 100, 500]
+
+
+def make_offer(i, rnd):
+    sum_min = rnd.choice([1000, 2000, 5000, 10000])
+    return {
+        'id': i,
+        'partner_name': f'Партнёр {i}',
+        'logo_url': f'https://cdn.example.com/logos/{i}.png',
+        'sum_min': sum_min,
+        'sum_max': sum_min + rnd.randrange(5000, 100000, 1000),
+        'term_min': rnd.choice([5, 7, 10]),
+        'term_max': rnd.choice([30, 60, 180]),
+        'rate': round(rnd.uniform(0, 1), 2),
+        'rate_text': '0.8% в день',
+        'approval_time': '15 минут',
+        'approval_probability': 'высокая',
+        'features': ['Без отказа', 'Первый займ 0%', 'Онлайн'],
+        'redirect_url': f'https://partner.example.com/go?offer={i}&sub_id={{sub_id}}',
+    }
+
+
+def offers_payload(offers):
+    return {'success': True, 'data': {
+        'results': offers, 'count': len(offers), 'page': 1,
+        'page_size': len(offers), 'total_pages': 1,
+    }}
+
+
+def statistics_payload(rnd):
+    """Ответ, похожий на /api/statistics/dashboard/ вместе с разбивками"""
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return {'success': True, 'data': {
+        'period_days': 30,
+        'total_clicks': 123456,
+        'unique_users': 45678,
+        'top_offers': [
+            {'offer__id': i, 'offer__partner_name': f'Партнёр {i}', 'total_clicks': rnd.randint(100, 5000),
+             'unique_users': rnd.randint(50, 3000)}
+            for i in range(10)
+        ],
+        'daily': [
+            {'date': date.today() - timedelta(days=i), 'total_clicks': rnd.randint(100, 5000),
+             'unique_users': rnd.randint(50, 3000)}
+            for i in range(30)
+        ],
+        'hourly': [
+            {'hour': now - timedelta(hours=i), 'total_clicks': rnd.randint(0, 500)}
+            for i in range(7 * 24)
+        ],
+    }}
+
+
+def throughput(render, data, seconds):
+    """Рендеров в секунду и байт в секунду"""
+    size = len(render(data))
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        render(data)
+        count += 1
+    elapsed = time.perf_counter() - started
+    return count / elapsed, size * count / elapsed, size
+
+
+def run(offer_counts, seconds):
+    rnd = random.Random(42)
+    drf = JSONRenderer().render
+    fast = FastJSONRenderer().render
+    orjson_module = renderers.orjson
+
+    def fast_stdlib(data):
+        renderers.orjson = None
+        try:
+            return fast(data)
+        finally:
+            renderers.orjson = orjson_module
+
+    payloads = []
+    for count in offer_counts:
+        offers = [make_offer(i, rnd) for i in range(count)]
+        payloads.append((f'offers x{count}', offers_payload(offers),
+                         offers_payload([EncodedJSON(offer) for offer in offers])))
+    payloads.append(('config', {'success': True, 'data': AppConfig().to_dict()}, None))
+    payloads.append(('statistics', statistics_payload(rnd), None))
+
+    candidates = [('drf', drf), ('fast/json', fast_stdlib)]
+    if orjson_module is not None:
+        candidates.append(('fast/orjson', fast))
+    else:
+        print('orjson не установлен: FastJSONRenderer работает на стандартном json\n')
+
+    print(f"{'payload':>14} {'renderer':>22} {'bytes':>8} {'renders/s':>11} {'MB/s':>8}")
+    for name, data, encoded_data in payloads:
+        expected = drf(data)
+        rows = [(label, render, data) for label, render in candidates]
+        if encoded_data is not None:
+            rows += [(f'{label}+fragments', render, encoded_data) for label, render in candidates[1:]]
+        for label, render, payload in rows:
+            assert render(payload) == expected, f'{label} output differs from DRF for {name}'
+            per_second, bytes_per_second, size = throughput(render, payload, seconds)
+            print(f"{name:>14} {label:>22} {size:>8} {per_second:>11.0f} {bytes_per_second / 1e6:>8.1f}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, nargs='+', default=DEFAULT_OFFER_COUNTS,
+                        help='Размеры списков офферов')
+    parser.add_argument('--seconds', type=float, default=1.0, help='Длительность замера каждого варианта')
+    args = parser.parse_args()
+    run(args.offers, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Генерация данных для нагрузочного теста: офферы, подписчики и клики.
+
+Запуск (из каталога backend, на отдельной БД — данных много):
+    python -m benchmarks.seed
+    python -m benchmarks.seed --offers 10000 --subscribers 1000000 --clicks 10000000 --days 30
+    python -m benchmarks.seed --clear
+
+Данные загружаются bulk_create пачками. Сгенерированные записи помечены
+(партнёр «Bench #N», vk_user_id «bench-N»), поэтому --clear удаляет только их.
+После загрузки пересчитываются агрегаты кликов, скетчи уникальных
+пользователей и оценки популярности, как после обычной работы сервиса.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from app.brands import GROUP_TO_BRAND  # noqa: E402
+from app.catalog import invalidate_catalog  # noqa: E402
+from app.models import ClickLog, Offer, Subscriber  # noqa: E402
+from app.rollups import rebuild_rollups  # noqa: E402
+from app.scoring import update_offer_scores  # noqa: E402
+from app.sketches import rebuild_sketches  # noqa: E402
+
+OFFER_PREFIX = 'Bench #'
+USER_PREFIX = 'bench-'
+
+# Доля кликов от пользователей, которые не подписаны на рассылку
+ANONYMOUS_SHARE = 0.2
+
+USER_AGENTS = [
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    'Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 Chrome/120.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36',
+]
+
+
+def _progress(label, done, total, started):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0
+    print(f"\r{label}: {done}/{total} ({rate:,.0f}/s)", end='', flush=True)
+
+
+def seed_offers(count, rnd, batch_size):
+    """Офферы с реалистичными диапазонами сумм, сроков и ставок"""
+    started = time.perf_counter()
+    for start in range(0, count, batch_size):
+        offers = []
+        for i in range(start, min(start + batch_size, count)):
+            sum_min = rnd.choice([1000, 2000, 3000, 5000, 10000, 20000])
+            term_min = rnd.choice([1, 5, 7, 10, 14, 30, 61])
+            rate = round(rnd.uniform(0, 1), 2)
+            offers.append(Offer(
+                partner_name=f'{OFFER_PREFIX}{i}',
+                logo_url=f'https://cdn.example.com/logos/{i}.png',
+                sum_min=sum_min,
+                sum_max=sum_min + rnd.randrange(5000, 100000, 1000),
+                term_min=term_min,
+                term_max=term_min + rnd.choice([30, 60, 180, 365]),
+                rate=rate,
+                rate_text=f'{rate}% в день',
+                approval_time=rnd.choice(['5 минут', '15 минут', '1 час']),
+                approval_probability=rnd.choice(['высокая', 'средняя', 'низкая']),
+                features=rnd.sample(['Без отказа', 'Первый займ 0%', 'Онлайн', 'Без справок'], 2),
+                redirect_url=f'https://partner.example.com/go?offer={i}&sub_id={{sub_id}}',
+                is_active=rnd.random() < 0.9,
+                priority=rnd.randint(0, 100),
+            ))
+        Offer.objects.bulk_create(offers)
+        _progress('offers', start + len(offers), count, started)
+    print()
+    # bulk_create не вызывает сигналы модели
+    invalidate_catalog()
+    return list(Offer.objects.filter(partner_name__startswith=OFFER_PREFIX).values_list('id', flat=True))
+
+
+def seed_subscribers(count, rnd, batch_size):
+    """Подписчики bench-0 … bench-(count-1)"""
+    groups = list(GROUP_TO_BRAND.items())
+    now = timezone.now()
+    started = time.perf_counter()
+    for start in range(0, count, batch_size):
+        subscribers = []
+        for i in range(start, min(start + batch_size, count)):
+            group_id, brand = rnd.choice(groups)
+            subscribed = rnd.random() < 0.85
+            subscribers.append(Subscriber(
+                vk_user_id=f'{USER_PREFIX}{i}',
+                group_id=group_id,
+                brand=brand,
+                subscribed=subscribed,
+                allowed_from_group=subscribed and rnd.random() < 0.6,
+                subscribed_at=now if subscribed else None,
+                unsubscribed_at=None if subscribed else now,
+            ))
+        # Повторный запуск не падает на уже созданных подписчиках
+        Subscriber.objects.bulk_create(subscribers, ignore_conflicts=True)
+        _progress('subscribers', start + len(subscribers), count, started)
+    print()
+
+    ids = [None] * count
+    for vk_user_id, pk in Subscriber.objects.filter(
+        vk_user_id__startswith=USER_PREFIX
+    ).values_list('vk_user_id', 'id').iterator(chunk_size=batch_size):
+        index = int(vk_user_id[len(USER_PREFIX):])
+        if index < count:
+            ids[index] = pk
+    return ids
+
+
+def seed_clicks(count, offer_ids, subscriber_ids, days, rnd, batch_size):
+    """
+    Клики за последние days дней.
+
+    Популярность офферов распределена по степенному закону, как в реальном
+    каталоге: небольшая часть офферов собирает большую часть кликов.
+    """
+    groups = list(GROUP_TO_BRAND.items())
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(offer_ids))]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    now = timezone.now()
+    window = days * 86400
+    users = len(subscriber_ids)
+    anonymous_users = max(int(users * ANONYMOUS_SHARE), 1)
+    started = time.perf_counter()
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        offers = rnd.choices(offer_ids, cum_weights=cumulative, k=size)
+        clicks = []
+        for offer_id in offers:
+            group_id, brand = rnd.choice(groups)
+            if users and rnd.random() >= ANONYMOUS_SHARE:
+                index = rnd.randrange(users)
+                vk_user_id, subscriber_id = f'{USER_PREFIX}{index}', subscriber_ids[index]
+            else:
+                vk_user_id, subscriber_id = f'{USER_PREFIX}anon-{rnd.randrange(anonymous_users)}', None
+            clicks.append(ClickLog(
+                offer_id=offer_id,
+                vk_user_id=vk_user_id,
+                subscriber_id=subscriber_id,
+                group_id=group_id,
+                brand=brand,
+                created_at=now - timedelta(seconds=rnd.random() * window),
+                ip_address=f'10.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(1, 255)}',
+                user_agent=rnd.choice(USER_AGENTS),
+            ))
+        ClickLog.objects.bulk_create(clicks)
+        _progress('clicks', start + size, count, started)
+    print()
+
+
+def rebuild_aggregates(days):
+    """Пересчитать агрегаты, скетчи и оценки популярности по сырым кликам"""
+    today = timezone.localdate()
+    for offset in range(days, -1, -1):
+        day = today - timedelta(days=offset)
+        hourly, daily = rebuild_rollups(day)
+        sketches = rebuild_sketches(day)
+        print(f"{day}: {hourly} hourly / {daily} daily rollup rows, {sketches} sketches")
+    print(f"popularity scores updated: {update_offer_scores()}")
+
+
+def clear():
+    """Удалить сгенерированные данные (клики удаляются каскадом с офферами)"""
+    with transaction.atomic():
+        offers, _ = Offer.objects.filter(partner_name__startswith=OFFER_PREFIX).delete()
+        subscribers, _ = Subscriber.objects.filter(vk_user_id__startswith=USER_PREFIX).delete()
+    invalidate_catalog()
+    print(f"deleted {offers} offer-related rows, {subscribers} subscriber rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=10_000, help='Число офферов')
+    parser.add_argument('--subscribers', type=int, default=1_000_000, help='Число подписчиков')
+    parser.add_argument('--clicks', type=int, default=10_000_000, help='Число кликов')
+    parser.add_argument('--days', type=int, default=30, help='За сколько последних дней генерировать клики')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора случайных чисел')
+    parser.add_argument('--clear', action='store_true', help='Удалить ранее сгенерированные данные и выйти')
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+        return
+
+    rnd = random.Random(args.seed)
+    offer_ids = seed_offers(args.offers, rnd, args.batch_size)
+    subscriber_ids = seed_subscribers(args.subscribers, rnd, args.batch_size)
+    if args.clicks and offer_ids:
+        seed_clicks(args.clicks, offer_ids, subscriber_ids, args.days, rnd, args.batch_size)
+        rebuild_aggregates(args.days)
+
+
+if __name__ == '__main__':
+    main()
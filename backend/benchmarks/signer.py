@@ -0,0 +1,73 @@
+"""
+Локальная подпись параметров запуска VK для нагрузочных тестов.
+
+Подпись считается так же, как её проверяет verify_vk_launch_params
+(HMAC-SHA256 отсортированных vk_* параметров, base64url без '='),
+секретом VK_APP_SECRET из настроек или переданным явно.
+
+Запуск (из каталога backend) — вывести query string для curl:
+    python -m benchmarks.signer --user 123456
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import time
+from urllib.parse import urlencode
+
+
+def sign_launch_params(params, secret=None):
+    """
+    Подпись параметров запуска.
+
+    Args:
+        params: Параметры запуска (учитываются только vk_*)
+        secret: Секрет приложения (по умолчанию settings.VK_APP_SECRET)
+    """
+    if secret is None:
+        from django.conf import settings
+        secret = settings.VK_APP_SECRET
+    query_string = urlencode(sorted(
+        (key, value) for key, value in params.items()
+        if key.startswith('vk_') and key != 'sign'
+    ))
+    digest = hmac.new(secret.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('utf-8').rstrip('=')
+
+
+def make_launch_params(vk_user_id, secret=None, app_id='1', platform='mobile_web', **extra):
+    """
+    Подписанные параметры запуска для пользователя vk_user_id.
+
+    Args:
+        extra: Дополнительные vk_* параметры (например, vk_group_id)
+    """
+    params = {
+        'vk_user_id': str(vk_user_id),
+        'vk_app_id': str(app_id),
+        'vk_platform': platform,
+        'vk_ts': str(int(time.time())),
+        **{key: str(value) for key, value in extra.items()},
+    }
+    params['sign'] = sign_launch_params(params, secret)
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', required=True, help='vk_user_id')
+    parser.add_argument('--group', help='vk_group_id')
+    parser.add_argument('--secret', help='Секрет приложения (по умолчанию VK_APP_SECRET из настроек)')
+    args = parser.parse_args()
+
+    if args.secret is None:
+        import django
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        django.setup()
+    extra = {'vk_group_id': args.group} if args.group else {}
+    print(urlencode(make_launch_params(args.user, secret=args.secret, **extra)))
+
+
+if __name__ == '__main__':
+    main()
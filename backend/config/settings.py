@@ -97,6 +97,25 @@ DATABASES = {
     }
 }
 
+# Cache
+# default — кэш процесса (им пользуется и django-ratelimit).
+# snapshots — общий для всех gunicorn-воркеров контейнера кэш версий снапшотов
+# в памяти воркеров и резервной карты переходов (см. app/snapshots.py, app/redirects.py).
+# Ключей в нём единицы, поэтому MAX_ENTRIES задан с запасом, чтобы их не вытеснял cull.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'snapshots': {
+        'BACKEND': os.getenv('SNAPSHOT_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('SNAPSHOT_CACHE_LOCATION', '/tmp/vkminiapp_snapshots'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Ограничение частоты запросов (django-ratelimit); отключается для нагрузочных тестов (см. benchmarks/load.py)
+RATELIMIT_ENABLE = get_env_bool('RATELIMIT_ENABLE', True)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -140,7 +159,7 @@ CORS_ALLOW_CREDENTIALS = get_env_bool('CORS_ALLOW_CREDENTIALS', True)
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'app.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -153,6 +172,65 @@ VK_CALLBACK_SECRET = os.getenv('VK_CALLBACK_SECRET', '')
 VK_CONFIRMATION_CODE = os.getenv('VK_CONFIRMATION_CODE', '')
 DEFAULT_BRAND = os.getenv('DEFAULT_BRAND', 'kokos')
 
+# Каталог офферов в памяти воркера: максимальный возраст снимка, секунд
+OFFERS_CATALOG_TTL = int(os.getenv('OFFERS_CATALOG_TTL', '300'))
+
+# Готовый ответ /api/config/ в памяти воркера: максимальный возраст, секунд
+APP_CONFIG_CACHE_TTL = int(os.getenv('APP_CONFIG_CACHE_TTL', '300'))
+
+# Готовые ответы /api/offers/ на снимок каталога (разных наборов параметров)
+OFFERS_PAYLOAD_CACHE_SIZE = int(os.getenv('OFFERS_PAYLOAD_CACHE_SIZE', '256'))
+
+# Ответы меньше этого размера (байт) не сжимаются (см. app/payloads.py)
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024'))
+
+# Буферизованная запись кликов (см. app/clicks.py)
+CLICK_BUFFER_SIZE = int(os.getenv('CLICK_BUFFER_SIZE', '10000'))
+CLICK_FLUSH_BATCH_SIZE = int(os.getenv('CLICK_FLUSH_BATCH_SIZE', '500'))
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '2.0'))
+
+# Максимум событий VK Ads в одном запросе POST /api/vk-ads/log-events/
+VK_ADS_EVENTS_BATCH_MAX = int(os.getenv('VK_ADS_EVENTS_BATCH_MAX', '50'))
+
+# Отложенная запись событий VK Ads (см. app/vk_ads_logger.py)
+VK_ADS_EVENT_BUFFER_SIZE = int(os.getenv('VK_ADS_EVENT_BUFFER_SIZE', '10000'))
+VK_ADS_EVENT_FLUSH_BATCH_SIZE = int(os.getenv('VK_ADS_EVENT_FLUSH_BATCH_SIZE', '500'))
+VK_ADS_EVENT_FLUSH_INTERVAL = float(os.getenv('VK_ADS_EVENT_FLUSH_INTERVAL', '2.0'))
+
+# Счётчики показов офферов в памяти воркера (см. app/impressions.py): интервал записи, секунд
+IMPRESSION_FLUSH_INTERVAL = float(os.getenv('IMPRESSION_FLUSH_INTERVAL', '10.0'))
+
+# Кэш результатов /api/statistics/* в памяти воркера (см. app/statistics_cache.py), секунд:
+# время свежести по эндпоинтам и окно, в которое отдаётся устаревший результат,
+# пока новый считается в фоне
+STATISTICS_CACHE_TTL = int(os.getenv('STATISTICS_CACHE_TTL', '60'))
+STATISTICS_CACHE_TTLS = {
+    'dashboard': STATISTICS_CACHE_TTL,
+    'offers': STATISTICS_CACHE_TTL * 2,
+    'brands': STATISTICS_CACHE_TTL * 2,
+    'daily': STATISTICS_CACHE_TTL * 5,
+    'top_offers': STATISTICS_CACHE_TTL * 2,
+    'offer_detail': STATISTICS_CACHE_TTL * 2,
+    'conversion': STATISTICS_CACHE_TTL,
+    'subscribers': STATISTICS_CACHE_TTL * 5,
+}
+STATISTICS_CACHE_STALE_TTL = int(os.getenv('STATISTICS_CACHE_STALE_TTL', '300'))
+STATISTICS_CACHE_MAX_ENTRIES = int(os.getenv('STATISTICS_CACHE_MAX_ENTRIES', '512'))
+
+# Каталог для записей, которые не удалось записать в БД
+SPOOL_DIR = os.getenv('SPOOL_DIR', str(BASE_DIR / 'spool'))
+
+# Архив сырых кликов и событий VK Ads (см. app/archive.py):
+# строки старше ARCHIVE_AFTER_DAYS дней переносятся в сжатые CSV-файлы
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+
+# Выгрузки подписчиков из админки (см. app/exports.py): выборки больше
+# порога пишутся в файл в фоне, файлы хранятся EXPORT_FILE_TTL секунд
+EXPORT_DIR = os.getenv('EXPORT_DIR', str(BASE_DIR / 'exports'))
+EXPORT_BACKGROUND_THRESHOLD = int(os.getenv('EXPORT_BACKGROUND_THRESHOLD', '100000'))
+EXPORT_FILE_TTL = int(os.getenv('EXPORT_FILE_TTL', str(24 * 3600)))
+
 # Security headers
 SECURE_HSTS_SECONDS = int(os.getenv('SECURE_HSTS_SECONDS', '0'))
 SECURE_SSL_REDIRECT = get_env_bool('SECURE_SSL_REDIRECT', False)
@@ -161,3 +239,29 @@ CSRF_COOKIE_SECURE = get_env_bool('CSRF_COOKIE_SECURE', False)
 
 CSP_FRAME_ANCESTORS = get_env_list('CSP_FRAME_ANCESTORS', 'https://vk.com')
 
+# Логи приложения пишутся в stderr фоновым потоком воркера (см. app/logqueue.py),
+# чтобы форматирование и вывод не задерживали запросы
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {
+            'format': '%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s',
+        },
+    },
+    'handlers': {
+        'queued_console': {
+            'class': 'app.logqueue.QueueingStreamHandler',
+            'formatter': 'default',
+            'maxsize': int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+        },
+    },
+    'loggers': {
+        'app': {
+            'handlers': ['queued_console'],
+            'level': os.getenv('APP_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
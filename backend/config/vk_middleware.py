@@ -31,6 +31,7 @@ class VKSignatureMiddleware:
     PUBLIC_PATHS = [
         '/api/config/',
         '/api/offers/',
+        '/api/bootstrap/',  # Подпись необязательна и проверяется во view
         '/api/health/',
         '/admin/',
         '/static/',
@@ -0,0 +1,25 @@
+"""
+Настройки gunicorn.
+
+При завершении воркера (перезапуск, max_requests, SIGTERM) буферы отложенной
+записи и очереди логов дописываются до выхода процесса, а не теряются.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '3'))
+# Время на дозапись буферов при остановке воркера
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+
+def worker_exit(server, worker):
+    from app.clicks import click_buffer
+    from app.impressions import impression_counter
+    from app.logqueue import drain_logging
+    from app.vk_ads_logger import vk_ads_event_buffer
+
+    vk_ads_event_buffer.shutdown()
+    click_buffer.shutdown()
+    impression_counter.shutdown()
+    # Последним: строки логов, записанные при сбросе буферов
+    drain_logging()
@@ -2,6 +2,75 @@ import bridge from '@vkontakte/vk-bridge';
 
 const API_BASE = import.meta.env.VITE_API_BASE || 'https://kybyshka-dev.ru';
 
+// События для бэкенда копятся и отправляются пачкой в /api/vk-ads/log-events/
+const BATCH_URL = `${API_BASE}/api/vk-ads/log-events/`;
+const MAX_BATCH_SIZE = 20; // не больше VK_ADS_EVENTS_BATCH_MAX на бэкенде
+const FLUSH_DELAY_MS = 2000;
+
+interface BackendEvent {
+  event_name: string;
+  vk_user_id: string | null | undefined;
+  event_params?: Record<string, any>;
+  success: boolean;
+  error_message?: string;
+  platform: string;
+}
+
+let pendingEvents: BackendEvent[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | null = null;
+
+/**
+ * Отправить накопленные события одним запросом
+ */
+async function flushBackendEvents(): Promise<void> {
+  if (flushTimer !== null) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (pendingEvents.length === 0) {
+    return;
+  }
+  const events = pendingEvents;
+  pendingEvents = [];
+
+  try {
+    const response = await fetch(BATCH_URL, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ events }),
+      keepalive: true,
+    });
+    const body = await response.json();
+    console.log(`✅ Backend logged: ${body?.data?.accepted ?? 0}/${events.length} events`);
+  } catch (backendError) {
+    console.warn('⚠️ Failed to log to backend:', backendError);
+    // Не критично, продолжаем
+  }
+}
+
+/**
+ * Поставить событие в очередь на отправку в бэкенд
+ */
+function queueBackendEvent(event: BackendEvent): void {
+  pendingEvents.push(event);
+  if (pendingEvents.length >= MAX_BATCH_SIZE) {
+    void flushBackendEvents();
+  } else if (flushTimer === null) {
+    flushTimer = setTimeout(() => void flushBackendEvents(), FLUSH_DELAY_MS);
+  }
+}
+
+// При сворачивании или закрытии приложения отправляем очередь сразу
+if (typeof document !== 'undefined') {
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+      void flushBackendEvents();
+    }
+  });
+}
+
 /**
  * Отправить событие VK Ads и залогировать на бэкенде
  */
@@ -25,27 +94,14 @@ export async function trackAndLogEvent(
       timestamp: new Date().toISOString()
     });
     
-    // Логируем на бэкенд через fetch
-    try {
-      await fetch(`${API_BASE}/api/vk-ads/log-event/`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          event_name: eventName,
-          vk_user_id: vkUserId,
-          event_params: eventParams,
-          success: result.result === true,
-          platform: detectPlatform(),
-        }),
-      });
-      
-      console.log(`✅ Backend logged: ${eventName}`);
-    } catch (backendError) {
-      console.warn('⚠️ Failed to log to backend:', backendError);
-      // Не критично, продолжаем
-    }
+    // Логируем на бэкенд (пачкой)
+    queueBackendEvent({
+      event_name: eventName,
+      vk_user_id: vkUserId,
+      event_params: eventParams,
+      success: result.result === true,
+      platform: detectPlatform(),
+    });
     
     if (result.result) {
       console.log(`✅ VK Ads confirmed: ${eventName} delivered successfully`);
@@ -55,25 +111,15 @@ export async function trackAndLogEvent(
   } catch (error) {
     console.error(`❌ VK Ads ERROR: ${eventName}`, error);
     
-    // Логируем ошибку на бэкенд через fetch
-    try {
-      await fetch(`${API_BASE}/api/vk-ads/log-event/`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          event_name: eventName,
-          vk_user_id: vkUserId,
-          event_params: eventParams,
-          success: false,
-          error_message: error instanceof Error ? error.message : String(error),
-          platform: detectPlatform(),
-        }),
-      });
-    } catch (backendError) {
-      console.warn('⚠️ Failed to log error to backend:', backendError);
-    }
+    // Логируем ошибку на бэкенд (пачкой)
+    queueBackendEvent({
+      event_name: eventName,
+      vk_user_id: vkUserId,
+      event_params: eventParams,
+      success: false,
+      error_message: error instanceof Error ? error.message : String(error),
+      platform: detectPlatform(),
+    });
   }
 }
 